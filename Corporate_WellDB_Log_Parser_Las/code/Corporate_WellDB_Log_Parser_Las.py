@@ -1,96 +1,353 @@
+import argparse
 import json
-import las
 import os
-import sys
-import numpy as np
-import io
 import logging
-import pandas as pd
 import re
-import datetime
+import warnings
+import itertools
+import mmap
+import concurrent.futures
+import las_writers
+import las_cache
+import las_metrics
+import las_pipeline
+import las_input
+import las_stats
+import las_pyramid
 
+# las, numpy and pandas are imported in the functions that use them, so importing this module
+# and parsing metadata only (see save_header_metadata) stays fast
 LOG_FORMAT = "%(levelname)s %(asctime)s - %(funcName)s, %(lineno)d - %(message)s"
-logging.basicConfig(filename='lasparser2.log', level=logging.DEBUG, format=LOG_FORMAT)
+LOG_FILE = 'lasparser2.log'
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
 logger = logging.getLogger()
 
 
-def read_file_contents(lasfile):
-    """Read all lines from the given las file"""
-    with open(lasfile, 'r') as f:
-        file_contents = f.readlines()
-    return file_contents
+SECTION_LINE = 'section'
+METADATA_LINE = 'metadata'
+DATA_LINES = 'data'
+READ_CHUNK_SIZE = 1 << 20
+# the header pass reads less at a time, so little of the data is read before a LAS v2 ~A line ends it
+HEADER_CHUNK_SIZE = 1 << 16
+LAS_ENCODING = 'utf-8'
+DATA_COMMENT_LINE = re.compile(br'^[ \t]*#[^\n]*\n?', re.M)
+DEFAULT_NULL_VALUE = -999.25
+OUTPUT_OPTIONS = ('decimals', 'output_format', 'compression', 'pyramid')
+HEADER_SETTINGS = ('VERS', 'WRAP', 'DLM', 'NULL')
+# MNEM.UNITS  VALUE : DESCRIPTION - units follow the dot without a space, the description follows the last colon
+METADATA_LINE_FIELDS = re.compile(r'([^.]*)\.(\S*)(.*):(.*)$')
+# LAS v3: ... : DESCRIPTION {format} | association
+LAS3_LINE_TAIL = re.compile(r'\s*(?:\{(?P<format>[^{}]*)\})?\s*(?:\|(?P<association>[^|]*))?$')
+DELIMITERS = {'SPACE': ' ', 'COMMA': ',', 'TAB': '\t'}
+# how the work is spread over workers and cut into chunks, they do not change the data written
+RUN_OPTIONS = ('section_workers', 'section_processes', 'chunk_rows', 'pipeline')
+# data rows converted and written at a time; a section being written holds about
+# CHUNK_ROWS * curves * 32 bytes (float64 values, the chunk being cut, rounded copy, writer buffers) plus READ_CHUNK_SIZE
+CHUNK_ROWS = 100000
+# bump when a change to the parsing logic changes the outputs, cached results of older versions are redone
+PARSER_VERSION = '2.3'
 
 
-def remove_comments_blanklines(file_contents):
-    """Remove all blank lines and comment lines"""
-    fc = []
-    for li, line in enumerate(file_contents):
-        if line.startswith('#'):
-            logger.info('Comment line: ' + line)
-        elif line in ['\n', '\r\n', ' ', '\t', '', '\r']:
-             logger.info('Empty line: ' + line)
+def configure_logging(level=None, logfile=None):
+    """Set up logging for command line use, nothing is configured when the module is imported
+    level - one of LOG_LEVELS, default $LASPARSER_LOG_LEVEL or INFO
+    logfile - log file, '-' for stderr, default $LASPARSER_LOG_FILE or lasparser2.log in the working directory"""
+    level = level or os.environ.get('LASPARSER_LOG_LEVEL', 'INFO')
+    logfile = logfile or os.environ.get('LASPARSER_LOG_FILE', LOG_FILE)
+    if logfile == '-':
+        logfile = None
+    logging.basicConfig(filename=logfile, level=getattr(logging, level.upper()), format=LOG_FORMAT)
+
+
+def add_logging_arguments(parser):
+    """Add the --log-level and --log-file options to an ArgumentParser"""
+    parser.add_argument('--log-level', default=None, choices=LOG_LEVELS, type=str.upper,
+                        help='log level (default: $LASPARSER_LOG_LEVEL or INFO)')
+    parser.add_argument('--log-file', default=None,
+                        help="log file, '-' for stderr (default: $LASPARSER_LOG_FILE or " + LOG_FILE + ")")
+
+
+def is_data_section(section_line):
+    """Return True for sections holding curve data: ~A in LAS v2, ~..._Data | ..._Definition in LAS v3"""
+    name = section_line.replace('~', '').split('|')[0].strip().upper()
+    return name.startswith('A') or 'DATA' in name
+
+
+def find_section_start(buf, pos, end):
+    """Return the offset of the first line in buf[pos:end] starting with ~ (after blanks), -1 if there is none
+    Data rows hardly ever hold a ~, so looking for the character first is much faster than a regex over the lines"""
+    tilde = buf.find(b'~', pos, end)
+    while tilde >= 0:
+        line_start = buf.rfind(b'\n', 0, tilde) + 1
+        if line_start >= pos and not buf[line_start:tilde].strip(b' \t'):
+            return line_start
+        tilde = buf.find(b'~', tilde + 1, end)
+    return -1
+
+
+def tokenize_las_stream(stream, chunk_size=READ_CHUNK_SIZE, offset=0, data=True):
+    """Yield (kind, content, offset) tuples from a las file opened in binary mode
+    kind is SECTION_LINE or METADATA_LINE with content being the stripped line,
+    or DATA_LINES with content being a bytes block of complete data lines
+    offset is the byte position of the content in the file
+    The stream is read once in chunks of chunk_size bytes, comment and blank lines are skipped
+    Data sections are never decoded or split into lines here
+    data - yield the data blocks; with False the data sections are only searched for the next section line"""
+    buf = b''
+    pos = 0
+    base = offset
+    eof = False
+    in_data = False
+    while True:
+        nl = buf.find(b'\n', pos)
+        if nl < 0 and not eof:
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            base += pos
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        if pos >= len(buf):
+            break
+        if in_data:
+            end = len(buf) if eof else buf.rfind(b'\n', pos) + 1
+            next_section = find_section_start(buf, pos, end)
+            stop = end if next_section < 0 else next_section
+            block = buf[pos:stop] if data else b''
+            if b'#' in block:
+                block = DATA_COMMENT_LINE.sub(b'', block)
+            if block.strip():
+                yield DATA_LINES, block, base + pos
+            pos = stop
+            in_data = next_section < 0
+            continue
+        end = len(buf) if nl < 0 else nl + 1
+        line = buf[pos:end].decode(LAS_ENCODING, 'replace').strip()
+        line_offset = base + pos
+        pos = end
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('~'):
+            in_data = is_data_section(line)
+            yield SECTION_LINE, line, line_offset
         else:
+            yield METADATA_LINE, line, line_offset
+
+
+def scan_las_buffer(buf):
+    """Yield the (kind, content, offset) tuples of the section and metadata lines of a las file held
+    in buf (bytes or a memory map), like tokenize_las_stream with data=False
+    Data sections are skipped by searching buf for the next section line, their bytes are not copied"""
+    pos = 0
+    size = len(buf)
+    while pos < size:
+        nl = buf.find(b'\n', pos)
+        end = size if nl < 0 else nl + 1
+        line = buf[pos:end].decode(LAS_ENCODING, 'replace').strip()
+        line_offset = pos
+        pos = end
+        if not line or line.startswith('#'):
+            continue
+        if not line.startswith('~'):
+            yield METADATA_LINE, line, line_offset
+            continue
+        yield SECTION_LINE, line, line_offset
+        if is_data_section(line):
+            next_section = find_section_start(buf, pos, size)
+            pos = size if next_section < 0 else next_section
+
+
+def tokenize_lasfile(lasfile, chunk_size=READ_CHUNK_SIZE):
+    """Yield (kind, content, offset) tuples for the given las file, see tokenize_las_stream
+    lasfile may be compressed or a zip member, see las_input"""
+    with las_input.open_las(lasfile) as f:
+        for token in tokenize_las_stream(f, chunk_size):
+            yield token
+
+
+def read_las_header(lasfile, spool=None, digest=None):
+    """Return the section and metadata lines of the las file and its section index (see list_sections_present)
+    The data lines are not kept, the index holds the byte offset of every section line
+    so the data can be streamed later with iter_data_lines
+    In LAS v2 the ~A section is the last one, the scan stops at its section line and the data is not read;
+    LAS v3 data sections can be followed by other sections. Plain files are memory mapped and the data
+    sections skipped by searching for the next section line (see scan_las_buffer), compressed inputs
+    are decompressed and searched chunk by chunk
+    spool - a las_input.Spool the decompressed bytes of a compressed input are copied to
+    digest - a las_cache.ContentDigest fed the bytes passed; for LAS v2 the data stream adds the rest"""
+    if las_input.is_plain(lasfile) and os.path.getsize(lasfile):
+        with open(lasfile, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            file_contents, sections = collect_header(scan_las_buffer(buf))
+            if digest is not None:
+                end = header_pass_end(file_contents, sections, len(buf))
+                digest.update_buffer(buf, 0, end)
+                if end == len(buf):
+                    digest.end(end)
+        return file_contents, sections
+    with las_input.open_las(lasfile, background=False, digest=digest) as f:
+        stream = f if spool is None else spool.tee(f)
+        return collect_header(tokenize_las_stream(stream, HEADER_CHUNK_SIZE, data=False))
+
+
+def collect_header(tokens):
+    """Return the header lines and the section index of the tokens of read_las_header"""
+    file_contents = []
+    sections = []
+    for kind, content, offset in tokens:
+        if kind == SECTION_LINE:
+            add_section(sections, content, len(file_contents), offset)
+        file_contents.append(content)
+        if kind == SECTION_LINE and is_data_section(content) and check_las_version(file_contents) == 2:
+            break
+    close_sections(sections, len(file_contents))
+    return file_contents, sections
+
+
+def header_pass_end(file_contents, sections, size):
+    """Return the offset read_las_header got to: the ~A line for LAS v2, size (the end) otherwise"""
+    if sections and is_data_section(sections[-1].name) and check_las_version(file_contents) == 2:
+        return sections[-1].offset
+    return size
+
+
+def iter_data_blocks(lasfile, offset, chunk_size=READ_CHUNK_SIZE, digest=None):
+    """Yield the bytes blocks of the data section whose section line starts at offset
+    Compressed inputs are decompressed from the start, see las_input.open_las
+    digest - a las_cache.ContentDigest fed the bytes read"""
+    with las_input.open_las(lasfile, offset, digest=digest) as f:
+        for kind, content, token_offset in tokenize_las_stream(f, chunk_size, offset):
+            if kind == DATA_LINES:
+                yield content
+            elif kind == SECTION_LINE and token_offset > offset:
+                break
+
+
+def iter_data_lines(lasfile, offset):
+    """Yield the stripped lines of the data section whose section line starts at offset"""
+    return block_lines(iter_data_blocks(lasfile, offset))
+
+
+def block_lines(blocks):
+    """Yield the stripped lines of bytes blocks of data lines"""
+    for block in blocks:
+        for line in block.decode(LAS_ENCODING, 'replace').splitlines():
             line = line.strip()
-            fc = fc + [line]
-    return fc
+            if line:
+                yield line
 
 
-def retrieve_line_metadata(line):
-    """Return a dict with mnemonic, unit, data, description from a line with metadata
+def parse_metadata_line(line, las3=False):
+    """Return the metadata record of a stripped header line, None for lines without metadata
+    (comments, free text, section lines). The record is a dict with mnemonic, units, value and
+    description; with las3 the {format} and | association ending a LAS v3 line are split off the
+    description and added as format and association when present
     Example of a metadata line:
     STRT  .M                2847.0000                       : FIRST INDEX VALUE """
-    mnemonic = ''
-    units = ''
-    value = ''
-    desc = ''
-    line_metadata = {}
-    if len(line) > 0:
-        try:
-            first, desc = (line.strip()).rsplit(':', 1)
-            desc = desc.strip()
-            mnemonic, mid = (first.strip()).split('.', 1)
-            mnemonic = mnemonic.strip()
-            if mid.startswith(' '):
-                logger.info('No units available')
-                value = mid.strip()
-            else:
-                units, value = mid.split(None, 1)
-                units = units.strip()
-                value = value.strip()
-        except Exception as e:
-            logger.error(e)
-    if mnemonic:
-        line_metadata['mnemonic'] = mnemonic.strip()
-        line_metadata['units'] = units
-        line_metadata['value'] = value
-        line_metadata['description'] = desc
+    if ':' not in line or line.startswith('#'):
+        return None
+    tail = None
+    if las3:
+        tail = LAS3_LINE_TAIL.search(line)
+        line = line[:tail.start()]
+    match = METADATA_LINE_FIELDS.match(line)
+    if match is None:
+        return None
+    mnemonic, units, value, desc = match.groups()
+    mnemonic = mnemonic.strip()
+    if not mnemonic:
+        return None
+    record = {'mnemonic': mnemonic, 'units': units, 'value': value.strip(), 'description': desc.strip()}
+    if tail is not None:
+        if tail.group('format') is not None:
+            record['format'] = tail.group('format').strip()
+        if tail.group('association') is not None:
+            record['association'] = tail.group('association').strip()
+    return record
+
+
+def retrieve_line_metadata(line, las3=False):
+    """Return a dict with mnemonic, unit, data, description from a line with metadata, {} for other lines
+    see parse_metadata_line"""
+    line_metadata = parse_metadata_line(line.strip(), las3)
+    if line_metadata is None:
+        # blank, comment or free text line
+        logger.debug('No metadata in line: ' + line)
+        return {}
     return line_metadata
 
 
-def check_las_version(file_contents):
-    """Return the version of the las file"""
-    ver = None
+def parse_header_lines(file_contents):
+    """Parse the header lines from read_las_header in one pass
+    Returns the metadata records (see parse_metadata_line, None for section and free text lines) in the
+    order of file_contents, and the header settings (see header_settings) of the first VERS, WRAP, DLM
+    and NULL lines; LAS v3 fields are split off once the VERS line says 3"""
+    records = []
+    values = {}
+    las3 = False
+    for line in file_contents:
+        if line.startswith('~'):
+            records.append(None)
+            continue
+        record = parse_metadata_line(line, las3)
+        records.append(record)
+        if record is None:
+            logger.debug('No metadata in line: ' + line)
+        elif record['mnemonic'] in HEADER_SETTINGS and record['mnemonic'] not in values:
+            values[record['mnemonic']] = record['value']
+            if record['mnemonic'] == 'VERS':
+                las3 = to_version(record['value']) == 3
+    return records, header_settings(values)
+
+
+def to_version(value):
+    """Return the VERS value as float, None if it is not a number"""
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def header_settings(values):
+    """Return a dict with version, wrap, dlm and null_value from a dict of the VERS, WRAP, DLM and NULL values
+    A VERS that is not a number raises ValueError; WRAP is True only for YES; DLM names (SPACE, COMMA, TAB)
+    are turned into the character, ' ' if missing; NULL is DEFAULT_NULL_VALUE if missing or not numeric"""
+    settings = {}
+    settings['version'] = float(values['VERS']) if 'VERS' in values else None
+    settings['wrap'] = values.get('WRAP') == 'YES'
+    dlm = values.get('DLM', ' ')
+    settings['dlm'] = DELIMITERS.get(dlm, dlm)
+    settings['null_value'] = DEFAULT_NULL_VALUE
+    if 'NULL' in values:
+        try:
+            settings['null_value'] = float(values['NULL'])
+        except ValueError:
+            logger.error('NULL value is not numeric: ' + values['NULL'])
+    return settings
+
+
+def find_header_values(file_contents, mnemonics=HEADER_SETTINGS):
+    """Return a dict with the value of the first line of each of the mnemonics, the scan stops when all are found"""
+    values = {}
     for line in file_contents:
-        if line.startswith('VERS'):
-            lm = retrieve_line_metadata(line)
-            ver = float(lm['value'])
+        for mnemonic in mnemonics:
+            if mnemonic not in values and line.startswith(mnemonic):
+                record = parse_metadata_line(line)
+                if record is not None and record['mnemonic'] == mnemonic:
+                    values[mnemonic] = record['value']
+        if len(values) == len(mnemonics):
             break
-    return ver
+    return values
+
+
+def check_las_version(file_contents):
+    """Return the version of the las file"""
+    return header_settings(find_header_values(file_contents, ('VERS',)))['version']
 
 
 def check_wrap_setting(file_contents):
     """Return the WRAP setting"""
-    wrap = None
-    for line in file_contents:
-        if line.startswith('WRAP'):
-            lm = retrieve_line_metadata(line)
-            wrap = lm['value']
-            break
-    if wrap=='YES':
-        wrap = True
-    else:
-        wrap = False
-    return wrap
+    return header_settings(find_header_values(file_contents, ('WRAP',)))['wrap']
+
 
 def standardize_meta_section_names(metadata):
     """Change sections names so they follow LAS 2 standard"""
@@ -121,80 +378,86 @@ def standardize_meta_section_names(metadata):
             if 'DATA' not in mf.upper() and 'DEFINITION' not in mf.upper():
                 st_metadata['OTHER'] = metadata[mf]
                 del metadata[mf]
+    # keep everything else (LAS v3 definitions, 'Data files', ...) under its own name
+    for mf in metadata:
+        st_metadata[mf] = metadata[mf]
     return st_metadata
 
 def check_las_delimiter(file_contents):
     """Return the delimiter used in the las file"""
-    dlm = ' '
-    for line in file_contents:
-        if line.startswith('DLM'):
-            lm = retrieve_line_metadata(line)
-            dlm = lm['value']
-            break
-    if dlm == 'SPACE' or dlm == ' ':
-        dlm = ' '
-    elif dlm == 'COMMA':
-        dlm = ','
-    elif dlm == 'TAB':
-        dlm = '\t'
-    return dlm
+    return header_settings(find_header_values(file_contents, ('DLM',)))['dlm']
+
 
+def check_header_settings(file_contents):
+    """Return a dict with version, wrap, dlm and null_value of the las file (see header_settings)
+    The header lines are scanned once, up to the last of the VERS, WRAP, DLM and NULL lines;
+    parse_header_lines returns the same settings along with the records of all lines"""
+    return header_settings(find_header_values(file_contents))
 
-def read_metadata_sections(file_contents):
+
+def check_null_value(file_contents):
+    """Return the NULL value declared in the ~W section as float, -999.25 if missing or not numeric"""
+    return header_settings(find_header_values(file_contents, ('NULL',)))['null_value']
+
+
+def read_metadata_sections(file_contents, sections=None, ver=None, records=None):
     """Return a dict with all metadata
     for LAS v2: read the data from sections other than ~A
     for section ~O all the data is put in one string
     returned is a dictionary that can be dumped into JSON file
     for LAS v3
-    read data in all sections that do not contain DATA in the name"""
+    read data in all sections that do not contain DATA in the name
+    sections - the section index from read_las_header, built from file_contents when not given
+    ver - the las version if already known (see check_header_settings)
+    records - the line records from parse_header_lines, parsed here when not given"""
     #clean_file_contents = remove_comments_blanklines(file_contents)
-    ver = check_las_version(file_contents)
+    if records is None:
+        records, settings = parse_header_lines(file_contents)
+        if ver is None:
+            ver = settings['version']
+    if ver is None:
+        ver = check_las_version(file_contents)
     metadata = {}
-    sections = list_sections_present(file_contents)
+    if sections is None:
+        sections = list_sections_present(file_contents)
     if ver == 2:
         # logger.info('LAS version 2')
         logger.info('LAS version 2')
         # find sections that contain meta data
-        for si, section_id in enumerate(sections['Section_ID']):
-            if not section_id == '~A':
-                section_label = sections['Section_name'].iloc[si]
+        for section in sections:
+            if not section.section_id == '~A':
+                section_label = section.name
                 section_label = section_label.replace('~', '')
                 section_label = section_label.replace(' ', '_')
                 metadata[section_label] = {}
-                mds = sections['Start_index'].iloc[si]
-                mde = sections['End_index'].iloc[si]+1
-                section_metadata = file_contents[mds:mde]
-                if section_id == '~O':
+                section_metadata = file_contents[section.start:section.end+1]
+                if section.section_id == '~O':
                     logger.info('OTHER section detected')
                     other_info = " ".join(line.strip() for line in section_metadata)
                     metadata[section_label]['Comment'] = other_info
                 else:
-                    for smdl in section_metadata:
-                        line_metadata = retrieve_line_metadata(smdl)
-                        name = line_metadata['mnemonic']
-                        metadata[section_label][name] = line_metadata
+                    for line_metadata in records[section.start:section.end+1]:
+                        if line_metadata:
+                            name = line_metadata['mnemonic']
+                            metadata[section_label][name] = line_metadata
     if ver == 3:
         logger.info('LAS version 3')
         #check if the file is actually LAS3, ie there are no ASCII or CURVE sections
         lasv2_flag = 0
-        for si, section_name in enumerate(sections['Section_name']):
+        for section in sections:
+            section_name = section.name
             if 'ASCII' in section_name.upper() or section_name.upper()=='A':
                 lasv2_flag = lasv2_flag+1
             if 'CURVE' in section_name.upper():
                 lasv2_flag = lasv2_flag+1
         if lasv2_flag >1:
-            print('Wrong LAS format definition, parsing as LASv2')
-            for si, section_name in enumerate(sections['Section_name']):
+            logger.warning('Wrong LAS format definition, parsing as LASv2')
+            for section in sections:
+                section_name = section.name
                 #print(section_name)
-                #print(sections.iloc[si])
                 if not 'ASCII' in section_name.upper():
-                    msi = sections['Start_index'].iloc[si]
-                    mei = sections['End_index'].iloc[si]+1
-                    section_metadata = file_contents[msi:mei]
-                    # print(section_metadata)
                     metadata[section_name] = {}
-                    for smdl in section_metadata:
-                        line_metadata = retrieve_line_metadata(smdl)
+                    for line_metadata in records[section.start:section.end+1]:
                         # print(line_metadata)
                         if line_metadata:
                             name = line_metadata['mnemonic']
@@ -202,17 +465,13 @@ def read_metadata_sections(file_contents):
                                 metadata[section_name][name] = line_metadata
             # print(metadata)
         else:
-            for si, section_name in enumerate(sections['Section_name']):
-                if (section_name.upper()).find('DATA') == -1:
-                    section_label = sections['Section_name'].iloc[si]
+            for section in sections:
+                if (section.name.upper()).find('DATA') == -1:
+                    section_label = section.name
                     section_label = section_label.replace('~', '')
                     section_label = section_label.replace(' ', '_')
                     metadata[section_label] = {}
-                    mds = sections['Start_index'].iloc[si]
-                    mde = sections['End_index'].iloc[si]+1
-                    section_metadata = file_contents[mds:mde]
-                    for smdl in section_metadata:
-                        line_metadata = retrieve_line_metadata(smdl)
+                    for line_metadata in records[section.start:section.end+1]:
                         if line_metadata:
                             name = line_metadata['mnemonic']
                             if name:
@@ -223,153 +482,532 @@ def read_metadata_sections(file_contents):
                 if 'CURVE' in m.upper():
                     md = {}
                     logger.error('CURVE is reserved for LAS v2')
-                    print('CURVE is reserved for LAS v2')
                     for line in file_contents:
                         if 'DATA' in line.upper() and 'DEFINITION' in line.upper():
-                            print('Data and defitnition found')
+                            logger.debug('Data and defitnition found')
                             curve_metadata = metadata.get(m)
                             section_name = line.split('|')[1].strip()
                             md[section_name] = {}
                             md[section_name] = curve_metadata
                             metadata.update(md)
-                            print(metadata.keys())
+                            logger.debug(str(metadata.keys()))
                             break
     # print('Final metadata')
     # print(metadata)
     return metadata
 
 
-def save_metadata(metadata, jsonfile):
-    """Save extracted metadata to a JSON file"""
+def save_metadata(metadata, jsonfile, indent=None):
+    """Save extracted metadata to a JSON file, compact unless indent (spaces per level) is given"""
     #print(metadata)
     filename = os.path.splitext(os.path.basename(jsonfile))[0]
     #all_meta['JSON_file']['filename'] = ''.join([filename, '.JSON'])
-    with open(jsonfile, 'w+') as f:
-        json.dump(metadata, f, indent=2)
+    with las_metrics.stage('save_metadata'), open(jsonfile, 'w+') as f:
+        json.dump(metadata, f, indent=indent, separators=(',', ': ') if indent else (',', ':'))
     logger.info('Saved metadata to ' + jsonfile)
     f.close()
 
 
+class LasSection(object):
+    """One entry of the section index
+    name - section line without '~', e.g. 'Log_Data | Log_Definition'
+    section_id - first two characters of the section line, e.g. '~A'
+    line_number - position of the section line in file_contents
+    start, end - first and last position (inclusive) of the section lines in file_contents
+    offset - byte offset of the section line in the las file, None if unknown"""
+    __slots__ = ('name', 'section_id', 'line_number', 'start', 'end', 'offset')
+
+    def __init__(self, name, section_id, line_number, offset=None):
+        self.name = name
+        self.section_id = section_id
+        self.line_number = line_number
+        self.start = line_number + 1
+        self.end = line_number
+        self.offset = offset
+
+    def __repr__(self):
+        return 'LasSection(' + repr(self.name) + ', lines ' + str(self.start) + '-' + str(self.end) + ')'
+
+
+def add_section(sections, line, line_number, offset=None):
+    """Append the section starting at line_number to the index, ending the previous one"""
+    if sections:
+        sections[-1].end = line_number - 1
+    sections.append(LasSection(line.replace('~', '').strip(), line[0:2], line_number, offset))
+
+
+def close_sections(sections, n_lines):
+    """End the last section of the index at the last line of file_contents"""
+    if sections:
+        sections[-1].end = n_lines - 1
+
+
 def list_sections_present(file_contents):
-    """Return a DataFrame with overview of the sections identifies in the data retrieved from the las file"""
-    sections = pd.Series()
-    locations = pd.Series()
-    section_ids = pd.Series()
-    data_start = pd.Series()
-    data_end = pd.Series()
+    """Return the section index (a list of LasSection) of the header lines retrieved from the las file
+    read_las_header builds the same index while reading, prefer passing that one on"""
+    sections = []
     for il, line in enumerate(file_contents):
         if line.startswith('~'):
-            section_ids = section_ids.append(pd.Series(line[0:2]))
-            line = line.replace('~', '')
-            line = line.strip()
-            sections = sections.append(pd.Series(line))
-            locations = locations.append(pd.Series(il))
-    sections_overview = pd.DataFrame()
-    sections_overview['Section_name'] = sections
-    sections_overview['Line_number'] = locations
-    sections_overview['Section_ID'] = section_ids
-    for sid, sn in enumerate(sections_overview['Section_name']):
-        data_start = data_start.append(pd.Series(sections_overview['Line_number'].iloc[sid] + 1))
-        if sid < len(sections_overview['Section_name']) - 1:
-            de = sections_overview['Line_number'].iloc[sid + 1] - 1
-        else:
-            de = len(file_contents) - 1
-        data_end = data_end.append(pd.Series(de))
-    sections_overview['Start_index'] = data_start
-    sections_overview['End_index'] = data_end
-    return sections_overview
+            add_section(sections, line, il)
+    close_sections(sections, len(file_contents))
+    return sections
 
 
-#def parse_lasfile(lasfile, mpath, destination_folder):
-def parse_lasfile(lasfile):
-    """ mpath - the way that the path is to be modified"""
-    """ mpath will be inserted between destination folder and files_name.csv"""
-    # logger.info('Retrieving data from LAS file ' + lasfile)
-    filename = os.path.splitext(os.path.basename(lasfile))[0]
-    source_folder = os.path.dirname(lasfile)
+def output_files(lasfile):
+    """Return the csv and json paths of lasfile in outputDir/<file name>/ next to the las file
+    (next to the archive for zip members, see las_input.input_name)"""
+    filename = las_input.input_name(lasfile)
+    source_folder = os.path.dirname(las_input.source_file(lasfile))
     #destination_folder = 'E:/IT/Projects/REP/LAS/LASTEST'
     new_folder_path = os.path.join(source_folder, 'outputDir', filename)
+    csvfile = os.path.join(new_folder_path, ''.join([filename, '.csv']))
+    jsonfile = os.path.join(new_folder_path, ''.join([filename, '.json']))
+    return csvfile, jsonfile
+
+
+#def parse_lasfile(lasfile, mpath, destination_folder):
+def parse_lasfile(lasfile, decimals=None, output_format='csv', compression=None, use_cache=False, force=False, verify=False,
+                  metadata_only=False, metrics=None, section_workers=None, section_processes=False, chunk_rows=None,
+                  pipeline=False, check_depths=False, pyramid=False):
+    """Parse lasfile into the curve data and JSON metadata files in outputDir/<file name>/ (see output_files)
+    decimals - round the curve values to this many decimals in the output, None keeps full precision
+    output_format - 'csv', 'parquet', 'feather' or 'npy' (see las_writers), compression is format specific
+    use_cache - skip files whose outputs are still valid (see las_cache), force - parse anyway and refresh the cache,
+    verify - compare content hashes even when size and mtime are unchanged
+    metadata_only - only save the JSON metadata, the data sections are not parsed and pandas is not imported
+    metrics - a dict to fill with the stage timings and counters of this run (see las_metrics)
+    section_workers, section_processes - parse LAS v3 data sections concurrently, see save_data_sections
+    chunk_rows - data rows converted and written at a time (default CHUNK_ROWS), bounds the memory per section
+    pipeline - parse the next chunk of data in a background thread while the previous one is written
+    check_depths - compare STRT/STOP/STEP of the header with the depths of the data, see las_stats.check_depths
+    pyramid - also write min/max/mean decimated levels of the curve data for previews, see las_pyramid
+    Returns 'parsed', 'metadata' (metadata_only), 'cached' or 'failed'"""
+    # logger.info('Retrieving data from LAS file ' + lasfile)
+    csvfile, jsonfile = output_files(lasfile)
+    new_folder_path = os.path.dirname(csvfile)
     #print(new_folder_path)
     if not os.path.isdir(new_folder_path):
         os.makedirs(new_folder_path)
-    csvfile = os.path.join(new_folder_path, ''.join([filename, '.csv']))
-    print('Generated CSV path: '+csvfile)
-    jsonfile = os.path.join(new_folder_path, ''.join([filename, '.json']))
+    logger.debug('Generated CSV path: '+csvfile)
+    options = {'decimals': decimals, 'output_format': output_format, 'compression': compression,
+               'metadata_only': metadata_only, 'check_depths': check_depths, 'pyramid': pyramid}
+    run = {'section_workers': section_workers, 'section_processes': section_processes, 'chunk_rows': chunk_rows,
+           'pipeline': pipeline}
+    if metrics is not None:
+        las_metrics.start(lasfile)
+        las_metrics.count('input_bytes', las_input.input_size(lasfile))
+    status = 'failed'
     try:
-        metadata = {}
-        logger.info('Retrieving data from LAS file ' + lasfile)
-        retrieved_data = pd.DataFrame()
-        log = las.LASReader(lasfile)
-        # VERSION INFORMATION
-        version_info = log.version.items
-        field_names = version_info.keys()
-        metadata['Version Information'] = {}
-        for fn in field_names:
-            field = version_info.get(fn)
-            metadata['Version Information'][fn] = {}
-            metadata['Version Information'][fn]['mnemonic'] = field.name
-            metadata['Version Information'][fn]['units'] = field.units
-            metadata['Version Information'][fn]['value'] = field.value
-            metadata['Version Information'][fn]['description'] = field.descr
-        # WELL INORMATION
-        fields = log.well.items
-        field_names = fields.keys()
-        metadata['Well Information'] = {}
-        for fn in field_names:
-            field = fields.get(fn)
-            metadata['Well Information'][fn] = {}
-            metadata['Well Information'][fn]['mnemonic'] = field.name
-            metadata['Well Information'][fn]['units'] = field.units
-            metadata['Well Information'][fn]['value'] = field.value
-            metadata['Well Information'][fn]['description'] = field.descr
-        # LOG PARAMETERS
-        log_parameters = log.parameters.items
-        param_names = log_parameters.keys()
-        metadata['Parameters'] = {}
-        for pn in param_names:
-            log_parameter = log_parameters.get(pn)
-            metadata['Parameters'][pn] = {}
-            metadata['Parameters'][pn]['mnemonic'] = log_parameter.name
-            metadata['Parameters'][pn]['units'] = log_parameter.units
-            metadata['Parameters'][pn]['value'] = log_parameter.data
-            metadata['Parameters'][pn]['description'] = log_parameter.descr
-        # ASCII
-        curves = log.curves.items
-        curve_names = curves.keys()
-        #print(type(log.data))
-        for cn in curve_names:
-            curve = curves.get(cn)
-            metadata['ASCII'][cn] = {}
-            metadata['ASCII'][cn]['mnemonic'] = curve.name
-            metadata['ASCII'][cn]['units'] = curve.units
-            metadata['ASCII'][cn]['value'] = curve.value
-            metadata['ASCII'][cn]['description'] = curve.descr
-            retrieved_data[cn] = pd.Series(log.data[cn])
-        # save_metadata(metadata, jsonfile)
-        # retrieved_data = retrieved_data.replace(-999.25, np.nan)
-        retrieved_data.to_csv(csvfile, index=False)
-        metadata['LAS file']=os.path.basename(lasfile)
-        if os.path.isfile(csvfile):
-            replace_null_values_in_csv(csvfile, -999.25)
-            metadata['CSV_files']={}
-            temp = os.path.realpath(csvfile)
-            # print(temp.find('outputDir'))
-            metadata['Data files']= temp[temp.find('outputDir')+8:]
-            print(list(metadata.keys()))
-            metadata = standardize_meta_section_names(metadata)
-            print(list(metadata.keys()))
-            save_metadata(metadata, jsonfile)
+        if use_cache:
+            status = convert_with_cache(lasfile, csvfile, jsonfile, options, force, verify, **run)
+        else:
+            status = convert_lasfile(lasfile, csvfile, jsonfile, **dict(options, **run))
+        return status
+    finally:
+        if metrics is not None:
+            collected = las_metrics.stop()
+            collected.finish(status)
+            metrics.update(collected.as_dict())
+
+
+def convert_with_cache(lasfile, csvfile, jsonfile, options, force=False, verify=False, **kwargs):
+    """ Run convert_lasfile unless the cache in outputDir holds valid outputs of lasfile, see parse_lasfile
+    options are the settings the outputs depend on, kwargs (RUN_OPTIONS) are passed on as well"""
+    with las_metrics.stage('cache'):
+        cache = las_cache.ParseCache(os.path.dirname(os.path.dirname(csvfile)), PARSER_VERSION)
+    try:
+        with las_metrics.stage('cache'):
+            valid = not force and cache.lookup(lasfile, options, verify=verify)
+        if valid:
+            logger.info('Unchanged since the last run, skipping ' + lasfile)
+            return 'cached'
+        # the content hash is computed from what the parse reads, the input is not read again for it
+        digest = las_cache.ContentDigest()
+        status = convert_lasfile(lasfile, csvfile, jsonfile, digest=digest, **dict(options, **kwargs))
+        with las_metrics.stage('cache'):
+            if status == 'failed':
+                cache.forget(lasfile)
+            else:
+                cache.store(lasfile, options, status, written_files(jsonfile), digest.hexdigest())
+        return status
+    finally:
+        cache.close()
+
+
+def written_files(jsonfile):
+    """Return the files written by the parse whose metadata is jsonfile: jsonfile and the data and
+    pyramid files listed in it"""
+    output_root = os.path.dirname(os.path.dirname(jsonfile))
+    with open(jsonfile) as f:
+        metadata = json.load(f)
+    references = metadata.get('Data files') or []
+    if not isinstance(references, list):
+        references = [references]
+    for levels in (metadata.get('Pyramid files') or {}).values():
+        references = references + [level['file'] for level in levels]
+    return [jsonfile] + [os.path.join(output_root, *reference.split('/')) for reference in references]
+
+
+def convert_lasfile(lasfile, csvfile, jsonfile, decimals=None, output_format='csv', compression=None, metadata_only=False,
+                    check_depths=False, pyramid=False, digest=None, **kwargs):
+    """ Parse lasfile into the curve data file(s) next to csvfile and the metadata in jsonfile
+    digest - a las_cache.ContentDigest fed the bytes the parse reads
+    Returns 'parsed', 'metadata' or 'failed'"""
+    if metadata_only:
+        return save_header_metadata(lasfile, jsonfile, digest)
+    try:
+        return parse_native(lasfile, csvfile, jsonfile, decimals, output_format, compression, check_depths=check_depths,
+                            pyramid=pyramid, digest=digest, **run_options(kwargs))
+    except Exception as e:
+        logger.error(e)
+        las_metrics.error('parse', e)
+        return 'failed'
+
+
+def parse_native(lasfile, csvfile, jsonfile, decimals=None, output_format='csv', compression=None, check_depths=False,
+                 pyramid=False, digest=None, **kwargs):
+    """ Parse lasfile in one pass over the header, then stream the data sections from their offsets
+    A compressed input is decompressed once: when the header pass reads all of it (LAS v3) it is copied
+    to a temporary file the data sections are read from (see las_input.Spool), LAS v2 data is streamed
+    digest - a las_cache.ContentDigest fed the bytes read
+    Returns 'parsed', or 'failed' when no data file was written (e.g. no version information)
+    Exceptions are left to the caller"""
+    #only the header is kept in memory, the data sections are streamed from the offsets in the section index
+    spool = None if las_input.is_plain(lasfile) else las_input.Spool()
+    try:
+        with las_metrics.stage('read_header'):
+            file_contents, sections = read_las_header(lasfile, spool, digest)
+        source = spool.path if spool is not None and spool.complete else lasfile
+        with las_metrics.stage('metadata'):
+            records, settings = parse_header_lines(file_contents)
+            metadata = read_metadata_sections(file_contents, sections, settings['version'], records)
+        data_files = parse_curve_data(metadata, file_contents, csvfile, source, sections, settings=settings,
+                                      decimals=decimals, output_format=output_format, compression=compression,
+                                      check_depths=check_depths, pyramid=pyramid, digest=digest,
+                                      **run_options(kwargs))
+    finally:
+        if spool is not None:
+            spool.close()
+    if not data_files:
+        logger.error('No curve data written for ' + lasfile)
+        las_metrics.error('parse', ValueError('No curve data written'))
+        return 'failed'
+    return 'parsed'
+
+
+def save_header_metadata(lasfile, jsonfile, digest=None):
+    """Save the metadata of lasfile to jsonfile without parsing the curve data
+    Only the header is read (for LAS v2 the file is read up to ~A), numpy and pandas are not needed
+    Returns 'metadata' or 'failed'"""
+    try:
+        with las_metrics.stage('read_header'):
+            file_contents, sections = read_las_header(lasfile, digest=digest)
+        with las_metrics.stage('metadata'):
+            metadata = read_metadata_sections(file_contents, sections)
+        metadata = standardize_meta_section_names(metadata)
+        save_metadata(metadata, jsonfile)
+        return 'metadata'
     except Exception as e:
         logger.error(e)
+        return 'failed'
+
+
+def parse_data_values(block, dlm=' '):
+    """Return all values of a bytes block of data lines as a flat float64 array
+    None is returned when the block holds tokens that are not numbers"""
+    import numpy as np
+    if dlm != ' ':
+        block = block.replace(dlm.encode(LAS_ENCODING), b' ')
+    try:
+        with warnings.catch_warnings():
+            # numpy 1.18-1.x warns about unparsable tokens and returns the values read so far, later versions raise
+            warnings.simplefilter('error', DeprecationWarning)
+            values = np.fromstring(block, dtype=np.float64, sep=' ')
+    except (ValueError, DeprecationWarning):
+        return None
+    # older numpy stops at an unparsable token without a warning, only the number of values tells
+    if np.lib.NumpyVersion(np.__version__) < '1.18.0' and values.size != len(block.split()):
+        return None
+    return values
+
+
+def parse_data_block(block, n_curves, dlm=' ', null_value=DEFAULT_NULL_VALUE):
+    """Return a float64 array with n_curves columns parsed from a bytes block of data lines
+    Values equal to null_value are replaced with NaN
+    ValueError is raised if the block holds non numeric values or rows of the wrong length"""
+    import numpy as np
+    rows = block.count(b'\n') + (not block.endswith(b'\n'))
+    values = parse_data_values(block, dlm)
+    if values is not None and values.size == rows * n_curves:
+        values = values.reshape(rows, n_curves)
+    else:
+        # blank lines or unparsable tokens, convert line by line to find out which
+        if dlm != ' ':
+            block = block.replace(dlm.encode(LAS_ENCODING), b' ')
+        values = np.array([line.split() for line in block.splitlines() if line.strip()], dtype=np.float64)
+        if values.ndim != 2 or values.shape[1] != n_curves:
+            raise ValueError('Expected ' + str(n_curves) + ' values per row, got shape ' + str(values.shape))
+    if null_value is not None:
+        values[values == null_value] = np.nan
+    return values
+
+
+def unwrap_data_blocks(blocks, n_curves, dlm=' ', null_value=DEFAULT_NULL_VALUE, remainder=None):
+    """Yield float64 arrays of complete rows from the bytes blocks of a wrapped (WRAP YES) data section
+    The values are read as one stream and cut into rows of n_curves values; the values of a row
+    split between two blocks are carried over, so the work is linear in the size of the section
+    ValueError is raised for non numeric values or when the values do not add up to whole rows;
+    with remainder (a dict) the arrays stop there instead, see parse_data_blocks"""
+    import numpy as np
+    carry = np.empty(0, dtype=np.float64)
+    blocks = iter(blocks)
+    for block in blocks:
+        values = parse_data_values(block, dlm)
+        if values is None:
+            error = ValueError('Non numeric values in wrapped data')
+            if remainder is None:
+                raise error
+            remainder.update(blocks=itertools.chain([block], blocks), carry=carry, error=error)
+            return
+        if carry.size:
+            values = np.concatenate((carry, values))
+        rows = values.size // n_curves
+        carry = values[rows * n_curves:]
+        values = values[:rows * n_curves].reshape(rows, n_curves)
+        if null_value is not None:
+            values[values == null_value] = np.nan
+        yield values
+    if carry.size:
+        error = ValueError(str(carry.size) + ' values left over after unwrapping rows of ' + str(n_curves))
+        if remainder is None:
+            raise error
+        remainder.update(blocks=iter([]), carry=carry, error=error)
+
+
+def parse_data_blocks(blocks, n_curves, dlm=' ', null_value=DEFAULT_NULL_VALUE, remainder=None):
+    """Yield the float64 array of every bytes block of an unwrapped data section, see parse_data_block
+    With remainder (a dict) a block the numeric reader cannot convert ends the arrays instead of raising:
+    remainder gets the error, that block and the blocks after it (blocks) and the values of a
+    wrapped row begun before it (carry), so the text parser can go on from there"""
+    blocks = iter(blocks)
+    for block in blocks:
         try:
-            file_contents = read_file_contents(lasfile)
-            clean_file_contents = remove_comments_blanklines(file_contents)
-            #file_contents have to be used so in case ~CURVE used in LASv3 we can retrieve curve names
-            metadata = read_metadata_sections(clean_file_contents)
-            parse_curve_data(metadata, clean_file_contents, csvfile)
-            ver = check_las_version(file_contents)
-        except Exception as e:
-            print(e)
+            values = parse_data_block(block, n_curves, dlm, null_value)
+        except ValueError as e:
+            if remainder is None:
+                raise
+            remainder.update(blocks=itertools.chain([block], blocks), carry=(), error=e)
+            return
+        yield values
+
+
+def unwrap_lines(lines, n_curves, dlm=' ', record=None):
+    """Yield lists of n_curves strings from the lines of a wrapped data section
+    A record starts with a line holding only the index value and takes the values of the following
+    lines until it is complete; used for sections the numeric unwrapper cannot handle
+    record - the values of a record begun before the lines"""
+    for line in lines:
+        values = line.split() if dlm == ' ' else [v.strip() for v in line.split(dlm) if v.strip()]
+        if record is None:
+            if len(values) == 1:
+                record = values
+            continue
+        record.extend(values)
+        if len(record) >= n_curves:
+            yield record[:n_curves]
+            record = None
+
+
+def count_data_bytes(blocks):
+    """Pass the data blocks on, adding their size to the data_bytes counter of the parse metrics"""
+    for block in blocks:
+        las_metrics.count('data_bytes', len(block))
+        yield block
+
+
+def rechunk_arrays(arrays, chunk_rows):
+    """Yield the rows of a sequence of 2D arrays again as arrays of chunk_rows rows (the last one shorter)"""
+    import numpy as np
+    pending = []
+    n_pending = 0
+    for values in arrays:
+        pending.append(values)
+        n_pending += len(values)
+        if n_pending < chunk_rows:
+            continue
+        values = np.concatenate(pending) if len(pending) > 1 else pending[0]
+        start = 0
+        while len(values) - start >= chunk_rows:
+            yield values[start:start + chunk_rows]
+            start += chunk_rows
+        pending = [values[start:]] if start < len(values) else []
+        n_pending = len(values) - start
+    if n_pending:
+        yield np.concatenate(pending) if len(pending) > 1 else pending[0]
+
+
+def timed_chunks(chunks, stage):
+    """Pass the items of a generator on, timing the work of producing each one as stage"""
+    chunks = iter(chunks)
+    while True:
+        with las_metrics.stage(stage):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def iter_data_arrays(lasfile, offset, n_curves, dlm=' ', null_value=DEFAULT_NULL_VALUE, wrap=False, chunk_rows=None,
+                     remainder=None, digest=None):
+    """Yield the data section whose section line starts at offset as float64 arrays of chunk_rows rows
+    (default CHUNK_ROWS); only one chunk and one read block are held in memory at a time
+    ValueError is raised when the numeric reader cannot handle the section, possibly after some chunks;
+    with remainder (a dict) the rows up to the block it cannot handle are yielded and the rest of the
+    section is left in remainder, see parse_data_blocks
+    digest - a las_cache.ContentDigest fed the bytes read"""
+    blocks = count_data_bytes(iter_data_blocks(lasfile, offset, digest=digest))
+    if wrap:
+        arrays = unwrap_data_blocks(blocks, n_curves, dlm, null_value, remainder)
+    else:
+        arrays = parse_data_blocks(blocks, n_curves, dlm, null_value, remainder)
+    for values in timed_chunks(rechunk_arrays(arrays, chunk_rows or CHUNK_ROWS), 'parse_data'):
+        las_metrics.count('rows', len(values))
+        yield values
+
+
+def read_data_array(lasfile, offset, n_curves, dlm=' ', null_value=DEFAULT_NULL_VALUE, wrap=False):
+    """Return the data section whose section line starts at offset as a float64 array"""
+    import numpy as np
+    arrays = list(iter_data_arrays(lasfile, offset, n_curves, dlm, null_value, wrap))
+    if not arrays:
+        return np.empty((0, n_curves), dtype=np.float64)
+    return np.concatenate(arrays)
+
+
+def iter_text_rows(lasfile, offset, n_curves, dlm=' ', null_value=DEFAULT_NULL_VALUE, wrap=False, chunk_rows=None):
+    """Yield the data section whose section line starts at offset as lists of chunk_rows rows of strings
+    Used for sections the numeric reader cannot handle (e.g. dates in LAS v3)"""
+    return text_row_chunks(iter_data_lines(lasfile, offset), n_curves, dlm, null_value, wrap, chunk_rows)
+
+
+def text_row_chunks(lines, n_curves, dlm=' ', null_value=DEFAULT_NULL_VALUE, wrap=False, chunk_rows=None, record=None):
+    """Yield the data lines as lists of chunk_rows rows of strings, see iter_text_rows
+    record - the values of a wrapped row begun before the lines"""
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    if wrap:
+        rows = ([null_to_nan(v, null_value) for v in row] for row in unwrap_lines(lines, n_curves, dlm, record))
+        chunks = iter(lambda: list(itertools.islice(rows, chunk_rows)), [])
+    else:
+        chunks = iter(lambda: fix_file_contents(itertools.islice(lines, chunk_rows), dlm=dlm, null_value=null_value),
+                      [])
+    # the wrapped chunks are taken from rows, the loop variable must not rebind it
+    for chunk in timed_chunks(chunks, 'text_parse'):
+        las_metrics.count('text_rows', len(chunk))
+        yield chunk
+
+
+def output_options(kwargs):
+    """Return the output settings (decimals, output_format, compression) found in kwargs"""
+    return dict((option, kwargs.get(option)) for option in OUTPUT_OPTIONS)
+
+
+def run_options(kwargs):
+    """Return the section_workers, section_processes, chunk_rows and pipeline settings found in kwargs"""
+    return dict((option, kwargs.get(option)) for option in RUN_OPTIONS)
+
+
+def rows_to_frame(rows, curve_names):
+    """Return a DataFrame from rows of strings, padding or cutting rows to the number of curves"""
+    import pandas as pd
+    frame = pd.DataFrame(rows)
+    if frame.shape[1] != len(curve_names):
+        logger.error('Expected ' + str(len(curve_names)) + ' values per row, found ' + str(frame.shape[1]))
+        frame = frame.reindex(columns=range(len(curve_names)))
+    frame.columns = curve_names
+    return frame
+
+
+def write_curve_chunks(frames, csvfile, curve_names, curve_info=None, decimals=None, output_format=None,
+                       compression=None, statistics=None, pyramid=None):
+    """Write the DataFrames of an iterable one after another into one file with the writer for output_format
+    and return the path of the file written; only the frame being written is held in memory
+    csvfile gives the location, the extension is set by the writer
+    curve_info - dict of curve metadata (mnemonic, units, description) stored with the columns where the format allows
+    decimals - round the values to this many decimals, None keeps full precision
+    statistics - a las_stats.CurveStatistics updated with the values as written
+    pyramid - a las_pyramid.CurvePyramid fed the values as written and closed with the file
+    A chunk the output format cannot hold (e.g. text columns in npy, text after numeric rows in parquet)
+    switches the table to csv, the rows written so far are copied over (see las_writers.reopen_as_csv)
+    If writing fails (including an error raised by frames) the partial file is removed and the error raised"""
+    names = [str(c) for c in curve_names]
+    writer = las_writers.open_writer(output_format or 'csv', os.path.splitext(csvfile)[0], names, curve_info,
+                                     compression)
+    rows = 0
+    try:
+        for frame in frames:
+            if decimals is not None:
+                frame = frame.round(decimals)
+            if statistics is not None:
+                with las_metrics.stage('statistics'):
+                    statistics.update(frame)
+            if pyramid is not None:
+                with las_metrics.stage('pyramid'):
+                    pyramid.update(frame)
+            with las_metrics.stage('write'):
+                try:
+                    writer.write(frame)
+                except ValueError as e:
+                    if isinstance(writer, las_writers.CsvWriter):
+                        raise
+                    logger.warning(str(e) + ', saving ' + csvfile + ' as csv')
+                    typed_writer, writer = writer, None
+                    writer = las_writers.reopen_as_csv(typed_writer, names, curve_info)
+                    writer.write(frame)
+            rows += len(frame)
+        with las_metrics.stage('write'):
+            writer.close()
+        if pyramid is not None:
+            with las_metrics.stage('pyramid'):
+                pyramid.close()
+    except BaseException:
+        # writer is None when switching to csv failed, reopen_as_csv has removed the files
+        if writer is not None:
+            writer.close()
+            os.remove(writer.path)
+        if pyramid is not None:
+            pyramid.abort()
+        raise
+    las_metrics.count('output_rows', rows)
+    las_metrics.count('output_bytes', os.path.getsize(writer.path))
+    logger.info('Saved curve data to ' + writer.path)
+    return writer.path
+
+
+def save_curve_table(frame, csvfile, curve_info=None, decimals=None, output_format=None, compression=None):
+    """Save a table of curves with the writer for output_format and return the path of the file written
+    see write_curve_chunks; a table the format cannot hold (e.g. text columns in npy) is saved as csv"""
+    return write_curve_chunks([frame], csvfile, frame.columns, curve_info, decimals, output_format, compression)
+
+
+def data_file_reference(data_file):
+    """Return the path of an output file relative to outputDir, as stored under 'Data files'"""
+    temp = os.path.realpath(data_file)
+    temp = temp[temp.find('outputDir')+8:]
+    temp = temp.replace('\\','/')
+    return temp[2:]
+
+
+def pyramid_references(levels):
+    """Return the levels of a pyramid (see las_pyramid.CurvePyramid.close) as stored under 'Pyramid files'"""
+    return [dict(level, file=data_file_reference(level['file'])) for level in levels]
+
+
+def null_to_nan(value, null_value=DEFAULT_NULL_VALUE):
+    """Return 'NaN' for a text value equal to the NULL value as a number, the value otherwise"""
+    try:
+        return 'NaN' if float(value) == null_value else value
+    except ValueError:
+        return value
 
 
 def fix_file_contents(file_contents, **kwargs):
@@ -378,49 +1016,140 @@ def fix_file_contents(file_contents, **kwargs):
         dlm = kwargs.get('dlm')
     else:
         dlm = ' '
+    null_value = kwargs.get('null_value', DEFAULT_NULL_VALUE)
     for line in file_contents:
         line = line.rstrip()
         line = re.sub(' +',' ',line)
         # for dlm in possible_delims:
         #     line = re.sub(dlm,' ', line)
         vals = line.split(dlm)
-        nvals = list()
-        for iv, v in enumerate(vals):
-            if '-999.25' in v:
-                v = 'NaN'
-            nvals.append(v)
-        fixed_file_contents.append(nvals)
-    #print(fixed_file_contents[0])
-    #print(len(fixed_file_contents[0]))
-    #print(type(fixed_file_contents[0]))
+        fixed_file_contents.append([null_to_nan(v, null_value) for v in vals])
     return fixed_file_contents
 
-def save_to_csv(file_contents, csvfile, col_names):
-    with open(csvfile,'w+') as f:
-        f.write(col_names)
-        f.write('\n')
-        for lid,line in enumerate(file_contents):
-            sline = ','.join(line)
-            f.write(sline)
-            if lid<=len(file_contents)-2:
-                #print('Line '+str(lid)+' of '+str(len(file_contents)))
-                f.write('\n')
-    f.close()
+def write_section(frames, csvfile, curve_names, curve_info=None, decimals=None, output_format=None, compression=None,
+                  pyramid=False):
+    """write_curve_chunks gathering the statistics of the curves and, with pyramid, writing their pyramid
+    next to the data file (see las_pyramid); returns the file written, the statistics and the pyramid levels"""
+    statistics = las_stats.CurveStatistics(curve_names)
+    levels = None
+    if pyramid:
+        levels = las_pyramid.CurvePyramid(os.path.splitext(csvfile)[0] + '_pyramid', curve_names, output_format,
+                                          compression)
+    data_file = write_curve_chunks(frames, csvfile, curve_names, curve_info, decimals, output_format, compression,
+                                   statistics, levels)
+    return data_file, statistics.as_dict(), levels.written if levels else []
+
+
+def save_data_section(lasfile, offset, csvfile, curve_names, dlm, null_value, curve_info=None, wrap=False,
+                      chunk_rows=None, pipeline=False, digest=None, **kwargs):
+    """Parse a data section with the vectorized reader, save it and return the path of the file written
+    together with the statistics of its curves ({curve name: statistics}, see las_stats) and the levels of
+    its pyramid (empty unless the pyramid option is set, see las_pyramid)
+    The section is streamed: chunk_rows rows (default CHUNK_ROWS) are read, converted and written at a time;
+    with pipeline the next chunks are parsed in a background thread while one is written (see las_pipeline)
+    The section is read once, see section_frames; a table the output format cannot hold (e.g. text columns
+    in npy) is saved as csv, see write_curve_chunks
+    digest - a las_cache.ContentDigest fed the bytes read"""
+    options = output_options(kwargs)
+    stream = las_pipeline.background_iter if pipeline else iter
+    frames = stream(section_frames(lasfile, offset, curve_names, dlm, null_value, wrap, chunk_rows, digest))
+    return write_section(frames, csvfile, curve_names, curve_info, **options)
+
+
+def section_frames(lasfile, offset, curve_names, dlm, null_value, wrap=False, chunk_rows=None, digest=None):
+    """Yield the data section whose section line starts at offset as DataFrames of chunk_rows rows
+    The rows are float64 from the vectorized reader; from the first block it cannot convert (e.g. dates
+    in LAS v3) on, the rest of the section goes through the string parser, so no part is read twice"""
+    with las_metrics.stage('import'):
+        import pandas as pd
+    remainder = {}
+    arrays = iter_data_arrays(lasfile, offset, len(curve_names), dlm, null_value, wrap, chunk_rows, remainder, digest)
+    for values in arrays:
+        yield pd.DataFrame(values, columns=curve_names)
+    if not remainder:
+        return
+    logger.warning('Numeric parsing failed, parsing the rest of the section as text: ' + str(remainder['error']))
+    las_metrics.error('parse_data', remainder['error'])
+    record = [repr(float(v)) for v in remainder['carry']] or None
+    chunks = text_row_chunks(block_lines(remainder['blocks']), len(curve_names), dlm, null_value, wrap, chunk_rows,
+                             record)
+    for rows in chunks:
+        yield rows_to_frame(rows, curve_names)
+
 
-def parse_curve_data(metadata, file_contents, csvfile):
-    ver = check_las_version(file_contents)
-    dlm = check_las_delimiter(file_contents)
+def save_data_section_process(job, options):
+    """Run save_data_section in a worker process, return its result and the metrics record made there
+    (see las_metrics), which the collector of the parent process cannot see"""
+    las_metrics.start(job[0])
+    try:
+        result = save_data_section(*job, **options)
+    finally:
+        record = las_metrics.stop().as_dict()
+    return result, record
+
+
+def save_data_sections(jobs, options, section_workers=None, section_processes=False, **kwargs):
+    """Run save_data_section for every job (a tuple of its positional arguments) and return the
+    (file written, curve statistics, pyramid levels) of each in the order of the jobs, so 'Data files' does not depend on which section finishes first
+    section_workers - number of sections handled at the same time, default one per section up to the
+    number of cores, 1 handles them one after another
+    section_processes - use processes instead of threads, for large files with several big sections;
+    not available inside las_batch workers, which cannot start processes of their own
+    kwargs - chunk_rows and pipeline, passed on to save_data_section
+    With threads, one section is written while the next is parsed; stage metrics are summed over the threads,
+    those of processes are sent back with the results and added to the collector of this process"""
+    options = dict(options, **kwargs)
+    workers = section_workers or min(len(jobs), os.cpu_count() or 1)
+    if workers <= 1 or len(jobs) <= 1:
+        return [save_data_section(*job, **options) for job in jobs]
+    if section_processes:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(save_data_section_process, job, options) for job in jobs]
+            results = []
+            for future in futures:
+                result, record = future.result()
+                las_metrics.merge(record)
+                results.append(result)
+            return results
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(save_data_section, *job, **options) for job in jobs]
+        return [future.result() for future in futures]
+
+
+def add_curve_statistics(curves, statistics):
+    """Store the statistics of every curve under 'statistics' in its entry of the curve section"""
+    for name, curve_statistics in statistics.items():
+        if isinstance(curves.get(name), dict):
+            curves[name]['statistics'] = curve_statistics
+
+
+def add_depth_check(metadata, depth_statistics):
+    """Store the comparison of STRT/STOP/STEP with the depth curve under 'Depth check', see las_stats.check_depths"""
+    metadata['Depth check'] = las_stats.check_depths(metadata.get('WELL_INFORMATION_SECTION'), depth_statistics)
+
+
+def parse_curve_data(metadata, file_contents, csvfile, lasfile, sections, settings=None, **kwargs):
+    """Dispatch to the LAS v2 or v3 data reader, settings from check_header_settings (read when not given)
+    Returns the data files written, empty when there are none"""
+    if settings is None:
+        settings = check_header_settings(file_contents)
+    ver = settings['version']
+    dlm = settings['dlm']
     if ver == 2:
         logger.info('LAS v. 2')
-        parse_las2_file(metadata, file_contents, csvfile)
+        return parse_las2_file(metadata, file_contents, csvfile, lasfile, sections, dlm=dlm, wrap=settings['wrap'],
+                               null_value=settings['null_value'], check_depths=kwargs.get('check_depths'),
+                               digest=kwargs.get('digest'), **dict(output_options(kwargs), **run_options(kwargs)))
     elif ver == 3:
         logger.info('LAS v. 3')
-        dlm = check_las_delimiter(file_contents)
-        parse_las3_file(metadata,file_contents,csvfile, dlm=dlm)
+        return parse_las3_file(metadata,file_contents,csvfile, lasfile, sections, dlm=dlm, wrap=settings['wrap'],
+                               null_value=settings['null_value'], check_depths=kwargs.get('check_depths'),
+                               **dict(output_options(kwargs), **run_options(kwargs)))
     else:
         logger.critical('no version information')
+        return []
 
-def parse_las2_file(metadata, file_contents, csvfile,**kwargs):
+def parse_las2_file(metadata, file_contents, csvfile, lasfile, sections, **kwargs):
     if kwargs.get('dlm'):
         dlm = kwargs.get('dlm')
     else:
@@ -429,169 +1158,144 @@ def parse_las2_file(metadata, file_contents, csvfile,**kwargs):
     curve_info_field = [s for s in meta_fields if s.upper().startswith("CURVE")][0]
     curves = metadata.get(curve_info_field)
     curve_names = list(curves.keys())
-    wrap = check_wrap_setting(file_contents)
-    col_names = ','.join(curve_names)
-    for lid,line in enumerate(file_contents):
-        if line.startswith('~A'):
-            file_data = file_contents[lid+1:]
+    wrap = kwargs['wrap'] if 'wrap' in kwargs else check_wrap_setting(file_contents)
+    null_value = kwargs['null_value'] if 'null_value' in kwargs else check_null_value(file_contents)
+    for section in sections:
+        if is_data_section(section.name) and section.name.startswith('A'):
+            data_offset = section.offset
             break
     if wrap:
         logger.info('WRAP: YES')
-        cn = len(curve_names)
-        logger.info('there are '+str(cn)+' curves')
-        if not curve_names[0].upper() == 'DEPTH':
-            logger.error('First curve should be DEPTH')
-        else:
-            unwrapped_data = list()
-            for i,line in enumerate(file_data):
-                if len(line.strip().split())==1:
-                    depth = list()
-                    depth = line.strip().split()
-                    c_left = cn-1
-                    for ci,cline in enumerate(file_data[i+1:]):
-                        cline_data = cline.strip().split()
-                        depth.extend(cline_data)
-                        c_left = c_left-len(cline_data)
-                        if c_left<=0:
-                            unwrapped_data.append(depth)
-                            break
-        fixed_file_contents = list()
-        for line in unwrapped_data:
-            for iv,val in enumerate(line):
-                if '-999.25' in val:
-                    line[iv]='NaN'
-            fixed_file_contents.append(line)
-    else:
-        fixed_file_contents = fix_file_contents(file_data,dlm=dlm)
-    #print(fixed_file_contents)
-    save_to_csv(fixed_file_contents, csvfile, col_names)
-    if os.path.isfile(csvfile):
+    data_file, statistics, levels = save_data_section(lasfile, data_offset, csvfile, curve_names, dlm, null_value,
+                                                      curves, wrap, chunk_rows=kwargs.get('chunk_rows'),
+                                                      pipeline=kwargs.get('pipeline'), digest=kwargs.get('digest'),
+                                                      **output_options(kwargs))
+    add_curve_statistics(curves, statistics)
+    if os.path.isfile(data_file):
         jsonfile = csvfile.replace('csv','json')
         metadata['Data files']={}
-        temp = os.path.realpath(csvfile)
-        temp = temp[temp.find('outputDir')+8:]
-        temp = temp.replace('\\','/')
-        # print(temp)
-        metadata['Data files']= temp[2:]
+        metadata['Data files']= data_file_reference(data_file)
+        if levels:
+            metadata['Pyramid files'] = {metadata['Data files']: pyramid_references(levels)}
         #metadata['CSV_files']=os.path.realpath(csvfile)
         # print(list(metadata.keys()))
-        print('Metadata keys before standarization')
-        print(metadata.keys())
+        logger.debug('Metadata keys before standarization: ' + str(metadata.keys()))
         metadata = standardize_meta_section_names(metadata)
-        print(list(metadata.keys()))
+        logger.debug(str(list(metadata.keys())))
+        if kwargs.get('check_depths'):
+            add_depth_check(metadata, statistics[curve_names[0]])
         save_metadata(metadata, jsonfile)
+        return [data_file]
     else:
         logger.error('No csv file created')
-        print('No csv file created')
-        print(csvfile)
+        logger.debug(csvfile)
+        return []
 
 
-def parse_las3_file(metadata,file_contents,csvfile,**kwargs):
+def parse_las3_file(metadata,file_contents,csvfile, lasfile, sections, **kwargs):
     if kwargs.get('dlm'):
         dlm = kwargs.get('dlm')
     else:
         dlm = ' '
-    meta_fields = list(metadata.keys())
-    # print(meta_fields)
-    section_overview = list_sections_present(file_contents)
-    # print(section_overview)
+    wrap = kwargs['wrap'] if 'wrap' in kwargs else check_wrap_setting(file_contents)
+    null_value = kwargs['null_value'] if 'null_value' in kwargs else check_null_value(file_contents)
     """ find sections that contain data"""
     data_sections = list()
-    for s in section_overview['Section_name']:
-        if "DATA" in s.upper():
+    for s in sections:
+        if "DATA" in s.name.upper():
             data_sections.append(s)
     # print(data_sections)
-    created_files = list()
-    for ds in data_sections:
+    if wrap:
+        logger.info('WRAP:YES')
+    jobs = list()
+    for data_section in data_sections:
+        ds = data_section.name
         if 'INPUT' not in ds.upper():
-            section_info = section_overview.loc[section_overview['Section_name']==ds]
-            print(ds)
-            #print(section_info)
-            si = section_info.at[0,"Start_index"]
-            ei = section_info.at[0,"End_index"]+1
-            file_data = file_contents[si:ei]
+            logger.debug(ds)
             section, definition = ds.split('|')
             section = section.strip()
             section_meta = metadata.get(definition.strip())
             curve_names = list(section_meta.keys())
-            wrap = check_wrap_setting(file_contents)
-            if wrap:
-                logger.info('WRAP:YES')
-                if curve_names[0].upper()=='DEPTH':
-                    unwrapped_data = list()
-                    for i,line in enumerate(file_data):
-                        if len(line.strip().split())==1:
-                            depth = list()
-                            depth = line.strip().split()
-                            c_left = cn-1
-                            for ci,cline in enumerate(file_data[i+1:]):
-                                cline_data = cline.strip().split()
-                                depth.extend(cline_data)
-                                c_left = c_left-len(cline_data)
-                                if c_left<=0:
-                                    unwrapped_data.append(depth)
-                                    break
-                    fixed_file_contents = list()
-                    for line in unwrapped_data:
-                        for iv,val in enumerate(line):
-                            if '-999.25' in val:
-                                line[iv]='NaN'
-                    fixed_file_contents.append(line)
-                else:
-                    logger.error('DEPTH should be the first curve')
-            else:
-                file_data = fix_file_contents(file_data, dlm=dlm)
             section_file = ''.join([os.path.splitext(csvfile)[0],'_',re.sub(' ','_',section),'.csv'])
-            print(section_file)
-            col_names = ','.join(curve_names)
-            save_to_csv(file_data, section_file, col_names)
+            logger.debug(section_file)
+            jobs.append((lasfile, data_section.offset, section_file, curve_names, dlm, null_value, section_meta, wrap))
+    created_files = list()
+    depth_statistics = None
+    results = save_data_sections(jobs, output_options(kwargs), **run_options(kwargs))
+    pyramids = {}
+    for (_, _, _, curve_names, _, _, section_meta, _), (data_file, statistics, levels) in zip(jobs, results):
+        add_curve_statistics(section_meta, statistics)
+        if os.path.isfile(data_file):
+            created_files.append(data_file)
+            if levels:
+                pyramids[data_file_reference(data_file)] = pyramid_references(levels)
+            if depth_statistics is None:
+                # the first data section holds the log curves STRT/STOP/STEP describe
+                depth_statistics = statistics[str(curve_names[0])]
     metadata['Data files']={}
     #create a list of file names
     fd = list()
-    for ds in data_sections:
-        section, definition = ds.split('|')
-        section = section.strip()
-        f = ''.join([os.path.splitext(csvfile)[0],'_',re.sub(' ','_',section),'.csv'])
-        if os.path.isfile(f):
-            temp = os.path.realpath(f)
-            temp = temp[temp.find('outputDir')+8:]
-            temp = temp.replace('\\','/')
-            fd.append(temp[2:])
+    for f in created_files:
+        fd.append(data_file_reference(f))
     metadata['Data files']=fd
-    print(list(metadata.keys()))
+    if pyramids:
+        metadata['Pyramid files'] = pyramids
+    logger.debug(str(list(metadata.keys())))
     metadata = standardize_meta_section_names(metadata)
-    print(list(metadata.keys()))
+    logger.debug(str(list(metadata.keys())))
+    if kwargs.get('check_depths') and depth_statistics is not None:
+        add_depth_check(metadata, depth_statistics)
     save_metadata(metadata, csvfile.replace('csv','json'))
     """some files have versoin declared as 3 but have structure following LAS2 standard"""
     if os.path.isfile(csvfile.replace('csv','json')) and not created_files:
         try:
             logger.error('No files created')
-            #print('No csv file created')
-            #print(csvfile)
-            #print('Trying to parse as LAS2')
             logger.error('Trying to parse as LAS2')
-            parse_las2_file(metadata, file_contents, csvfile,dlm=dlm)
+            return parse_las2_file(metadata, file_contents, csvfile, lasfile, sections, dlm=dlm, wrap=wrap,
+                                   null_value=null_value, check_depths=kwargs.get('check_depths'),
+                                   **dict(output_options(kwargs), **run_options(kwargs)))
         except Exception as e:
             logger.error(e)
-
-
-def replace_null_values_in_csv(csvfile, null_value):
-    try:
-        with open(csvfile, 'r+') as raw_file:
-            raw_data = pd.read_csv(raw_file)
-            raw_data = raw_data.replace(null_value, np.nan)
-            raw_data.round(5)
-            raw_data.to_csv(csvfile, index=False, na_rep='NaN')
-    except Exception as e:
-        print('Error while replacing '+str(null_value)+' to NaN')
-        print(e)
+    return created_files
 
 
 def main():
-    lasfile = sys.argv[1]
+    parser = argparse.ArgumentParser(description='Parse a las file into csv and json files')
+    parser.add_argument('lasfile', help='las file to parse')
+    parser.add_argument('--decimals', type=int, default=None, help='round curve values in the output (default: full precision)')
+    parser.add_argument('--format', dest='output_format', default='csv', choices=sorted(las_writers.OUTPUT_WRITERS),
+                        help='curve data output format')
+    parser.add_argument('--compression', default=None, help='csv: gzip, bz2, xz; parquet: snappy, gzip, zstd, ...; feather: lz4, zstd')
+    parser.add_argument('--cache', dest='use_cache', action='store_true', help='skip the file if its outputs are up to date')
+    parser.add_argument('--force', action='store_true', help='with --cache: parse even if the outputs are up to date')
+    parser.add_argument('--verify', action='store_true', help='with --cache: compare content hashes, not only size and mtime')
+    parser.add_argument('--metadata-only', action='store_true', help='only save the JSON metadata, skip the curve data')
+    parser.add_argument('--metrics', default=None, help='append the stage timings of the run to this file as a JSON line')
+    parser.add_argument('--section-workers', type=int, default=None,
+                        help='LAS v3 data sections parsed at the same time (default: one per section up to the number of cores)')
+    parser.add_argument('--section-processes', action='store_true', help='parse LAS v3 data sections in processes instead of threads')
+    parser.add_argument('--chunk-rows', type=int, default=None,
+                        help='data rows converted and written at a time, bounds the memory use (default: ' + str(CHUNK_ROWS) + ')')
+    parser.add_argument('--pipeline', action='store_true', help='parse the next rows while the previous ones are written')
+    parser.add_argument('--check-depths', action='store_true',
+                        help='compare STRT/STOP/STEP of the header with the depths of the data')
+    parser.add_argument('--pyramid', action='store_true',
+                        help='also write min/max/mean decimated levels of the curve data for previews')
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging(args.log_level, args.log_file)
+    lasfile = args.lasfile
     print('Parsing file: '+lasfile)
     logger.info('Parsing file: '+lasfile)
-    parse_lasfile(lasfile)
+    metrics = {} if args.metrics else None
+    parse_lasfile(lasfile, decimals=args.decimals, output_format=args.output_format, compression=args.compression,
+                  use_cache=args.use_cache, force=args.force, verify=args.verify, metadata_only=args.metadata_only,
+                  metrics=metrics, section_workers=args.section_workers, section_processes=args.section_processes,
+                  chunk_rows=args.chunk_rows, pipeline=args.pipeline, check_depths=args.check_depths,
+                  pyramid=args.pyramid)
+    if args.metrics:
+        with open(args.metrics, 'a') as f:
+            f.write(json.dumps(metrics) + '\n')
 
 
 if __name__ == '__main__':
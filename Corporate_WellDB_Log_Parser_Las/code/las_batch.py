@@ -0,0 +1,269 @@
+import argparse
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sqlite3
+import sys
+import time
+import traceback
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+import las_catalog
+import las_metrics
+import las_pipeline
+import las_sniff
+import las_input
+import las_writers
+
+logger = logging.getLogger()
+
+OUTPUT_FOLDER = 'outputDir'
+
+
+class FileTimeout(BaseException):
+    """Raised inside a worker when a file exceeds its time budget
+    Derived from BaseException so the broad 'except Exception' blocks in parse_lasfile
+    cannot swallow it and report the file as failed"""
+
+
+def find_las_files(root):
+    """Return a sorted list of las files found in the directory tree, skipping output folders
+    Compressed las files are included, zip archives are expanded into their las members (see las_input)"""
+    las_files = []
+    for folder, subfolders, files in os.walk(root):
+        subfolders[:] = sorted(sf for sf in subfolders if sf != OUTPUT_FOLDER)
+        for f in sorted(files):
+            if las_input.is_las_name(f):
+                las_files.append(os.path.join(folder, f))
+            elif las_input.is_archive(f):
+                las_files.extend(las_input.list_archive_members(os.path.join(folder, f)))
+    return las_files
+
+
+def read_manifest(manifest):
+    """Return the las files listed in a manifest, one path per line
+    Blank lines and lines starting with # are ignored, relative paths are relative to the manifest
+    A zip archive stands for all its las members, archive.zip::member.las for one of them"""
+    manifest_folder = os.path.dirname(os.path.abspath(manifest))
+    las_files = []
+    with open(manifest, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            path = os.path.join(manifest_folder, line)
+            if las_input.is_archive(path):
+                las_files.extend(las_input.list_archive_members(path))
+            else:
+                las_files.append(path)
+    return las_files
+
+
+def collect_input_files(inputs):
+    """Expand directories, zip archives, manifests and single las files into a list of las files"""
+    las_files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            las_files.extend(find_las_files(item))
+        elif las_input.is_archive(item):
+            las_files.extend(las_input.list_archive_members(item))
+        elif las_input.is_las_name(item) or las_input.split_member(item)[1] is not None:
+            las_files.append(item)
+        else:
+            las_files.extend(read_manifest(item))
+    return las_files
+
+
+def _raise_timeout(signum, frame):
+    raise FileTimeout()
+
+
+def _init_worker():
+    """Leave Ctrl+C handling to the parent process"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def parse_one(job):
+    """Parse a single file inside a worker and return a result record with the stage metrics of the run
+    Exceptions never leave this function so one bad file cannot stop the batch"""
+    lasfile, timeout, options = job
+    result = {'file': lasfile, 'status': None, 'seconds': None, 'cpu_seconds': None, 'error': None, 'metrics': {}}
+    use_alarm = bool(timeout) and hasattr(signal, 'SIGALRM')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    start = time.time()
+    cpu_start = time.process_time()
+    try:
+        result['status'] = lasparser.parse_lasfile(lasfile, metrics=result['metrics'], **options)
+    except FileTimeout:
+        result['status'] = 'timeout'
+        result['error'] = 'Exceeded ' + str(timeout) + ' s'
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = repr(e)
+        result['traceback'] = traceback.format_exc()
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    result['seconds'] = round(time.time() - start, 3)
+    result['cpu_seconds'] = round(time.process_time() - cpu_start, 3)
+    if result['status'] == 'failed' and result['error'] is None:
+        # parse_lasfile catches the exception and records it in the metrics
+        errors = result['metrics'].get('errors') or {}
+        result['error'] = '; '.join(name + ': ' + text for name, text in sorted(errors.items())) or None
+    if result['status'] == 'timeout':
+        logger.error('Timeout while parsing ' + lasfile)
+    return result
+
+
+def summarize(results):
+    """Return counts per status, the CPU time of the workers and the stage metrics summed over the files"""
+    counts = {}
+    for r in results:
+        counts[r['status']] = counts.get(r['status'], 0) + 1
+    summary = {}
+    summary['files'] = len(results)
+    summary['counts'] = counts
+    summary['cpu_seconds'] = round(sum(r.get('cpu_seconds') or 0 for r in results), 3)
+    summary['metrics'] = las_metrics.aggregate([r['metrics'] for r in results if r.get('metrics')])
+    return summary
+
+
+def save_report(report, reportfile):
+    """Save the batch report to a JSON file"""
+    with open(reportfile, 'w+') as f:
+        json.dump(report, f, indent=2)
+    logger.info('Saved batch report to ' + reportfile)
+
+
+def catalog_result(catalog, result):
+    """Upsert the metadata of a finished file into the catalog, errors are logged and do not stop the batch"""
+    if result['status'] not in ('parsed', 'metadata', 'cached'):
+        return
+    jsonfile = lasparser.output_files(result['file'])[1]
+    try:
+        # a cached file keeps the status of the run that wrote its outputs
+        status = None if result['status'] == 'cached' else result['status']
+        catalog.upsert(jsonfile, lasfile=result['file'], status=status)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        logger.error('Cannot catalog ' + jsonfile + ': ' + str(e))
+
+
+def run_batch(las_files, workers=None, timeout=None, reportfile=None, maxtasksperchild=None, catalog_file=None,
+              prefetch=0, schedule=False, **options):
+    """Parse all las_files in a pool of worker processes and return the batch report
+    workers - number of processes, defaults to the number of cores
+    timeout - per file limit in seconds (enforced where SIGALRM is available)
+    maxtasksperchild - recycle workers after this many files to cap memory growth
+    catalog_file - SQLite catalog (see las_catalog) the metadata of every file is upserted into, by this process
+    prefetch - read this many files ahead of the ones being parsed in a thread of this process (see las_pipeline)
+    schedule - profile the files from their headers first and hand out the largest ones first (see las_sniff),
+    so the batch does not end waiting on one giant file; the profile is added to the result of every file.
+    Wrapped files are not kept apart here, las_sniff.plan_bins does that when splitting the files into manifests
+    options are passed on to parse_lasfile"""
+    workers = workers or multiprocessing.cpu_count()
+    started = datetime.datetime.now()
+    start = time.time()
+    profiles = {}
+    if schedule:
+        profiles = dict((lasfile, las_sniff.sniff_lasfile(lasfile)) for lasfile in las_files)
+        las_files = las_sniff.schedule_order(profiles.values())
+        logger.info('Profiled ' + str(len(profiles)) + ' files in ' + str(round(time.time() - start, 3)) + ' s')
+    jobs = [(lasfile, timeout, options) for lasfile in las_files]
+    results = []
+    catalog = las_catalog.LasCatalog(catalog_file) if catalog_file else None
+    pool = multiprocessing.Pool(processes=workers, initializer=_init_worker,
+                                maxtasksperchild=maxtasksperchild)
+    # started after the workers are forked; the pool hands out the files in order, so the ones being
+    # parsed are the next `workers` after those done and the prefetcher reads the `prefetch` after them
+    prefetcher = None
+    if prefetch:
+        prefetcher = las_pipeline.FilePrefetcher(las_files, ahead=workers + prefetch, skip=workers)
+    try:
+        # chunksize 1: file sizes vary a lot, so hand out work one file at a time
+        for result in pool.imap_unordered(parse_one, jobs, chunksize=1):
+            if result['file'] in profiles:
+                result['profile'] = profiles[result['file']]
+            results.append(result)
+            if prefetcher:
+                prefetcher.advance()
+            if catalog:
+                catalog_result(catalog, result)
+            print('[' + str(len(results)) + '/' + str(len(jobs)) + '] ' + str(result['status']) + ' ' + result['file'])
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        if prefetcher:
+            prefetcher.stop()
+        if catalog:
+            catalog.close()
+    report = summarize(results)
+    report['started'] = started.isoformat()
+    report['wall_seconds'] = round(time.time() - start, 3)
+    report['workers'] = workers
+    report['timeout'] = timeout
+    if schedule:
+        report['sniff_seconds'] = round(sum(p['milliseconds'] for p in profiles.values()) / 1000.0, 3)
+    report['results'] = sorted(results, key=lambda r: r['file'])
+    if reportfile:
+        save_report(report, reportfile)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parse many las files in parallel')
+    parser.add_argument('inputs', nargs='+', help='directories, las files or manifest files (one path per line)')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of worker processes (default: all cores)')
+    parser.add_argument('--timeout', type=float, default=None, help='per file timeout in seconds')
+    parser.add_argument('--maxtasksperchild', type=int, default=None, help='restart workers after this many files')
+    parser.add_argument('--report', default='las_batch_report.json', help='summary report file')
+    parser.add_argument('--decimals', type=int, default=None, help='round curve values in the output (default: full precision)')
+    parser.add_argument('--format', dest='output_format', default='csv', choices=sorted(las_writers.OUTPUT_WRITERS),
+                        help='curve data output format')
+    parser.add_argument('--compression', default=None, help='compression of the curve data files (format specific)')
+    parser.add_argument('--cache', dest='use_cache', action='store_true', help='skip files whose outputs are up to date')
+    parser.add_argument('--force', action='store_true', help='with --cache: parse all files and refresh the cache')
+    parser.add_argument('--verify', action='store_true', help='with --cache: compare content hashes, not only size and mtime')
+    parser.add_argument('--metadata-only', action='store_true', help='only save the JSON metadata, skip the curve data')
+    parser.add_argument('--section-workers', type=int, default=1,
+                        help='threads per file for LAS v3 data sections (default: 1, the files already run in parallel)')
+    parser.add_argument('--chunk-rows', type=int, default=None,
+                        help='data rows converted and written at a time per worker (default: ' + str(lasparser.CHUNK_ROWS) + ')')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='read this many files ahead of the workers, for inputs on slow or network storage')
+    parser.add_argument('--pipeline', action='store_true', help='parse the next rows while the previous ones are written')
+    parser.add_argument('--check-depths', action='store_true',
+                        help='compare STRT/STOP/STEP of the header with the depths of the data')
+    parser.add_argument('--pyramid', action='store_true',
+                        help='also write min/max/mean decimated levels of the curve data for previews')
+    parser.add_argument('--schedule', action='store_true',
+                        help='profile the files from their headers and parse the largest first (see las_sniff.py)')
+    parser.add_argument('--catalog', default=None, help='upsert the metadata of the files into this SQLite catalog (see las_catalog.py)')
+    lasparser.add_logging_arguments(parser)
+    args = parser.parse_args()
+    lasparser.configure_logging(args.log_level, args.log_file)
+    las_files = collect_input_files(args.inputs)
+    print('Parsing ' + str(len(las_files)) + ' files')
+    logger.info('Batch of ' + str(len(las_files)) + ' files')
+    report = run_batch(las_files, workers=args.workers, timeout=args.timeout,
+                       reportfile=args.report, maxtasksperchild=args.maxtasksperchild, catalog_file=args.catalog,
+                       prefetch=args.prefetch, schedule=args.schedule, pipeline=args.pipeline,
+                       decimals=args.decimals, output_format=args.output_format, compression=args.compression,
+                       use_cache=args.use_cache, force=args.force, verify=args.verify,
+                       metadata_only=args.metadata_only, section_workers=args.section_workers,
+                       chunk_rows=args.chunk_rows, check_depths=args.check_depths,
+                       pyramid=args.pyramid)
+    print(json.dumps(report['counts']))
+    if report['counts'].get('failed') or report['counts'].get('timeout'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+"""Benchmark of the las parser on synthetic files
+
+LAS v2 files (space, comma or tab delimited, wrapped, with comment blocks) and LAS v3 files
+(several ~*_Data | *_Definition sections) are generated with a given number of rows, from KB to GB
+scale, and timed in two modes: 'native' (parse_native, header and all data sections) and
+'metadata' (save_header_metadata, the --metadata-only path). MB/s and rows/s are reported for
+'native' only, the metadata path does not read the data.
+
+Every measurement runs in a fresh subprocess, so the peak RSS reported belongs to that run only;
+the import of numpy and pandas is timed apart from the parse itself. Results are saved as JSON
+and can be compared to an earlier result file, runs slower than the baseline by more than the
+tolerance are reported as regressions.
+
+    python las_benchmark.py --rows 1000 100000 1000000 --output bench.json
+    python las_benchmark.py --rows 1000 100000 1000000 --baseline bench.json --output new.json
+"""
+import argparse
+import datetime
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+
+GENERATE_CHUNK_ROWS = 100000
+NULL_VALUE = -999.25
+START_DEPTH = 1000.0
+DEPTH_STEP = 0.1524
+WRAP_VALUES_PER_LINE = 5
+
+# case name -> generator settings
+CASES = {
+    'las2_space': {'version': 2, 'dlm': ' '},
+    'las2_comma': {'version': 2, 'dlm': ','},
+    'las2_tab': {'version': 2, 'dlm': '\t'},
+    'las2_wrap': {'version': 2, 'dlm': ' ', 'wrap': True},
+    'las2_comments': {'version': 2, 'dlm': ' ', 'comments': True},
+    'las3': {'version': 3, 'dlm': ','},
+}
+MODES = ('native', 'metadata')
+# modes of older result files measured with the same code path, for baseline comparison
+BASELINE_MODES = {'fallback': 'native'}
+DLM_NAMES = {' ': 'SPACE', ',': 'COMMA', '\t': 'TAB'}
+
+# LAS v3 data sections: name, share of the rows, number of curves (None: as requested)
+LAS3_SECTIONS = (('Log', 1.0, None), ('Core', 0.1, 4), ('Test', 0.05, 3))
+
+
+def header_line(mnemonic, units, value, description):
+    return ' ' + (mnemonic + '.' + units).ljust(12) + ' ' + str(value).ljust(20) + ' : ' + description + '\n'
+
+
+def comment_block(lines):
+    return ''.join('# synthetic comment line ' + str(i) + ', ignored by the parser\n' for i in range(lines))
+
+
+def version_section(version, wrap, dlm):
+    text = '~Version Information\n'
+    text += header_line('VERS', '', '%.1f' % version, 'CWLS LOG ASCII STANDARD - VERSION %.1f' % version)
+    text += header_line('WRAP', '', 'YES' if wrap else 'NO', 'MULTIPLE LINES PER DEPTH STEP' if wrap else 'ONE LINE PER DEPTH STEP')
+    if dlm != ' ' or version == 3:
+        text += header_line('DLM', '', DLM_NAMES[dlm], 'DELIMITING CHARACTER BETWEEN DATA COLUMNS')
+    return text
+
+
+def well_section(rows):
+    text = '~Well Information\n'
+    text += header_line('STRT', 'M', '%.4f' % START_DEPTH, 'START DEPTH')
+    text += header_line('STOP', 'M', '%.4f' % (START_DEPTH + (rows - 1) * DEPTH_STEP), 'STOP DEPTH')
+    text += header_line('STEP', 'M', '%.4f' % DEPTH_STEP, 'STEP')
+    text += header_line('NULL', '', NULL_VALUE, 'NULL VALUE')
+    text += header_line('COMP', '', 'BENCHMARK', 'COMPANY')
+    text += header_line('WELL', '', 'SYNTHETIC-1', 'WELL')
+    text += header_line('FLD', '', 'SYNTHETIC', 'FIELD')
+    return text
+
+
+def curve_lines(n_curves, prefix='C'):
+    text = header_line('DEPT', 'M', '', 'DEPTH')
+    for ci in range(1, n_curves):
+        text += header_line(prefix + '%02d' % ci, 'API', '', 'SYNTHETIC CURVE ' + str(ci))
+    return text
+
+
+def data_format(n_curves, dlm, wrap):
+    """Return the np.savetxt row format, a wrapped row has the depth on its own line"""
+    if not wrap:
+        return dlm.join(['%.4f'] * n_curves)
+    lines = ['%.4f']
+    values = n_curves - 1
+    while values > 0:
+        lines.append(' '.join(['%.4f'] * min(values, WRAP_VALUES_PER_LINE)))
+        values -= WRAP_VALUES_PER_LINE
+    return '\n'.join(lines)
+
+
+def write_data(f, rows, n_curves, dlm=' ', wrap=False, comments=False, seed=0):
+    """Write rows of synthetic curve values in chunks, every 50th value of the second curve is NULL"""
+    import numpy as np
+    rng = np.random.RandomState(seed)
+    fmt = data_format(n_curves, dlm, wrap)
+    chunk_rows = GENERATE_CHUNK_ROWS // 10 if comments else GENERATE_CHUNK_ROWS
+    for first in range(0, rows, chunk_rows):
+        n = min(chunk_rows, rows - first)
+        values = rng.uniform(0, 150, (n, n_curves))
+        values[:, 0] = START_DEPTH + np.arange(first, first + n) * DEPTH_STEP
+        if n_curves > 1:
+            values[(np.arange(first, first + n) % 50) == 0, 1] = NULL_VALUE
+        if comments:
+            f.write(comment_block(20).encode('ascii'))
+        np.savetxt(f, values, fmt=fmt)
+
+
+def write_las2(path, rows, n_curves, dlm=' ', wrap=False, comments=False):
+    """Write a synthetic LAS v2 file"""
+    with open(path, 'wb') as f:
+        text = comment_block(200) if comments else ''
+        text += version_section(2.0, wrap, dlm) + well_section(rows)
+        text += '~Curve Information\n' + curve_lines(n_curves)
+        text += '~Parameter Information\n' + header_line('BHT', 'DEGC', '35.5', 'BOTTOM HOLE TEMPERATURE')
+        if comments:
+            text += comment_block(200)
+        text += '~Other\n Synthetic file generated by las_benchmark.py\n'
+        text += '~A  DEPT ' + ' '.join('C%02d' % ci for ci in range(1, n_curves)) + '\n'
+        f.write(text.encode('ascii'))
+        write_data(f, rows, n_curves, dlm, wrap, comments)
+
+
+def write_las3(path, rows, n_curves, dlm=',', wrap=False, comments=False):
+    """Write a synthetic LAS v3 file with a Log, Core and Test data section"""
+    with open(path, 'wb') as f:
+        text = comment_block(200) if comments else ''
+        text += version_section(3.0, wrap, dlm) + well_section(rows)
+        f.write(text.encode('ascii'))
+        for si, (name, share, section_curves) in enumerate(LAS3_SECTIONS):
+            section_curves = section_curves or n_curves
+            text = '~' + name + '_Parameter\n' + header_line('RUN', '', str(si + 1), 'RUN NUMBER')
+            text += '~' + name + '_Definition\n' + curve_lines(section_curves, name[0])
+            text += '~' + name + '_Data | ' + name + '_Definition\n'
+            f.write(text.encode('ascii'))
+            write_data(f, max(1, int(rows * share)), section_curves, dlm, wrap, comments, seed=si)
+
+
+def case_rows(case, rows):
+    """Return the total number of data rows of a generated file"""
+    if CASES[case]['version'] == 3:
+        return sum(max(1, int(rows * share)) for name, share, section_curves in LAS3_SECTIONS)
+    return rows
+
+
+def generate_case(case, rows, n_curves, workdir):
+    """Return the path of the synthetic file for case, written unless it is already in workdir"""
+    settings = CASES[case]
+    path = os.path.join(workdir, case + '_' + str(rows) + 'r_' + str(n_curves) + 'c.las')
+    if not os.path.isfile(path):
+        writer = write_las3 if settings['version'] == 3 else write_las2
+        writer(path + '.part', rows, n_curves, settings['dlm'], settings.get('wrap', False), settings.get('comments', False))
+        os.rename(path + '.part', path)
+    return path
+
+
+def peak_rss_mb():
+    """Return the peak resident memory of this process in MB
+    On Linux ru_maxrss keeps the peak of the parent process from before exec, VmHWM does not"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except IOError:
+        pass
+    import resource
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0)
+
+
+def run_child(lasfile, mode, resultfile):
+    """Parse lasfile with one path inside the benchmark subprocess and save the measurement"""
+    lasparser.configure_logging('ERROR', os.devnull)
+    filename = os.path.splitext(os.path.basename(lasfile))[0]
+    folder = os.path.join(os.path.dirname(lasfile), 'outputDir', filename + '_' + mode)
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    csvfile = os.path.join(folder, filename + '.csv')
+    jsonfile = os.path.join(folder, filename + '.json')
+    result = {'status': 'failed', 'error': None}
+    # the parser imports these lazily, their import time is reported apart from the parse time
+    start = time.time()
+    if mode != 'metadata':
+        for module in ('numpy', 'pandas'):
+            importlib.import_module(module)
+    result['import_seconds'] = round(time.time() - start, 4)
+    start = time.time()
+    try:
+        if mode == 'metadata':
+            result['status'] = lasparser.save_header_metadata(lasfile, jsonfile)
+        else:
+            result['status'] = lasparser.parse_native(lasfile, csvfile, jsonfile)
+    except Exception as e:
+        result['error'] = repr(e)
+    result['seconds'] = time.time() - start
+    result['peak_rss_mb'] = peak_rss_mb()
+    with open(resultfile, 'w') as f:
+        json.dump(result, f)
+
+
+def measure(lasfile, mode, repeat=1):
+    """Run the parse path in subprocesses and return the fastest of repeat runs"""
+    best = None
+    for i in range(repeat):
+        fd, resultfile = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            subprocess.check_call([sys.executable, os.path.abspath(__file__), '--child', lasfile, mode, resultfile],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            with open(resultfile) as f:
+                result = json.load(f)
+        finally:
+            os.remove(resultfile)
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best
+
+
+def run_benchmark(rows_list, n_curves=10, cases=None, modes=MODES, workdir=None, repeat=1):
+    """Generate the files, time every case/size/mode and return the benchmark report"""
+    import numpy
+    import pandas
+    workdir = workdir or os.path.join(tempfile.gettempdir(), 'las_benchmark')
+    if not os.path.isdir(workdir):
+        os.makedirs(workdir)
+    report = {'created': datetime.datetime.now().isoformat(),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'numpy': numpy.__version__,
+              'pandas': pandas.__version__,
+              'parser_version': lasparser.PARSER_VERSION,
+              'curves': n_curves,
+              'repeat': repeat,
+              'results': []}
+    for case in cases or sorted(CASES):
+        for rows in rows_list:
+            lasfile = generate_case(case, rows, n_curves, workdir)
+            size_mb = os.path.getsize(lasfile) / 1e6
+            total_rows = case_rows(case, rows)
+            for mode in modes:
+                result = measure(lasfile, mode, repeat)
+                result.update({'case': case, 'rows': rows, 'mode': mode, 'file_mb': round(size_mb, 3)})
+                seconds = max(result['seconds'], 1e-9)
+                # the metadata path reads the header only, rates over the whole file would mean nothing
+                result['mb_per_s'] = None if mode == 'metadata' else round(size_mb / seconds, 3)
+                result['rows_per_s'] = None if mode == 'metadata' else round(total_rows / seconds, 1)
+                result['seconds'] = round(result['seconds'], 4)
+                result['peak_rss_mb'] = round(result['peak_rss_mb'], 1)
+                report['results'].append(result)
+                print_result(result)
+    return report
+
+
+def format_rate(value, width, decimals):
+    return '-'.rjust(width) if value is None else '%*.*f' % (width, decimals, value)
+
+
+def print_result(result, baseline=None):
+    line = '%-14s %10d %-8s %-9s %9.3f s %s MB/s %s rows/s %8.1f MB RSS' % (
+        result['case'], result['rows'], result['mode'], result['status'], result['seconds'],
+        format_rate(result.get('mb_per_s'), 9, 2), format_rate(result.get('rows_per_s'), 12, 0), result['peak_rss_mb'])
+    if baseline is not None:
+        line += '   %+6.1f%% time' % (100.0 * (result['seconds'] / max(baseline['seconds'], 1e-9) - 1))
+    print(line)
+
+
+def compare_reports(report, baseline, tolerance=0.1):
+    """Print every result next to the baseline and return the results slower by more than tolerance
+    Runs that took less than 50 ms in the baseline are too noisy to count as regressions"""
+    previous = dict(((r['case'], r['rows'], BASELINE_MODES.get(r['mode'], r['mode'])), r) for r in baseline['results'])
+    regressions = []
+    print('Compared with ' + baseline.get('created', 'baseline') + ' (parser ' + str(baseline.get('parser_version')) + ')')
+    for result in report['results']:
+        old = previous.get((result['case'], result['rows'], result['mode']))
+        print_result(result, old)
+        if old is None or 'failed' in (old['status'], result['status']):
+            continue
+        if old['seconds'] >= 0.05 and result['seconds'] > old['seconds'] * (1 + tolerance):
+            regressions.append(result)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the las parser on synthetic files')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000], help='data rows per file (10M rows of 10 curves is about 1 GB)')
+    parser.add_argument('--curves', type=int, default=10, help='curves per file (LAS v3: in the Log section)')
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=None, help='file types (default: all)')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES), help='parse paths to time')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per measurement, the fastest is kept')
+    parser.add_argument('--workdir', default=None, help='folder for the generated files (kept between runs)')
+    parser.add_argument('--output', default=None, help='save the results to this JSON file')
+    parser.add_argument('--baseline', default=None, help='JSON results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed slowdown against the baseline (0.1 = 10%%)')
+    parser.add_argument('--child', nargs=3, metavar=('LASFILE', 'MODE', 'RESULTFILE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(*args.child)
+        return
+    report = run_benchmark(args.rows, args.curves, args.cases, args.modes, args.workdir, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print('Saved results to ' + args.output)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_reports(report, baseline, args.tolerance)
+        if regressions:
+            print(str(len(regressions)) + ' regression(s) over ' + str(int(args.tolerance * 100)) + '%')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
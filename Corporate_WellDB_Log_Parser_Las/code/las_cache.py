@@ -0,0 +1,151 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+import las_input
+
+logger = logging.getLogger()
+
+CACHE_FILE = 'las_cache.sqlite'
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_digest(path):
+    """Return the sha256 hex digest of the file contents, decompressed for compressed inputs (see las_input)"""
+    h = hashlib.sha256()
+    with las_input.open_las(path, background=False) as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ContentDigest(object):
+    """sha256 of the contents of an input (decompressed, as file_digest) built from the reads of the parse
+    update() gets the bytes read with their offset in the contents; only bytes continuing those hashed
+    so far are added, so overlapping reads (the LAS v2 data stream starting inside the header chunks)
+    and readers of other threads do not spoil it. hexdigest() is None unless the parse read the input
+    up to its end (end()), e.g. a LAS v2 header read for the metadata only"""
+
+    def __init__(self):
+        self.h = hashlib.sha256()
+        self.position = 0
+        self.complete = False
+        self.lock = threading.Lock()
+
+    def update(self, data, offset):
+        with self.lock:
+            start = self.position - offset
+            if 0 <= start < len(data):
+                self.h.update(data[start:] if start else data)
+                self.position = offset + len(data)
+
+    def update_buffer(self, buf, start, stop):
+        """Add buf[start:stop] (e.g. of a memory map) in pieces of HASH_CHUNK_SIZE bytes"""
+        for pos in range(start, stop, HASH_CHUNK_SIZE):
+            self.update(buf[pos:min(pos + HASH_CHUNK_SIZE, stop)], pos)
+
+    def end(self, offset):
+        """Record that the contents end at offset"""
+        with self.lock:
+            self.complete = self.complete or offset == self.position
+
+    def hexdigest(self):
+        return self.h.hexdigest() if self.complete else None
+
+
+def list_outputs(files):
+    """Return [path, size, mtime] for every file written by a run"""
+    outputs = []
+    for path in files:
+        st = os.stat(path)
+        outputs.append([path, st.st_size, st.st_mtime])
+    return outputs
+
+
+def outputs_valid(outputs):
+    """Return True if all recorded output files still exist unchanged"""
+    if not outputs:
+        return False
+    for path, size, mtime in outputs:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if st.st_size != size or st.st_mtime != mtime:
+            return False
+    return True
+
+
+class ParseCache(object):
+    """Index of parsed las files kept in an SQLite database in the output root (outputDir)
+
+    An entry is valid when the parser version and output options match, the recorded outputs
+    are unchanged and the input is unchanged. The input is compared by size and mtime first;
+    only when those differ (e.g. the file was copied or touched) or verify is requested the
+    content hash decides. The hash stored is the one the parse computed while reading the input (see
+    ContentDigest) or lookup computed; without one (a metadata-only run of a LAS v2 file does not read
+    the data) a changed size or mtime makes the entry invalid.
+    """
+
+    def __init__(self, output_root, parser_version):
+        if not os.path.isdir(output_root):
+            os.makedirs(output_root)
+        self.parser_version = parser_version
+        self.db = sqlite3.connect(os.path.join(output_root, CACHE_FILE), timeout=60)
+        self.db.execute('CREATE TABLE IF NOT EXISTS parsed_files ('
+                        'path TEXT PRIMARY KEY, size INTEGER, mtime REAL, sha256 TEXT, '
+                        'parser_version TEXT, options TEXT, status TEXT, outputs TEXT, parsed_at TEXT)')
+        self.db.commit()
+        # hashes computed by lookup, reused by store
+        self.digests = {}
+
+    def close(self):
+        self.db.close()
+
+    def lookup(self, lasfile, options, verify=False):
+        """Return the status of the previous run if its outputs are still valid, otherwise None"""
+        path = os.path.abspath(lasfile)
+        row = self.db.execute('SELECT size, mtime, sha256, parser_version, options, status, outputs '
+                              'FROM parsed_files WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return None
+        size, mtime, digest, parser_version, cached_options, status, outputs = row
+        if parser_version != self.parser_version or cached_options != json.dumps(options, sort_keys=True):
+            return None
+        if not outputs_valid(json.loads(outputs)):
+            return None
+        # for zip members the archive is compared; when it changed, the member contents decide
+        st = os.stat(las_input.source_file(lasfile))
+        if st.st_size == size and st.st_mtime == mtime and not verify:
+            return status
+        size_changed = st.st_size != size and las_input.split_member(lasfile)[1] is None
+        if size_changed or digest is None:
+            return None
+        self.digests[path] = file_digest(lasfile)
+        if self.digests[path] != digest:
+            return None
+        # same contents, remember the new mtime so the hash is not needed next time
+        self.db.execute('UPDATE parsed_files SET size = ?, mtime = ? WHERE path = ?', (st.st_size, st.st_mtime, path))
+        self.db.commit()
+        return status
+
+    def store(self, lasfile, options, status, outputs, digest=None):
+        """Record a successful run and the files it wrote (outputs)
+        digest - the content hash computed by the run, if any (see ContentDigest); the input is not read here"""
+        path = os.path.abspath(lasfile)
+        st = os.stat(las_input.source_file(lasfile))
+        self.db.execute('INSERT OR REPLACE INTO parsed_files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (path, st.st_size, st.st_mtime, digest or self.digests.get(path),
+                         self.parser_version, json.dumps(options, sort_keys=True), status,
+                         json.dumps(list_outputs(outputs)), datetime.datetime.now().isoformat()))
+        self.db.commit()
+        logger.info('Cached ' + lasfile)
+
+    def forget(self, lasfile):
+        """Drop the entry of a file, e.g. after a failed run"""
+        self.db.execute('DELETE FROM parsed_files WHERE path = ?', (os.path.abspath(lasfile),))
+        self.db.commit()
@@ -0,0 +1,334 @@
+"""Catalog of the metadata of parsed las files in one indexed SQLite database
+
+The JSON files written by the parser (outputDir/<name>/<name>.json) are loaded into three tables:
+
+    wells         one row per file: identifiers (UWI, API, WELL, FLD, COMP), STRT/STOP/STEP and the
+                  depth range top..base, the data files
+    curves        one row per curve of CURVE_INFORMATION_SECTION or a LAS v3 *_Definition section
+    header_items  every other header line (mnemonic, units, value, description) per section
+
+Files are upserted: a JSON that did not change since it was loaded is skipped, a changed one
+replaces its rows. Load output folders and query from the command line:
+
+    python las_catalog.py catalog.sqlite add /data/welldb
+    python las_catalog.py catalog.sqlite query --curve GR --curve RHOB --top 1500 --base 1600
+    python las_catalog.py catalog.sqlite query --well "NORTH*" --param FLD=TROLL --json
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import sqlite3
+
+logger = logging.getLogger()
+
+OUTPUT_FOLDER = 'outputDir'
+WELL_SECTION = 'WELL_INFORMATION_SECTION'
+VERSION_SECTION = 'VERSION_INFORMATION_SECTION'
+CURVE_SECTION = 'CURVE_INFORMATION_SECTION'
+# entries the parser adds to the JSON besides the header sections
+PARSER_ENTRIES = ('Data files', 'Pyramid files', 'Depth check')
+# wells columns filled from the mnemonics of the well information section
+WELL_IDS = (('uwi', ('UWI', 'UWID')), ('api', ('API',)), ('well', ('WELL',)), ('field', ('FLD', 'FIELD')),
+            ('company', ('COMP',)))
+WELL_COLUMNS = ('jsonfile', 'lasfile', 'json_mtime', 'status', 'version', 'uwi', 'api', 'well', 'field', 'company',
+                'strt', 'stop', 'step', 'top', 'base', 'depth_units', 'data_files', 'updated_at')
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS wells ('
+    'jsonfile TEXT PRIMARY KEY, lasfile TEXT, json_mtime REAL, status TEXT, version TEXT, '
+    'uwi TEXT COLLATE NOCASE, api TEXT COLLATE NOCASE, well TEXT COLLATE NOCASE, field TEXT COLLATE NOCASE, '
+    'company TEXT COLLATE NOCASE, strt REAL, stop REAL, step REAL, top REAL, base REAL, depth_units TEXT, '
+    'data_files TEXT, updated_at TEXT)',
+    'CREATE TABLE IF NOT EXISTS curves ('
+    'jsonfile TEXT, section TEXT, mnemonic TEXT COLLATE NOCASE, units TEXT COLLATE NOCASE, description TEXT)',
+    'CREATE TABLE IF NOT EXISTS header_items ('
+    'jsonfile TEXT, section TEXT, mnemonic TEXT COLLATE NOCASE, units TEXT, value TEXT COLLATE NOCASE, description TEXT)',
+    'CREATE INDEX IF NOT EXISTS wells_uwi ON wells (uwi)',
+    'CREATE INDEX IF NOT EXISTS wells_api ON wells (api)',
+    'CREATE INDEX IF NOT EXISTS wells_well ON wells (well)',
+    'CREATE INDEX IF NOT EXISTS wells_field ON wells (field)',
+    'CREATE INDEX IF NOT EXISTS wells_depth ON wells (top, base)',
+    'CREATE INDEX IF NOT EXISTS curves_mnemonic ON curves (mnemonic, units)',
+    'CREATE INDEX IF NOT EXISTS curves_units ON curves (units)',
+    'CREATE INDEX IF NOT EXISTS curves_jsonfile ON curves (jsonfile)',
+    'CREATE INDEX IF NOT EXISTS header_items_mnemonic ON header_items (mnemonic, value)',
+    'CREATE INDEX IF NOT EXISTS header_items_jsonfile ON header_items (jsonfile)',
+]
+
+
+def to_float(value):
+    """Return value as a float, None if it is not a number"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def item_value(item):
+    """Return the value of a header item; LAS 1.2 style well sections keep it in the description"""
+    return item.get('value') or item.get('description') or None
+
+
+def is_curve_section(name):
+    """Return True for the sections listing curves: CURVE_INFORMATION_SECTION and LAS v3 *_Definition sections"""
+    return name == CURVE_SECTION or name.upper().endswith('DEFINITION')
+
+
+def find_json_files(root):
+    """Return the metadata files (outputDir/<name>/<name>.json) found in the directory tree"""
+    json_files = []
+    for folder, subfolders, files in os.walk(root):
+        subfolders.sort()
+        name = os.path.basename(folder)
+        if os.path.basename(os.path.dirname(folder)) == OUTPUT_FOLDER and name + '.json' in files:
+            json_files.append(os.path.join(folder, name + '.json'))
+    return json_files
+
+
+def well_record(metadata):
+    """Return the wells columns taken from a metadata dict (the contents of a parser JSON file)"""
+    record = {}
+    well_info = metadata.get(WELL_SECTION) or {}
+    version = (metadata.get(VERSION_SECTION) or {}).get('VERS') or {}
+    record['version'] = version.get('value')
+    upper = dict((mnemonic.upper(), item) for mnemonic, item in well_info.items() if isinstance(item, dict))
+    for column, mnemonics in WELL_IDS:
+        record[column] = None
+        for mnemonic in mnemonics:
+            if mnemonic in upper and item_value(upper[mnemonic]):
+                record[column] = item_value(upper[mnemonic])
+                break
+    for column in ('strt', 'stop', 'step'):
+        record[column] = to_float((upper.get(column.upper()) or {}).get('value'))
+    depths = [d for d in (record['strt'], record['stop']) if d is not None]
+    record['top'] = min(depths) if depths else None
+    record['base'] = max(depths) if depths else None
+    record['depth_units'] = (upper.get('STRT') or {}).get('units') or None
+    # metadata-only outputs have no data files
+    data_files = metadata.get('Data files') or []
+    record['data_files'] = json.dumps(data_files if isinstance(data_files, list) else [data_files])
+    return record
+
+
+def header_rows(jsonfile, metadata):
+    """Return the rows for the curves and header_items tables of a metadata dict
+    The entries added by the parser (PARSER_ENTRIES) are not header lines and are left out; an item with
+    statistics is a curve whatever the name of its section"""
+    curves = []
+    items = []
+    for section, entries in metadata.items():
+        if section in PARSER_ENTRIES or not isinstance(entries, dict):
+            continue
+        for mnemonic, item in entries.items():
+            if not isinstance(item, dict):
+                continue
+            if is_curve_section(section) or 'statistics' in item:
+                curves.append((jsonfile, section, mnemonic, item.get('units') or None, item.get('description')))
+            else:
+                items.append((jsonfile, section, mnemonic, item.get('units') or None, item.get('value'),
+                              item.get('description')))
+    return curves, items
+
+
+def like_or_equal(column, pattern):
+    """Return an SQL condition and its argument, patterns with * or % are matched with LIKE"""
+    if '*' in pattern or '%' in pattern:
+        return column + ' LIKE ?', pattern.replace('*', '%')
+    return column + ' = ?', pattern
+
+
+class LasCatalog(object):
+    """Indexed SQLite catalog of the metadata of parsed las files, see the module docstring"""
+
+    def __init__(self, catalog_file):
+        folder = os.path.dirname(os.path.abspath(catalog_file))
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        self.db = sqlite3.connect(catalog_file, timeout=60)
+        for statement in SCHEMA:
+            self.db.execute(statement)
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def commit(self):
+        self.db.commit()
+
+    def upsert(self, jsonfile, lasfile=None, status=None, force=False, commit=True):
+        """Load a parser JSON file into the catalog, replacing the earlier rows of the file
+        Returns False when the file is unchanged since it was loaded (and force is not set)"""
+        path = os.path.abspath(jsonfile)
+        lasfile = os.path.abspath(lasfile) if lasfile else None
+        mtime = os.stat(path).st_mtime
+        row = self.db.execute('SELECT json_mtime, lasfile, status FROM wells WHERE jsonfile = ?', (path,)).fetchone()
+        if row is not None and row[0] == mtime and not force:
+            if (lasfile and lasfile != row[1]) or (status and status != row[2]):
+                self.db.execute('UPDATE wells SET lasfile = ?, status = ? WHERE jsonfile = ?',
+                                (lasfile or row[1], status or row[2], path))
+                if commit:
+                    self.db.commit()
+            return False
+        with open(path, 'r') as f:
+            metadata = json.load(f)
+        record = well_record(metadata)
+        record.update({'jsonfile': path, 'lasfile': lasfile or (row[1] if row else None),
+                       'json_mtime': mtime, 'status': status or (row[2] if row else None),
+                       'updated_at': datetime.datetime.now().isoformat()})
+        curves, items = header_rows(path, metadata)
+        self.db.execute('DELETE FROM curves WHERE jsonfile = ?', (path,))
+        self.db.execute('DELETE FROM header_items WHERE jsonfile = ?', (path,))
+        self.db.execute('INSERT OR REPLACE INTO wells (' + ', '.join(WELL_COLUMNS) + ') VALUES (' +
+                        ', '.join('?' * len(WELL_COLUMNS)) + ')', [record[c] for c in WELL_COLUMNS])
+        self.db.executemany('INSERT INTO curves VALUES (?, ?, ?, ?, ?)', curves)
+        self.db.executemany('INSERT INTO header_items VALUES (?, ?, ?, ?, ?, ?)', items)
+        if commit:
+            self.db.commit()
+        logger.debug('Catalogued ' + path)
+        return True
+
+    def remove(self, jsonfile, commit=True):
+        """Drop the rows of a file"""
+        path = os.path.abspath(jsonfile)
+        for table in ('wells', 'curves', 'header_items'):
+            self.db.execute('DELETE FROM ' + table + ' WHERE jsonfile = ?', (path,))
+        if commit:
+            self.db.commit()
+
+    def add_outputs(self, roots, force=False):
+        """Upsert every parser JSON file found under the roots and drop the entries of files that no
+        longer exist there; returns the number of files loaded and of files unchanged"""
+        loaded = unchanged = 0
+        for root in roots:
+            root = os.path.abspath(root)
+            json_files = set(find_json_files(root))
+            for jsonfile in sorted(json_files):
+                try:
+                    if self.upsert(jsonfile, force=force, commit=False):
+                        loaded += 1
+                    else:
+                        unchanged += 1
+                except (OSError, ValueError) as e:
+                    logger.error('Cannot catalog ' + jsonfile + ': ' + str(e))
+            prefix = os.path.join(root, '')
+            known = self.db.execute('SELECT jsonfile FROM wells WHERE substr(jsonfile, 1, ?) = ?',
+                                    (len(prefix), prefix)).fetchall()
+            for (jsonfile,) in known:
+                if jsonfile not in json_files:
+                    self.remove(jsonfile, commit=False)
+        self.db.commit()
+        return loaded, unchanged
+
+    def query(self, uwi=None, api=None, well=None, field=None, curves=None, units=None, top=None, base=None,
+              params=None, limit=None):
+        """Return the wells rows (dicts) matching all given conditions
+        uwi, api, well, field - exact (case insensitive) or wildcard (*) matches
+        curves - mnemonics that must all be present, units - units of those curves or of any curve
+        top, base - depth interval that must overlap STRT..STOP
+        params - list of (mnemonic, value) header items that must be present"""
+        conditions = []
+        args = []
+        for column, pattern in (('uwi', uwi), ('api', api), ('well', well), ('field', field)):
+            if pattern:
+                condition, arg = like_or_equal(column, pattern)
+                conditions.append(condition)
+                args.append(arg)
+        for mnemonic in curves or []:
+            condition = 'jsonfile IN (SELECT jsonfile FROM curves WHERE mnemonic = ?'
+            args.append(mnemonic)
+            if units:
+                condition += ' AND units = ?'
+                args.append(units)
+            conditions.append(condition + ')')
+        if units and not curves:
+            conditions.append('jsonfile IN (SELECT jsonfile FROM curves WHERE units = ?)')
+            args.append(units)
+        if top is not None:
+            conditions.append('base >= ?')
+            args.append(top)
+        if base is not None:
+            conditions.append('top <= ?')
+            args.append(base)
+        for mnemonic, value in params or []:
+            condition, arg = like_or_equal('value', value)
+            conditions.append('jsonfile IN (SELECT jsonfile FROM header_items WHERE mnemonic = ? AND ' + condition + ')')
+            args.extend([mnemonic, arg])
+        sql = 'SELECT ' + ', '.join(WELL_COLUMNS) + ' FROM wells'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY jsonfile'
+        if limit:
+            sql += ' LIMIT ' + str(int(limit))
+        wells = []
+        for row in self.db.execute(sql, args):
+            record = dict(zip(WELL_COLUMNS, row))
+            # rows loaded before data_files defaulted to [] hold 'null' for metadata-only outputs
+            record['data_files'] = json.loads(record['data_files'] or 'null') or []
+            wells.append(record)
+        return wells
+
+    def curves(self, jsonfile):
+        """Return (section, mnemonic, units, description) of the curves of a file"""
+        return self.db.execute('SELECT section, mnemonic, units, description FROM curves WHERE jsonfile = ?',
+                               (os.path.abspath(jsonfile),)).fetchall()
+
+
+def parse_param(text):
+    """argparse type for MNEMONIC=VALUE"""
+    if '=' not in text:
+        raise argparse.ArgumentTypeError('expected MNEMONIC=VALUE, got ' + text)
+    mnemonic, value = text.split('=', 1)
+    return mnemonic.strip(), value.strip()
+
+
+def print_wells(wells):
+    """Print one line per well: file, WELL, UWI, depth range and data files"""
+    for w in wells:
+        depth = '' if w['top'] is None else str(w['top']) + '-' + str(w['base']) + ' ' + (w['depth_units'] or '')
+        print('\t'.join([w['lasfile'] or w['jsonfile'], w['well'] or '', w['uwi'] or '', depth.strip(),
+                         ','.join(w['data_files'] or [])]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Catalog of the metadata of parsed las files')
+    parser.add_argument('catalog', help='SQLite catalog file')
+    commands = parser.add_subparsers(dest='command')
+    add = commands.add_parser('add', help='load the parser JSON files found in output folders')
+    add.add_argument('roots', nargs='+', help='directories holding outputDir folders')
+    add.add_argument('--force', action='store_true', help='reload files even if unchanged')
+    query = commands.add_parser('query', help='list the files matching all conditions')
+    query.add_argument('--uwi', help='UWI / UWID, * as wildcard')
+    query.add_argument('--api', help='API number, * as wildcard')
+    query.add_argument('--well', help='well name, * as wildcard')
+    query.add_argument('--field', help='field name, * as wildcard')
+    query.add_argument('--curve', dest='curves', action='append', help='curve mnemonic, repeat to require several')
+    query.add_argument('--units', help='curve units')
+    query.add_argument('--top', type=float, default=None, help='depth interval overlapping STRT..STOP')
+    query.add_argument('--base', type=float, default=None, help='depth interval overlapping STRT..STOP')
+    query.add_argument('--param', dest='params', action='append', type=parse_param,
+                       help='header item MNEMONIC=VALUE, * as wildcard in the value')
+    query.add_argument('--limit', type=int, default=None, help='maximum number of files listed')
+    query.add_argument('--json', action='store_true', help='print the matching rows as JSON')
+    args = parser.parse_args()
+    if not args.command:
+        parser.error('choose a command: add or query')
+    catalog = LasCatalog(args.catalog)
+    try:
+        if args.command == 'add':
+            loaded, unchanged = catalog.add_outputs(args.roots, force=args.force)
+            print('Loaded ' + str(loaded) + ' files, ' + str(unchanged) + ' unchanged')
+        else:
+            wells = catalog.query(uwi=args.uwi, api=args.api, well=args.well, field=args.field, curves=args.curves,
+                                  units=args.units, top=args.top, base=args.base, params=args.params, limit=args.limit)
+            if args.json:
+                print(json.dumps(wells, indent=2))
+            else:
+                print_wells(wells)
+    finally:
+        catalog.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+import mmap
+
+import numpy as np
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+import las_input
+
+WINDOW_CHUNK_SIZE = 1 << 22
+
+
+class LasFile(object):
+    """Lazy access to a las file through a memory map
+
+    The header sections are parsed when the object is created, so metadata, version, wrap,
+    delimiter, NULL value and curve names are available immediately. Curve values are only
+    parsed when asked for, and only for the rows of the requested depth window: the window is
+    located by bisecting the byte range of the data section, so a short interval of a multi-GB
+    file costs a few page reads plus the rows inside the interval.
+
+    Example:
+        with LasFile('well.las') as log:
+            gr = log.curve('GR', top=1500, base=1600)
+    """
+
+    def __init__(self, lasfile):
+        if not las_input.is_plain(lasfile):
+            raise ValueError('A memory map needs an uncompressed las file, got ' + lasfile)
+        self.path = lasfile
+        self._file = open(lasfile, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.file_contents = []
+        self.sections = []
+        self._index_sections()
+        records, settings = lasparser.parse_header_lines(self.file_contents)
+        self.version = settings['version']
+        self.wrap = settings['wrap']
+        self.dlm = settings['dlm']
+        self.null_value = settings['null_value']
+        self.metadata = lasparser.read_metadata_sections(self.file_contents, self.sections, self.version, records)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _index_sections(self):
+        """Collect the header lines and the section index (see list_sections_present)
+        In LAS v2 the ~A section is the last one, so the scan stops there and the data is not read"""
+        for kind, content, offset in lasparser.scan_las_buffer(self._map):
+            if kind == lasparser.SECTION_LINE:
+                lasparser.add_section(self.sections, content, len(self.file_contents), offset)
+            self.file_contents.append(content)
+            if kind == lasparser.SECTION_LINE and lasparser.is_data_section(content):
+                if lasparser.check_las_version(self.file_contents) == 2:
+                    break
+        lasparser.close_sections(self.sections, len(self.file_contents))
+
+    def _section_spans(self):
+        """Yield name, start and end byte offset of every section"""
+        for si, section in enumerate(self.sections):
+            end = self.sections[si + 1].offset if si + 1 < len(self.sections) else len(self._map)
+            yield section.name, section.offset, end
+
+    @property
+    def data_sections(self):
+        """Names of the sections holding curve data"""
+        return [section.name for section in self.sections if lasparser.is_data_section(section.name)]
+
+    def _data_section(self, section=None):
+        """Return name and byte span of the requested data section, the first one by default"""
+        for name, start, end in self._section_spans():
+            if lasparser.is_data_section(name) and (section is None or name == section or name.split('|')[0].strip() == section):
+                # the data starts on the line after the section line
+                data_start = self._map.find(b'\n', start, end)
+                return name, (end if data_start < 0 else data_start + 1), end
+        raise KeyError('No data section ' + str(section))
+
+    def curve_names(self, section=None):
+        """Return the curve mnemonics of a data section in column order"""
+        name = self._data_section(section)[0]
+        if '|' in name:
+            definition = name.split('|')[1].strip()
+            return list(self.metadata[definition].keys())
+        curve_field = [s for s in self.metadata if s.upper().startswith('CURVE')][0]
+        return list(self.metadata[curve_field].keys())
+
+    def _row_start(self, pos, end):
+        """Return the start of the first line at or after pos"""
+        if pos == 0 or self._map[pos - 1:pos] == b'\n':
+            return pos
+        nl = self._map.find(b'\n', pos, end)
+        return end if nl < 0 else nl + 1
+
+    def _index_value(self, pos, end):
+        """Return the first value of the first data line at or after the line start pos"""
+        while pos < end:
+            nl = self._map.find(b'\n', pos, end)
+            line_end = end if nl < 0 else nl + 1
+            tokens = self._map[pos:line_end].replace(b',', b' ').split()
+            pos = line_end
+            if tokens and not tokens[0].startswith(b'#'):
+                try:
+                    return float(tokens[0])
+                except ValueError:
+                    continue
+        return None
+
+    def _last_index_value(self, start, end):
+        """Return the first value of the last data line between the line start start and end"""
+        pos = end
+        while pos > start:
+            line_start = max(self._map.rfind(b'\n', start, pos - 1) + 1, start)
+            index_value = self._index_value(line_start, pos)
+            if index_value is not None:
+                return index_value
+            pos = line_start
+        return None
+
+    def _bisect(self, start, end, value, descending):
+        """Return the offset of the first row whose index value is not before value"""
+        lo, hi = start, end
+        while lo < hi:
+            mid = (lo + hi) // 2
+            row = self._row_start(mid, end)
+            index_value = self._index_value(row, end) if row < end else None
+            if index_value is not None and (index_value > value if descending else index_value < value):
+                lo = row + 1
+            else:
+                hi = mid
+        return self._row_start(lo, end)
+
+    def _window_span(self, start, end, top, base):
+        """Return the byte span of the rows with index values between top and base"""
+        first = self._index_value(start, end)
+        last = self._last_index_value(start, end)
+        descending = first is not None and last is not None and last < first
+        if descending:
+            top, base = base, top
+        if top is not None:
+            start = self._bisect(start, end, top, descending)
+        if base is not None:
+            # first row past base, nudged so rows equal to base are included
+            end = self._bisect(start, end, np.nextafter(base, -np.inf if descending else np.inf), descending)
+        return start, end
+
+    def _read_rows(self, start, end, n_curves, columns):
+        """Parse the rows between the byte offsets in chunks, keeping only the requested columns"""
+        parts = []
+        pos = start
+        while pos < end:
+            stop = self._row_start(min(pos + WINDOW_CHUNK_SIZE, end), end)
+            block = self._map[pos:stop]
+            pos = stop
+            if b'#' in block:
+                block = lasparser.DATA_COMMENT_LINE.sub(b'', block)
+            if block.strip():
+                parts.append(lasparser.parse_data_block(block, n_curves, self.dlm, self.null_value)[:, columns])
+        if not parts:
+            return np.empty((0, len(columns)), dtype=np.float64)
+        return np.concatenate(parts)
+
+    def _read_wrapped(self, start, end, n_curves, columns, top, base):
+        """Wrapped rows cannot be located by bisection, the whole section is parsed"""
+        block = self._map[start:end]
+        if b'#' in block:
+            block = lasparser.DATA_COMMENT_LINE.sub(b'', block)
+        values = np.concatenate(list(lasparser.unwrap_data_blocks([block], n_curves, self.dlm, self.null_value)))
+        low = -np.inf if top is None else top
+        high = np.inf if base is None else base
+        low, high = min(low, high), max(low, high)
+        index = values[:, 0]
+        return values[(index >= low) & (index <= high)][:, columns]
+
+    def data(self, curves=None, top=None, base=None, section=None):
+        """Return a float64 array with one column per requested curve (all by default)
+        for the rows whose index (first curve) lies between top and base, NULL values as NaN"""
+        name, start, end = self._data_section(section)
+        names = self.curve_names(section)
+        curves = names if curves is None else list(curves)
+        columns = [names.index(c) for c in curves]
+        if self.wrap:
+            return self._read_wrapped(start, end, len(names), columns, top, base)
+        start, end = self._window_span(start, end, top, base)
+        return self._read_rows(start, end, len(names), columns)
+
+    def curve(self, mnemonic, top=None, base=None, section=None):
+        """Return the values of one curve between top and base as a 1D float64 array"""
+        return self.data([mnemonic], top, base, section)[:, 0]
+
+    def index(self, top=None, base=None, section=None):
+        """Return the index (depth) values between top and base"""
+        return self.curve(self.curve_names(section)[0], top, base, section)
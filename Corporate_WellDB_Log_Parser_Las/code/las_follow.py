@@ -0,0 +1,266 @@
+"""Follow las files that are still being written (e.g. LWD logs appended to while drilling)
+
+The first poll parses the header and the data rows written so far. Every later poll reads only the
+bytes appended since the previous one, appends their rows to the csv and updates STOP in the JSON,
+so its cost follows the new data, not the size of the file. Where the last complete row ended, the
+number of rows and the last depth are kept in a state file next to the JSON:
+
+    outputDir/<name>/<name>.follow.json
+
+A row still being written (no line end yet) is left for the next poll. The file is parsed from the
+start again when it shrank, when its ~A line moved (the header was rewritten with another length),
+when the output options changed or when the outputs are gone. Rows that do not go past the last
+depth in the direction of STEP are dropped with a warning.
+
+Only LAS v2 files with one row per line (WRAP NO) and csv output (optionally compressed) can be
+followed; compressed and zipped inputs cannot grow in place and are not supported.
+
+    python las_follow.py well.las --interval 10
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+import las_input
+import las_metrics
+import las_writers
+
+logger = logging.getLogger()
+
+STATE_SUFFIX = '.follow.json'
+POLL_SECONDS = 10
+WELL_SECTION = 'WELL_INFORMATION_SECTION'
+CURVE_SECTION = 'CURVE_INFORMATION_SECTION'
+
+
+def state_file(jsonfile):
+    """Return the path of the follow state kept next to jsonfile"""
+    return os.path.splitext(jsonfile)[0] + STATE_SUFFIX
+
+
+def load_state(path):
+    """Return the follow state saved at path, None if there is none or it cannot be read"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_state(state, path):
+    """Save the follow state, replacing the previous one in one step so a crash leaves either of them"""
+    temp = path + '.tmp'
+    with open(temp, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp, path)
+
+
+def read_section_line(lasfile, offset):
+    """Return the bytes of the line starting at offset, line end included"""
+    with open(lasfile, 'rb') as f:
+        f.seek(offset)
+        return f.readline()
+
+
+def format_depth(depth, template):
+    """Return depth as text with as many decimals as the header value template (e.g. '1670.0000')"""
+    decimals = len(template.split('.')[1]) if template and '.' in template else 4
+    return '%.*f' % (decimals, depth)
+
+
+def header_value(metadata, mnemonic):
+    """Return the value of a well information item, None if it is missing"""
+    item = metadata.get(WELL_SECTION, {}).get(mnemonic)
+    return item.get('value') if isinstance(item, dict) else None
+
+
+def step_direction(metadata):
+    """Return -1 when the depths decrease (negative STEP), 1 otherwise"""
+    try:
+        return -1 if float(header_value(metadata, 'STEP')) < 0 else 1
+    except (TypeError, ValueError):
+        return 1
+
+
+def start_outputs(lasfile, csvfile, jsonfile, options):
+    """Parse the header of lasfile, write the JSON and an empty csv, and return a fresh follow state
+    ValueError is raised for files that cannot be followed"""
+    if las_input.split_member(lasfile)[1] is not None or las_input.compression(lasfile):
+        raise ValueError('Compressed and zipped las files cannot be followed: ' + lasfile)
+    file_contents, sections = lasparser.read_las_header(lasfile)
+    records, settings = lasparser.parse_header_lines(file_contents)
+    if settings['version'] != 2:
+        raise ValueError('Only LAS v2 files can be followed: ' + lasfile)
+    if settings['wrap']:
+        raise ValueError('Wrapped (WRAP YES) files cannot be followed: ' + lasfile)
+    data_sections = [s for s in sections if lasparser.is_data_section(s.name) and s.name.startswith('A')]
+    if not data_sections:
+        raise ValueError('No ~A section in ' + lasfile)
+    metadata = lasparser.read_metadata_sections(file_contents, sections, settings['version'], records)
+    metadata = lasparser.standardize_meta_section_names(metadata)
+    curves = metadata.get(CURVE_SECTION, {})
+    curve_names = list(curves.keys())
+    os.makedirs(os.path.dirname(csvfile), exist_ok=True)
+    writer = las_writers.open_writer('csv', os.path.splitext(csvfile)[0], curve_names, curves, options['compression'])
+    writer.close()
+    metadata['Data files'] = lasparser.data_file_reference(writer.path)
+    lasparser.save_metadata(metadata, jsonfile)
+    section_offset = data_sections[0].offset
+    section_line = read_section_line(lasfile, section_offset)
+    return {
+        'lasfile': os.path.abspath(lasfile),
+        'options': options,
+        'data_file': writer.path,
+        'curve_names': curve_names,
+        'dlm': settings['dlm'] or ' ',
+        'null_value': settings['null_value'],
+        'direction': step_direction(metadata),
+        'section_offset': section_offset,
+        'section_line': section_line.decode(lasparser.LAS_ENCODING, 'replace'),
+        'offset': section_offset + len(section_line),
+        'rows': 0,
+        'last_depth': None,
+    }
+
+
+def is_current(state, lasfile, options, size):
+    """Return True when the saved state still describes lasfile and its outputs"""
+    if not state or state.get('lasfile') != os.path.abspath(lasfile) or state.get('options') != options:
+        return False
+    if size < state['offset'] or not os.path.isfile(state['data_file']):
+        return False
+    section_line = read_section_line(lasfile, state['section_offset'])
+    return section_line.decode(lasparser.LAS_ENCODING, 'replace') == state['section_line']
+
+
+def iter_appended_blocks(lasfile, offset, size, chunk_size=lasparser.READ_CHUNK_SIZE):
+    """Yield (block, end) for the complete lines between offset and size, end being the offset after the block
+    Comment and blank lines are left out of the blocks; a last line without a line end is not read"""
+    with open(lasfile, 'rb') as f:
+        f.seek(offset)
+        carry = b''
+        while offset < size:
+            chunk = f.read(min(chunk_size, size - offset))
+            if not chunk:
+                break
+            offset += len(chunk)
+            buf = carry + chunk
+            end = buf.rfind(b'\n') + 1
+            carry = buf[end:]
+            block = buf[:end]
+            if b'#' in block:
+                block = lasparser.DATA_COMMENT_LINE.sub(b'', block)
+            yield block, offset - len(carry)
+
+
+def new_rows(values, state):
+    """Return the rows of values past the last depth of the state, warning about the ones dropped"""
+    if state['last_depth'] is None or not len(values):
+        return values
+    keep = (values[:, 0] - state['last_depth']) * state['direction'] > 0
+    if not keep.all():
+        logger.warning('Dropped ' + str(int((~keep).sum())) + ' rows not past depth ' + str(state['last_depth']) +
+                       ' in ' + state['lasfile'])
+        values = values[keep]
+    return values
+
+
+def update_stop(jsonfile, last_depth):
+    """Set STOP in the saved metadata to the last depth parsed"""
+    with open(jsonfile) as f:
+        metadata = json.load(f)
+    stop = metadata.get(WELL_SECTION, {}).get('STOP')
+    if not isinstance(stop, dict):
+        logger.warning('No STOP in ' + jsonfile)
+        return
+    stop['value'] = format_depth(last_depth, stop.get('value') or header_value(metadata, 'STRT'))
+    lasparser.save_metadata(metadata, jsonfile)
+
+
+def follow_once(lasfile, decimals=None, compression=None):
+    """Bring the outputs of a growing las file up to date with the rows appended since the last call
+    Returns the number of rows appended; ValueError is raised for files that cannot be followed"""
+    import pandas as pd
+    csvfile, jsonfile = lasparser.output_files(lasfile)
+    options = {'decimals': decimals, 'compression': compression}
+    path = state_file(jsonfile)
+    state = load_state(path)
+    size = os.path.getsize(lasfile)
+    if not is_current(state, lasfile, options, size):
+        if state:
+            logger.info('Parsing ' + lasfile + ' from the start')
+        state = start_outputs(lasfile, csvfile, jsonfile, options)
+        save_state(state, path)
+    if size == state['offset']:
+        return 0
+    n_curves = len(state['curve_names'])
+    rows = 0
+    writer = las_writers.open_writer('csv', os.path.splitext(csvfile)[0], state['curve_names'],
+                                     compression=compression, append=True)
+    try:
+        for block, end in iter_appended_blocks(lasfile, state['offset'], size):
+            if block.strip():
+                with las_metrics.stage('parse_data'):
+                    values = lasparser.parse_data_block(block, n_curves, state['dlm'], state['null_value'])
+                    values = new_rows(values, state)
+                if len(values):
+                    frame = pd.DataFrame(values, columns=state['curve_names'])
+                    if decimals is not None:
+                        frame = frame.round(decimals)
+                    with las_metrics.stage('write'):
+                        writer.write(frame)
+                    rows += len(values)
+                    state['last_depth'] = float(values[-1, 0])
+            state['offset'] = end
+    finally:
+        writer.close()
+        # the rows written so far are in the csv, record them even when a later block failed
+        state['rows'] += rows
+        save_state(state, path)
+    if rows:
+        update_stop(jsonfile, state['last_depth'])
+        las_metrics.count('output_rows', rows)
+        logger.info('Appended ' + str(rows) + ' rows to ' + state['data_file'])
+    return rows
+
+
+def follow(lasfiles, interval=POLL_SECONDS, polls=None, **options):
+    """Poll the las files every interval seconds, polls times or until interrupted
+    A file that fails is logged and tried again at the next poll"""
+    poll = 0
+    while polls is None or poll < polls:
+        if poll:
+            time.sleep(interval)
+        for lasfile in lasfiles:
+            try:
+                rows = follow_once(lasfile, **options)
+            except (OSError, ValueError) as e:
+                logger.error(lasfile + ': ' + str(e))
+                print(lasfile + ': ' + str(e))
+                continue
+            if rows:
+                print(lasfile + ': ' + str(rows) + ' new rows')
+        poll += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Follow growing las files, appending new rows to their outputs')
+    parser.add_argument('lasfiles', nargs='+', help='las files to follow')
+    parser.add_argument('--interval', type=float, default=POLL_SECONDS, help='seconds between polls (default: %(default)s)')
+    parser.add_argument('--polls', type=int, default=None, help='stop after this many polls (default: run until interrupted)')
+    parser.add_argument('--decimals', type=int, default=None, help='round curve values in the output (default: full precision)')
+    parser.add_argument('--compression', default=None, choices=sorted(las_writers.CSV_COMPRESSION), help='compress the csv')
+    lasparser.add_logging_arguments(parser)
+    args = parser.parse_args()
+    lasparser.configure_logging(args.log_level, args.log_file)
+    try:
+        follow(args.lasfiles, args.interval, args.polls, decimals=args.decimals, compression=args.compression)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
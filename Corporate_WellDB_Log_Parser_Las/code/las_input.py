@@ -0,0 +1,297 @@
+"""Reading las files straight from compressed files and zip archives
+
+A las input is named by a string, so it can be passed around like a path (cache, metrics, batch jobs):
+
+    well.las                        plain file
+    well.las.gz, .bz2, .xz          compressed file, decompressed while it is read
+    archive.zip::logs/well.las      member of a zip archive
+
+Compressed inputs are decompressed in a background thread (see las_pipeline.background_iter), so
+decompression overlaps with parsing. Only what is read more than once is extracted: the header pass
+over a LAS v3 file reads all of it, so it copies what it decompresses to a temporary file (Spool) and
+the data sections are read from there. Their outputs are
+named after the las file without the compression extension (with it as a suffix, well_gz, when the
+same las file is next to it uncompressed or compressed otherwise), those of zip members after the archive
+and the member path (archive.zip::logs/well.las -> archive_logs_well) in the outputDir next to the archive.
+"""
+import bz2
+import gzip
+import lzma
+import os
+import tempfile
+import zipfile
+
+import las_pipeline
+
+ZIP_MEMBER_SEP = '::'
+COMPRESSED_OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+ARCHIVE_EXTENSIONS = ('.zip',)
+LAS_EXTENSIONS = ('.las',)
+READ_CHUNK_SIZE = 1 << 20
+
+
+def split_member(lasfile):
+    """Return (archive, member) for a zip member reference, (lasfile, None) otherwise"""
+    archive, sep, member = lasfile.partition(ZIP_MEMBER_SEP)
+    if sep and os.path.splitext(archive)[1].lower() in ARCHIVE_EXTENSIONS:
+        return archive, member
+    return lasfile, None
+
+
+def member_reference(archive, member):
+    """Return the name of a zip member as used by the parser"""
+    return archive + ZIP_MEMBER_SEP + member
+
+
+def compression(lasfile):
+    """Return the compression extension of lasfile ('.gz', '.bz2', '.xz'), None for plain files and zip members"""
+    if split_member(lasfile)[1] is not None:
+        return None
+    ext = os.path.splitext(lasfile)[1].lower()
+    return ext if ext in COMPRESSED_OPENERS else None
+
+
+def is_las_name(name):
+    """Return True for las file names, compressed or not (well.las, well.las.gz, ...)"""
+    base, ext = os.path.splitext(name.lower())
+    if ext in COMPRESSED_OPENERS:
+        base, ext = os.path.splitext(base)
+    return ext in LAS_EXTENSIONS
+
+
+def is_archive(path):
+    return os.path.splitext(path)[1].lower() in ARCHIVE_EXTENSIONS
+
+
+def list_archive_members(archive):
+    """Return the references (see member_reference) of the las files inside a zip archive"""
+    with zipfile.ZipFile(archive) as z:
+        return [member_reference(archive, info.filename) for info in z.infolist()
+                if not info.filename.endswith('/') and is_las_name(info.filename)]
+
+
+def is_plain(lasfile):
+    """Return True for an uncompressed las file on disk, which can be seeked and memory mapped"""
+    return compression(lasfile) is None and split_member(lasfile)[1] is None
+
+
+def source_file(lasfile):
+    """Return the file on disk holding lasfile: the archive for zip members, lasfile otherwise"""
+    return split_member(lasfile)[0]
+
+
+def has_twin(lasfile):
+    """Return True when the las file of a compressed file is next to it uncompressed or compressed otherwise"""
+    plain, ext = os.path.splitext(lasfile)
+    return any(os.path.exists(plain + other) for other in [''] + sorted(COMPRESSED_OPENERS) if other != ext.lower())
+
+
+def input_name(lasfile):
+    """Return the name the outputs of lasfile are given: the file name without the las and compression
+    extensions, for zip members the archive name and the member path joined by _
+    A compressed file whose las file is next to it as well (well.las and well.las.gz) keeps its compression
+    as a suffix (well_gz), so their outputs in the same outputDir do not overwrite each other"""
+    archive, member = split_member(lasfile)
+    name = member if member is not None else os.path.basename(lasfile)
+    ext = os.path.splitext(name)[1].lower()
+    if ext in COMPRESSED_OPENERS:
+        name = os.path.splitext(name)[0]
+    name = os.path.splitext(name)[0]
+    if member is not None:
+        archive_name = os.path.splitext(os.path.basename(archive))[0]
+        name = archive_name + '_' + name.strip('/').replace('/', '_')
+    elif ext in COMPRESSED_OPENERS and has_twin(lasfile):
+        name += '_' + ext[1:]
+    return name
+
+
+def input_span(lasfile):
+    """Return (file, offset, size) of the bytes on disk holding lasfile: the compressed data (with its
+    local header) of zip members inside their archive, the whole file (offset 0, size None) otherwise"""
+    archive, member = split_member(lasfile)
+    if member is None:
+        return lasfile, 0, None
+    with zipfile.ZipFile(archive) as z:
+        info = z.getinfo(member)
+    # the local header holds the name and an extra field that is usually the same as in the central directory
+    header = 30 + len(info.filename.encode('utf-8')) + len(info.extra)
+    return archive, info.header_offset, header + info.compress_size
+
+
+def input_size(lasfile):
+    """Return the number of bytes read from disk for lasfile (the compressed size for compressed inputs)"""
+    archive, member = split_member(lasfile)
+    if member is None:
+        return os.path.getsize(lasfile)
+    with zipfile.ZipFile(archive) as z:
+        return z.getinfo(member).compress_size
+
+
+def uncompressed_size(lasfile):
+    """Return the size of the decompressed contents of lasfile, None when it is not known without reading them
+    (bz2, xz); for gzip files it is read from the trailer, which holds the size modulo 4 GiB"""
+    archive, member = split_member(lasfile)
+    if member is not None:
+        with zipfile.ZipFile(archive) as z:
+            return z.getinfo(member).file_size
+    ext = compression(lasfile)
+    if ext is None:
+        return os.path.getsize(lasfile)
+    if ext == '.gz':
+        with open(lasfile, 'rb') as f:
+            f.seek(-4, os.SEEK_END)
+            return int.from_bytes(f.read(4), 'little')
+    return None
+
+
+class ChunkReader(object):
+    """Binary stream reading the decompressed chunks of a file from a background thread
+    read() returns the next chunk whatever the size asked for, b'' at the end"""
+
+    def __init__(self, f, chunk_size=READ_CHUNK_SIZE):
+        self.f = f
+        self.chunks = las_pipeline.background_iter(iter(lambda: f.read(chunk_size), b''))
+
+    def read(self, size=-1):
+        return next(self.chunks, b'')
+
+    def close(self):
+        self.chunks.close()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ZipMember(object):
+    """Binary stream of a zip member that also closes its archive"""
+
+    def __init__(self, archive, member):
+        self.zip = zipfile.ZipFile(archive)
+        try:
+            self.f = self.zip.open(member)
+        except BaseException:
+            self.zip.close()
+            raise
+
+    def read(self, size=-1):
+        return self.f.read(size)
+
+    def close(self):
+        self.f.close()
+        self.zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Spool(object):
+    """Temporary plain copy of a compressed input, written while the input is read through tee()
+    complete is set when the reader got to the end, the copy then holds all of the input and
+    can be read (and seeked) by path; close() removes it"""
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(suffix='.las')
+        self.f = os.fdopen(fd, 'wb')
+        self.complete = False
+
+    def tee(self, f):
+        """Return a stream reading f and copying what it reads to the spool"""
+        return SpoolReader(f, self)
+
+    def write(self, chunk):
+        if chunk:
+            self.f.write(chunk)
+        elif not self.complete:
+            self.complete = True
+            self.f.close()
+
+    def close(self):
+        self.f.close()
+        os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SpoolReader(object):
+    """Binary stream passing on what it reads from f and writing it to a Spool"""
+
+    def __init__(self, f, spool):
+        self.f = f
+        self.spool = spool
+
+    def read(self, size=-1):
+        chunk = self.f.read(size)
+        self.spool.write(chunk)
+        return chunk
+
+
+class DigestReader(object):
+    """Binary stream passing what it reads from f, which is at offset in the contents, to a
+    las_cache.ContentDigest"""
+
+    def __init__(self, f, digest, offset=0):
+        self.f = f
+        self.digest = digest
+        self.offset = offset
+
+    def read(self, size=-1):
+        chunk = self.f.read(size)
+        if chunk:
+            self.digest.update(chunk, self.offset)
+            self.offset += len(chunk)
+        else:
+            self.digest.end(self.offset)
+        return chunk
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def skip_bytes(f, n, chunk_size=READ_CHUNK_SIZE):
+    """Read and drop n bytes of a stream that cannot seek"""
+    while n > 0:
+        chunk = f.read(min(n, chunk_size))
+        if not chunk:
+            break
+        n -= len(chunk)
+
+
+def open_las(lasfile, offset=0, background=True, digest=None):
+    """Open lasfile for binary reading at offset (a position in the decompressed contents)
+    Plain files are opened and seeked as usual; compressed files and zip members are decompressed
+    from the start, the bytes before offset dropped, and with background the rest is decompressed
+    in a background thread ahead of the reader
+    digest - a las_cache.ContentDigest fed the bytes read (and those dropped)"""
+    archive, member = split_member(lasfile)
+    ext = compression(lasfile)
+    if member is None and ext is None:
+        f = open(lasfile, 'rb')
+        if offset:
+            f.seek(offset)
+        return f if digest is None else DigestReader(f, digest, offset)
+    f = ZipMember(archive, member) if member is not None else COMPRESSED_OPENERS[ext](lasfile, 'rb')
+    if digest is not None:
+        f = DigestReader(f, digest)
+    try:
+        skip_bytes(f, offset)
+    except BaseException:
+        f.close()
+        raise
+    return ChunkReader(f) if background else f
@@ -0,0 +1,160 @@
+"""Per-stage timing and counters of parse runs
+
+parse_lasfile starts a ParseMetrics collector for the file when asked for metrics; the parser
+functions report to the active collector through stage() and count(), which do nothing when no
+collector is active. A record looks like:
+
+    {"file": "...", "path": "parsed", "seconds": 1.93,
+     "stages": {"read_header": {"seconds": 0.01, "calls": 1}, "parse_data": {...}, "write": {...}},
+     "counters": {"input_bytes": 10500000, "data_bytes": 10400000, "rows": 100000, "output_bytes": 9800000},
+     "errors": {"parse_data": "ValueError('Expected 10 values per row, got shape (3,)')"}}
+
+aggregate() sums the records of a batch per stage and lists the slowest files. Records appended
+to a file by the single-file command line (--metrics) are summed with:
+
+    python las_metrics.py metrics.jsonl
+"""
+import argparse
+import contextlib
+import json
+import threading
+import time
+
+_lock = threading.Lock()
+_current = None
+
+
+class ParseMetrics(object):
+    """Wall time per stage, counters and errors of one parse run"""
+
+    def __init__(self, lasfile):
+        self.lasfile = lasfile
+        self.path = None
+        self.stages = {}
+        self.counters = {}
+        self.errors = {}
+        self.started = time.time()
+        self.seconds = None
+
+    def add_time(self, name, seconds):
+        with _lock:
+            stage = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            stage['seconds'] += seconds
+            stage['calls'] += 1
+
+    def count(self, name, n=1):
+        with _lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def error(self, name, exception):
+        self.errors[name] = repr(exception)
+
+    def merge(self, record):
+        """Add the stages, counters and errors of a record (see as_dict), e.g. one made in another process"""
+        with _lock:
+            for name, s in record['stages'].items():
+                stage = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+                stage['seconds'] += s['seconds']
+                stage['calls'] += s['calls']
+            for name, n in record['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + n
+            self.errors.update(record['errors'])
+
+    def finish(self, path):
+        self.path = path
+        self.seconds = time.time() - self.started
+
+    def as_dict(self):
+        stages = dict((name, {'seconds': round(s['seconds'], 4), 'calls': s['calls']}) for name, s in self.stages.items())
+        return {'file': self.lasfile, 'path': self.path,
+                'seconds': None if self.seconds is None else round(self.seconds, 4),
+                'stages': stages, 'counters': dict(self.counters), 'errors': dict(self.errors)}
+
+
+def start(lasfile):
+    """Make a new collector for lasfile the active one and return it"""
+    global _current
+    _current = ParseMetrics(lasfile)
+    return _current
+
+
+def stop():
+    """Deactivate the collector, return it"""
+    global _current
+    metrics, _current = _current, None
+    return metrics
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time the enclosed block as stage name of the active collector"""
+    metrics = _current
+    if metrics is None:
+        yield
+        return
+    start_time = time.time()
+    try:
+        yield
+    finally:
+        metrics.add_time(name, time.time() - start_time)
+
+
+def count(name, n=1):
+    """Add n to counter name of the active collector"""
+    if _current is not None:
+        _current.count(name, n)
+
+
+def error(name, exception):
+    """Record an exception (e.g. the numeric reader giving up on a section) on the active collector"""
+    if _current is not None:
+        _current.error(name, exception)
+
+
+def merge(record):
+    """Add a record made in another process (see ParseMetrics.as_dict) to the active collector"""
+    if _current is not None:
+        _current.merge(record)
+
+
+def aggregate(records, slowest=10):
+    """Return the totals per stage and counter of a list of metrics records and the slowest files"""
+    stages = {}
+    counters = {}
+    for record in records:
+        for name, s in record['stages'].items():
+            total = stages.setdefault(name, {'seconds': 0.0, 'calls': 0, 'files': 0})
+            total['seconds'] += s['seconds']
+            total['calls'] += s['calls']
+            total['files'] += 1
+        for name, n in record['counters'].items():
+            counters[name] = counters.get(name, 0) + n
+    for total in stages.values():
+        total['seconds'] = round(total['seconds'], 3)
+    ranked = sorted(records, key=lambda r: r['seconds'] or 0, reverse=True)[:slowest]
+    slow_files = []
+    for record in ranked:
+        top_stage = max(record['stages'].items(), key=lambda item: item[1]['seconds'])[0] if record['stages'] else None
+        slow_files.append({'file': record['file'], 'seconds': record['seconds'], 'path': record['path'], 'top_stage': top_stage})
+    return {'stages': stages, 'counters': counters, 'slowest_files': slow_files}
+
+
+def read_records(metricsfile):
+    """Return the metrics records of a file with one JSON record per line"""
+    with open(metricsfile) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sum the stage metrics of parse runs')
+    parser.add_argument('metricsfile', nargs='+', help='files with one JSON metrics record per line')
+    parser.add_argument('--slowest', type=int, default=10, help='number of slowest files to list')
+    args = parser.parse_args()
+    records = []
+    for metricsfile in args.metricsfile:
+        records.extend(read_records(metricsfile))
+    print(json.dumps(aggregate(records, args.slowest), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Overlap reading, parsing and writing
+
+Two stages run in threads next to the parser, connected by bounded queues so memory stays capped:
+
+    FilePrefetcher   reads the next input files ahead of the parser (e.g. from a slow network
+                     share), so the parser finds them in the page cache
+    background_iter  parses the next chunk of a data section while the previous one is written
+
+las_batch uses the prefetcher in the parent process (--prefetch) and background_iter in the
+workers (--pipeline); parse_lasfile(..., pipeline=True) uses background_iter for a single file.
+"""
+import logging
+import queue
+import threading
+
+logger = logging.getLogger()
+
+PREFETCH_FILES = 2
+PREFETCH_CHUNK_SIZE = 1 << 20
+# chunks parsed ahead of the writer, each holds chunk_rows rows (see Corporate_WellDB_Log_Parser_Las.CHUNK_ROWS)
+QUEUE_CHUNKS = 2
+
+
+def prefetch_file(path, chunk_size=PREFETCH_CHUNK_SIZE):
+    """Read the bytes on disk of a las input once and drop them so they are served from the page cache later
+    path is a las input name (see las_input), for zip members only their part of the archive is read
+    Returns the number of bytes read"""
+    import las_input
+    source, offset, length = las_input.input_span(path)
+    size = 0
+    with open(source, 'rb') as f:
+        f.seek(offset)
+        while length is None or size < length:
+            chunk = f.read(chunk_size if length is None else min(chunk_size, length - size))
+            if not chunk:
+                break
+            size += len(chunk)
+    return size
+
+
+class FilePrefetcher(object):
+    """Read the files of a list in a background thread, at most `ahead` files beyond the ones consumed
+    skip - files beyond the ones consumed that are not read because the parser already has them
+    Call advance() when a file is done and stop() at the end; errors are logged and the file skipped"""
+
+    def __init__(self, files, ahead=PREFETCH_FILES, skip=0):
+        self.files = list(files)
+        self.ahead = ahead
+        self.skip = skip
+        self.consumed = 0
+        self.prefetched = 0
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name='las-prefetch')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        for i, path in enumerate(self.files):
+            with self.condition:
+                while not self.stopped and i >= self.consumed + self.ahead:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+            if i < self.consumed + self.skip:
+                # the parser got there first
+                continue
+            try:
+                prefetch_file(path)
+                self.prefetched += 1
+            except Exception as e:
+                # only a hint for the page cache, the parser reports the file if it cannot be read
+                logger.debug('Prefetch of ' + path + ' failed: ' + str(e))
+
+    def advance(self, n=1):
+        """Mark n more files as consumed, letting the prefetcher read further"""
+        with self.condition:
+            self.consumed += n
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.thread.join()
+
+
+def _put(items, item, stop):
+    """Put item on the queue unless stop is set while waiting for room, return False if stopped"""
+    while not stop.is_set():
+        try:
+            items.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def background_iter(iterable, depth=QUEUE_CHUNKS):
+    """Yield the items of iterable, produced in a background thread at most depth items ahead
+    An exception raised by iterable is raised here; when the consumer stops early the thread
+    stops after the item it is working on"""
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                if not _put(items, (True, item), stop):
+                    return
+            _put(items, (False, None), stop)
+        except BaseException as e:
+            _put(items, (False, e), stop)
+
+    thread = threading.Thread(target=produce, name='las-parse')
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            is_item, value = items.get()
+            if not is_item:
+                if value is not None:
+                    raise value
+                return
+            yield value
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,169 @@
+"""Decimated curve pyramids for previews of long logs
+
+A pyramid holds a data section at several resolutions. Level 1 combines every PYRAMID_BIN_ROWS rows
+into one bin, and every next level combines PYRAMID_FACTOR bins of the level below. Each bin keeps
+the min, max and mean of every curve, so spikes stay visible at every level:
+
+    DEPT_top, DEPT_base, rows, GR_min, GR_max, GR_mean, RHOB_min, ...
+
+DEPT_top/DEPT_base are the depths of the first and last row of the bin (the first curve is the
+depth), and rows is the number of rows in the bin. The bins are in the order of the rows, so a
+viewer can bisect a level on depth and fetch only the window it shows.
+
+A level is only kept while the level below (or the data itself) has more than PYRAMID_MIN_BINS rows,
+so the coarsest level is a whole-well overview and small sections get no pyramid. CurvePyramid is
+fed the chunks of a data section as they are written (see
+Corporate_WellDB_Log_Parser_Las.write_curve_chunks). Levels are written with the output format of the
+data files, next to them: <data file name>_pyramid1.csv, _pyramid2.csv, ...
+"""
+import logging
+import os
+
+import las_stats
+import las_writers
+
+logger = logging.getLogger()
+
+PYRAMID_BIN_ROWS = 16
+PYRAMID_FACTOR = 4
+PYRAMID_MIN_BINS = 1000
+BIN_FIELDS = ('top', 'base', 'min', 'max', 'sum', 'count', 'rows')
+
+
+def raw_bins(values):
+    """Return the rows of a float64 array (first column the depth) as bins of one row each"""
+    import numpy as np
+    depth = values[:, 0]
+    curves = values[:, 1:]
+    valid = ~np.isnan(curves)
+    return {'top': depth, 'base': depth, 'min': np.where(valid, curves, np.inf),
+            'max': np.where(valid, curves, -np.inf), 'sum': np.where(valid, curves, 0.0),
+            'count': valid.astype(np.int64), 'rows': np.ones(len(depth), dtype=np.int64)}
+
+
+def bin_count(bins):
+    return len(bins['rows'])
+
+
+def take_bins(bins, start, stop):
+    return dict((key, value[start:stop]) for key, value in bins.items())
+
+
+def concat_bins(first, second):
+    import numpy as np
+    if first is None:
+        return second
+    return dict((key, np.concatenate([first[key], second[key]])) for key in BIN_FIELDS)
+
+
+def reduce_bins(bins, size):
+    """Combine every size consecutive bins into one, the number of bins must be a multiple of size"""
+    n = bin_count(bins) // size
+
+    def groups(values):
+        return values.reshape((n, size) + values.shape[1:])
+
+    return {'top': bins['top'][::size], 'base': bins['base'][size - 1::size],
+            'min': groups(bins['min']).min(axis=1), 'max': groups(bins['max']).max(axis=1),
+            'sum': groups(bins['sum']).sum(axis=1), 'count': groups(bins['count']).sum(axis=1),
+            'rows': groups(bins['rows']).sum(axis=1)}
+
+
+def bins_frame(bins, columns):
+    """Return the bins as a DataFrame with the pyramid columns (see the module docstring)"""
+    import numpy as np
+    import pandas as pd
+    count = bins['count']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = bins['sum'] / count
+    data = [bins['top'], bins['base'], bins['rows'].astype(np.float64)]
+    for j in range(count.shape[1]):
+        empty = count[:, j] == 0
+        data.append(np.where(empty, np.nan, bins['min'][:, j]))
+        data.append(np.where(empty, np.nan, bins['max'][:, j]))
+        data.append(np.where(empty, np.nan, mean[:, j]))
+    return pd.DataFrame(np.column_stack(data), columns=columns)
+
+
+class CurvePyramid(object):
+    """Pyramid of one data section, see the module docstring
+    update() takes the DataFrames of the section in order; close() writes the last bins and returns
+    the levels kept as [{'level': 1, 'rows_per_bin': 16, 'bins': n, 'file': path}, ...], also left in
+    written; abort() removes the files written so far"""
+
+    def __init__(self, basefile, curve_names, output_format=None, compression=None, rows_per_bin=PYRAMID_BIN_ROWS,
+                 factor=PYRAMID_FACTOR, min_bins=PYRAMID_MIN_BINS):
+        curve_names = [str(c) for c in curve_names]
+        self.basefile = basefile
+        self.columns = [curve_names[0] + '_top', curve_names[0] + '_base', 'rows']
+        for name in curve_names[1:]:
+            self.columns += [name + '_min', name + '_max', name + '_mean']
+        self.output_format = output_format or 'csv'
+        self.compression = compression
+        self.rows_per_bin = rows_per_bin
+        self.factor = factor
+        self.min_bins = min_bins
+        self.rows = 0
+        self.levels = []
+        self.written = []
+
+    def update(self, frame):
+        """Add the rows of a DataFrame whose columns are the curves of the section, the depth first"""
+        if len(frame):
+            values = las_stats.numeric_values(frame)[0]
+            self.rows += len(values)
+            self.push(0, raw_bins(values))
+
+    def push(self, i, bins, final=False):
+        """Add bins of the level below (rows for level 0) to level i and write the bins completed
+        final - also write the last incomplete bin and pass it on"""
+        if i == len(self.levels):
+            self.levels.append({'pending': None, 'writer': None, 'bins': 0,
+                                'rows_per_bin': self.rows_per_bin * self.factor ** i})
+        level = self.levels[i]
+        size = self.rows_per_bin if i == 0 else self.factor
+        pending = concat_bins(level['pending'], bins)
+        n = bin_count(pending)
+        complete = n // size * size
+        done = reduce_bins(take_bins(pending, 0, complete), size)
+        level['pending'] = take_bins(pending, complete, n)
+        if final and complete < n:
+            done = concat_bins(done, reduce_bins(level['pending'], n - complete))
+            level['pending'] = None
+        if bin_count(done):
+            if level['writer'] is None:
+                level['writer'] = las_writers.open_writer(self.output_format, self.basefile + str(i + 1),
+                                                          self.columns, compression=self.compression)
+            level['writer'].write(bins_frame(done, self.columns))
+            level['bins'] += bin_count(done)
+        # during the parse every completed bin goes up; at the end only as far as there is anything to combine
+        if (not final and bin_count(done)) or (final and (i + 1 < len(self.levels) or level['bins'] > 1)):
+            self.push(i + 1, done, final)
+
+    def close(self):
+        """Write the last bins, remove the levels too fine to be needed and return the levels kept"""
+        import numpy as np
+        if self.levels:
+            empty = raw_bins(np.empty((0, len(self.columns) // 3)))
+            self.push(0, empty, final=True)
+        kept = []
+        below = self.rows
+        for i, level in enumerate(self.levels):
+            if level['writer'] is not None:
+                level['writer'].close()
+                if below > self.min_bins:
+                    kept.append({'level': i + 1, 'rows_per_bin': level['rows_per_bin'], 'bins': level['bins'],
+                                 'file': level['writer'].path})
+                else:
+                    os.remove(level['writer'].path)
+            below = level['bins']
+        self.written = kept
+        return kept
+
+    def abort(self):
+        """Close and remove the level files written so far"""
+        for level in self.levels:
+            if level['writer'] is not None:
+                level['writer'].close()
+                if os.path.exists(level['writer'].path):
+                    os.remove(level['writer'].path)
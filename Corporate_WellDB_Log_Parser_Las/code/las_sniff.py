@@ -0,0 +1,188 @@
+"""Header-only profiles of las files, for planning and ordering large batches
+
+sniff_lasfile reads the header up to the first data section and a sample of the data (SAMPLE_BYTES),
+and returns the profile of the file in a few milliseconds, without numpy or pandas:
+
+    {"file": "...", "input_bytes": 85728862, "size": 85728862, "version": 2.0, "wrap": false, "dlm": " ",
+     "null_value": -999.25, "curves": 10, "data_offset": 1231, "sample_rows": 1539, "bytes_per_row": 84.3,
+     "rows": 1016337, "exact": false, "cost": 10163370, "milliseconds": 2.6}
+
+rows is estimated from the bytes after the start of the first data section and the bytes per row of
+the sample (exact when the sample reached the end of the file); LAS v3 files count their first data
+section only, compressed files whose size is not known (bz2, xz) are assumed to compress
+COMPRESSION_RATIO times. cost is the number of values (rows * curves), what the parse time follows.
+
+schedule_order puts the largest files first, so a batch does not end waiting on one giant file, and
+plan_bins splits the files into bins of about equal cost, wrapped files in bins of their own:
+
+    python las_sniff.py /data/welldb --bins 4 --manifests plan
+    python las_batch.py plan_01.txt -j 16 --schedule
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+import las_input
+
+logger = logging.getLogger()
+
+SAMPLE_BYTES = 1 << 16
+# bz2 and xz files do not record their size, las text usually compresses about this well
+COMPRESSION_RATIO = 5.0
+
+
+def curve_count(sections, data_section):
+    """Return the number of curves of a data section: lines of its LAS v3 definition section, or of ~C"""
+    definition = data_section.name.split('|')[1].strip() if '|' in data_section.name else None
+    for section in sections:
+        if (definition and section.name == definition) or (not definition and section.section_id.upper() == '~C'):
+            return section.end - section.start + 1
+    return None
+
+
+def sample_rows(blocks, n_curves, dlm, wrap):
+    """Return the number of rows in the bytes blocks of a data sample"""
+    if not wrap:
+        return sum(1 for block in blocks for line in block.splitlines() if line.strip())
+    values = 0
+    for block in blocks:
+        if dlm != ' ':
+            block = block.replace(dlm.encode(lasparser.LAS_ENCODING), b' ')
+        values += len(block.split())
+    return values // n_curves if n_curves else 0
+
+
+def sniff_lasfile(lasfile, sample_bytes=SAMPLE_BYTES):
+    """Return the profile of lasfile (see the module docstring) from its header and a sample of its data
+    A file that cannot be read gets a profile with 'error' set and the cost of its input size"""
+    start = time.time()
+    profile = {'file': lasfile}
+    try:
+        profile['input_bytes'] = las_input.input_size(lasfile)
+        profile['size'] = las_input.uncompressed_size(lasfile)
+        file_contents = []
+        sections = []
+        blocks = []
+        data_start = None
+        sampled = 0
+        exact = True
+        with las_input.open_las(lasfile, background=False) as f:
+            for kind, content, offset in lasparser.tokenize_las_stream(f, sample_bytes):
+                if kind == lasparser.DATA_LINES:
+                    if data_start is None:
+                        data_start = offset
+                    blocks.append(content)
+                    sampled = offset + len(content) - data_start
+                    if sampled >= sample_bytes:
+                        exact = False
+                        break
+                    continue
+                if data_start is not None:
+                    # the first data section ended before the sample was complete, more sections follow (LAS v3)
+                    exact = False
+                    break
+                if kind == lasparser.SECTION_LINE:
+                    lasparser.add_section(sections, content, len(file_contents), offset)
+                file_contents.append(content)
+        lasparser.close_sections(sections, len(file_contents))
+        settings = lasparser.check_header_settings(file_contents)
+        data_sections = [s for s in sections if lasparser.is_data_section(s.name)]
+        profile.update(version=settings['version'], wrap=settings['wrap'], dlm=settings['dlm'],
+                       null_value=settings['null_value'])
+        if not data_sections:
+            raise ValueError('No data section')
+        curves = curve_count(sections, data_sections[0])
+        rows = sample_rows(blocks, curves, settings['dlm'], settings['wrap'])
+        profile.update(curves=curves, data_offset=data_start, sample_rows=rows)
+        size = profile['size']
+        if size is None:
+            size = profile['input_bytes'] * COMPRESSION_RATIO
+        if exact or not rows:
+            profile.update(bytes_per_row=round(sampled / rows, 1) if rows else None, rows=rows, exact=exact)
+        else:
+            bytes_per_row = sampled / rows
+            data_bytes = max(size - data_start, sampled)
+            profile.update(bytes_per_row=round(bytes_per_row, 1), rows=int(data_bytes / bytes_per_row), exact=False)
+        profile['cost'] = profile['rows'] * (curves or 1)
+    except (OSError, ValueError, EOFError) as e:
+        logger.warning('Cannot sniff ' + lasfile + ': ' + str(e))
+        profile['error'] = repr(e)
+        profile['cost'] = profile.get('input_bytes') or 0
+    profile['milliseconds'] = round((time.time() - start) * 1000, 2)
+    return profile
+
+
+def schedule_order(profiles):
+    """Return the files of the profiles, largest cost first"""
+    return [p['file'] for p in sorted(profiles, key=lambda p: (-p['cost'], p['file']))]
+
+
+def plan_bins(profiles, n_bins):
+    """Split the files into n_bins lists of about equal cost, largest first into the bin with the least cost
+    Wrapped files get bins of their own, as many as their share of the cost (at least one when there are any),
+    so with a single bin and both kinds of files the plan has two bins
+    Returns a list of {'files': [...], 'cost': total, 'wrapped': bool}, empty bins left out"""
+    wrapped = [p for p in profiles if p.get('wrap')]
+    plain = [p for p in profiles if not p.get('wrap')]
+    total = sum(p['cost'] for p in profiles) or 1
+    n_wrapped = 0
+    if wrapped:
+        share = sum(p['cost'] for p in wrapped) / float(total)
+        n_wrapped = max(1, int(round(share * n_bins)))
+        if plain:
+            n_wrapped = min(n_wrapped, max(n_bins - 1, 1))
+    bins = [{'files': [], 'cost': 0, 'wrapped': True} for _ in range(n_wrapped)]
+    bins += [{'files': [], 'cost': 0, 'wrapped': False} for _ in range(max(n_bins - n_wrapped, 1 if plain else 0))]
+    for group, is_wrapped in ((wrapped, True), (plain, False)):
+        candidates = [b for b in bins if b['wrapped'] == is_wrapped]
+        for p in sorted(group, key=lambda p: (-p['cost'], p['file'])):
+            target = min(candidates, key=lambda b: b['cost'])
+            target['files'].append(p['file'])
+            target['cost'] += p['cost']
+    return [b for b in bins if b['files']]
+
+
+def write_manifests(bins, prefix):
+    """Write one manifest per bin (prefix_01.txt, ...) for las_batch.py and return their paths"""
+    manifests = []
+    for i, b in enumerate(bins):
+        manifest = prefix + '_' + str(i + 1).zfill(2) + '.txt'
+        with open(manifest, 'w') as f:
+            f.write('# ' + ('wrapped, ' if b['wrapped'] else '') + 'estimated values: ' + str(b['cost']) + '\n')
+            for lasfile in b['files']:
+                f.write(os.path.abspath(lasfile) if las_input.split_member(lasfile)[1] is None else lasfile)
+                f.write('\n')
+        manifests.append(manifest)
+    return manifests
+
+
+def main():
+    import las_batch
+    parser = argparse.ArgumentParser(description='Profile las files from their header and a data sample')
+    parser.add_argument('inputs', nargs='+', help='directories, las files or manifest files (one path per line)')
+    parser.add_argument('--output', default=None, help='write the profiles to this file as JSON lines (default: stdout)')
+    parser.add_argument('--bins', type=int, default=None, help='split the files into this many bins of about equal cost')
+    parser.add_argument('--manifests', default=None, help='with --bins: write a manifest per bin, PREFIX_01.txt, ...')
+    lasparser.add_logging_arguments(parser)
+    args = parser.parse_args()
+    lasparser.configure_logging(args.log_level, args.log_file)
+    profiles = [sniff_lasfile(lasfile) for lasfile in las_batch.collect_input_files(args.inputs)]
+    lines = [json.dumps(p) for p in profiles]
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(''.join(line + '\n' for line in lines))
+    else:
+        print('\n'.join(lines))
+    if args.bins:
+        bins = plan_bins(profiles, args.bins)
+        manifests = write_manifests(bins, args.manifests) if args.manifests else [None] * len(bins)
+        for b, manifest in zip(bins, manifests):
+            print(str(len(b['files'])) + ' files, ' + str(b['cost']) + ' values' + (', wrapped' if b['wrapped'] else '') +
+                  (' -> ' + manifest if manifest else ''))
+
+
+if __name__ == '__main__':
+    main()
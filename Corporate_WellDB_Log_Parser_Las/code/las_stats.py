@@ -0,0 +1,159 @@
+"""Per-curve statistics gathered while the data sections are written
+
+CurveStatistics is updated with every chunk of a data section on its way to the output file
+(see Corporate_WellDB_Log_Parser_Las.write_curve_chunks), so the statistics cost no second pass
+over the data. For each curve it gives:
+
+    count        values that are not NULL
+    nulls        NULL values
+    text         values that are not numbers (only for sections parsed as text, left out when 0)
+    min, max, mean
+    first_depth, last_depth   depth (first curve of the section) of the first and last value
+    step, min_step, max_step  mean, smallest and largest depth difference between consecutive values
+
+The statistics are stored under 'statistics' in the curve entries of the JSON. check_depths compares
+those of the depth curve with STRT/STOP/STEP of the header.
+"""
+import logging
+
+logger = logging.getLogger()
+
+# largest difference between a header depth and the data still taken as equal, STEP is compared relative to itself
+DEPTH_TOLERANCE = 1e-3
+STEP_TOLERANCE = 1e-3
+
+
+def number(value):
+    """Return a numpy number as a JSON friendly float, None for NaN"""
+    value = float(value)
+    return None if value != value else value
+
+
+def numeric_values(frame):
+    """Return the values of a DataFrame as a float64 array and the number of text values per column
+    Text columns (sections parsed as text) are converted where possible, other values become NaN"""
+    import numpy as np
+    import pandas as pd
+    text = np.zeros(frame.shape[1], dtype=np.int64)
+    if all(dtype.kind in 'fiu' for dtype in frame.dtypes):
+        return np.asarray(frame.values, dtype=np.float64), text
+    values = np.empty(frame.shape)
+    for j in range(frame.shape[1]):
+        column = frame.iloc[:, j]
+        values[:, j] = pd.to_numeric(column, errors='coerce')
+        if column.dtype.kind == 'O':
+            is_text = column.notna().values & np.isnan(values[:, j])
+            if is_text.any():
+                # 'NaN' is how the text parser writes NULL values
+                is_text &= column.astype(str).str.upper().values != 'NAN'
+                text[j] = is_text.sum()
+    return values, text
+
+
+class CurveStatistics(object):
+    """Running statistics of the curves of one data section, see the module docstring
+    update() takes the DataFrames of the section in order, as_dict() returns the result per curve"""
+
+    def __init__(self, curve_names):
+        import numpy as np
+        self.curve_names = [str(c) for c in curve_names]
+        n = len(self.curve_names)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.nulls = np.zeros(n, dtype=np.int64)
+        self.text = np.zeros(n, dtype=np.int64)
+        self.sum = np.zeros(n)
+        self.min = np.full(n, np.inf)
+        self.max = np.full(n, -np.inf)
+        self.first_depth = np.full(n, np.nan)
+        self.last_depth = np.full(n, np.nan)
+        self.min_step = np.full(n, np.inf)
+        self.max_step = np.full(n, -np.inf)
+
+    def update(self, frame):
+        """Add the rows of a DataFrame whose columns are the curves of the section"""
+        import numpy as np
+        if not len(frame):
+            return
+        values, text = numeric_values(frame)
+        depth = values[:, 0]
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0)
+        self.count += count
+        self.text += text
+        self.nulls += len(values) - count - text
+        self.sum += np.where(valid, values, 0.0).sum(axis=0)
+        self.min = np.minimum(self.min, np.where(valid, values, np.inf).min(axis=0))
+        self.max = np.maximum(self.max, np.where(valid, values, -np.inf).max(axis=0))
+        all_valid = valid.all(axis=0) & ~np.isnan(depth).any()
+        depth_steps = np.diff(depth) if all_valid.any() else None
+        for j in np.nonzero(count)[0]:
+            if all_valid[j]:
+                depths, steps = depth, depth_steps
+            else:
+                depths = depth[valid[:, j] & ~np.isnan(depth)]
+                if not len(depths):
+                    continue
+                steps = np.diff(depths)
+            if self.last_depth[j] == self.last_depth[j]:
+                # the step from the last value of the previous chunk
+                steps = np.append(steps, depths[0] - self.last_depth[j])
+            else:
+                self.first_depth[j] = depths[0]
+            if len(steps):
+                self.min_step[j] = min(self.min_step[j], steps.min())
+                self.max_step[j] = max(self.max_step[j], steps.max())
+            self.last_depth[j] = depths[-1]
+
+    def as_dict(self):
+        """Return {curve name: statistics} for the rows added so far"""
+        result = {}
+        for j, name in enumerate(self.curve_names):
+            count = int(self.count[j])
+            stats = {'count': count, 'nulls': int(self.nulls[j])}
+            if self.text[j]:
+                stats['text'] = int(self.text[j])
+            if count:
+                stats.update(min=number(self.min[j]), max=number(self.max[j]), mean=number(self.sum[j] / count),
+                             first_depth=number(self.first_depth[j]), last_depth=number(self.last_depth[j]))
+            if count > 1 and self.first_depth[j] == self.first_depth[j]:
+                stats.update(step=number((self.last_depth[j] - self.first_depth[j]) / (count - 1)),
+                             min_step=number(self.min_step[j]), max_step=number(self.max_step[j]))
+            result[name] = stats
+        return result
+
+
+def header_number(section, mnemonic):
+    """Return the value of a header item (a metadata record) as a float, None if missing or not a number"""
+    item = (section or {}).get(mnemonic)
+    try:
+        return float(item['value'])
+    except (TypeError, KeyError, ValueError):
+        return None
+
+
+def check_depths(well_info, depth_stats, tolerance=DEPTH_TOLERANCE, step_tolerance=STEP_TOLERANCE):
+    """Compare STRT, STOP and STEP of the well information section with the statistics of the depth curve
+    Returns {mnemonic: {'header': value, 'data': value, 'ok': bool}} for the items present in the header;
+    STEP 0 (irregular sampling) passes when the depths increase or decrease throughout"""
+    data = {'STRT': depth_stats.get('first_depth'), 'STOP': depth_stats.get('last_depth'),
+            'STEP': depth_stats.get('step')}
+    result = {}
+    for mnemonic in ('STRT', 'STOP', 'STEP'):
+        header = header_number(well_info, mnemonic)
+        if header is None:
+            continue
+        value = data[mnemonic]
+        if value is None:
+            ok = False
+        elif mnemonic != 'STEP':
+            ok = abs(value - header) <= tolerance
+        elif header == 0:
+            min_step, max_step = depth_stats.get('min_step'), depth_stats.get('max_step')
+            ok = min_step is not None and (min_step > 0 or max_step < 0)
+        else:
+            steps = (depth_stats.get('min_step'), depth_stats.get('max_step'))
+            ok = all(s is not None and abs(s - header) <= step_tolerance * abs(header) for s in steps)
+        result[mnemonic] = {'header': header, 'data': value, 'ok': ok}
+        if not ok:
+            logger.warning(mnemonic + ' in the header is ' + str(header) + ', the data gives ' + str(value))
+    return result
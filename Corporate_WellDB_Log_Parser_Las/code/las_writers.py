@@ -0,0 +1,277 @@
+"""Output writers for curve tables
+
+Every writer is opened for one table (a LAS v2 ~A section or one LAS v3 data section),
+receives the data as one or more pandas DataFrames through write() and is finished by close().
+Writers are looked up by format name in OUTPUT_WRITERS, register_writer adds new formats.
+Writers with appendable = True can add rows to an existing file (open_writer(..., append=True)).
+
+Parquet and Feather output need the optional pyarrow package. numpy and pandas are imported
+when a writer is used, so the format names can be listed without loading them.
+"""
+import bz2
+import gzip
+import lzma
+import os
+import struct
+
+CSV_COMPRESSION = {'gzip': ('.gz', gzip.open), 'bz2': ('.bz2', bz2.open), 'xz': ('.xz', lzma.open)}
+# rows of an npy file read back at a time, see NpyWriter.read_frames
+READ_BACK_ROWS = 100000
+
+
+def import_pyarrow():
+    """Return the pyarrow module, with a clear message when the optional dependency is missing"""
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError('Parquet and Feather output need pyarrow, install it with: pip install pyarrow')
+    return pyarrow
+
+
+def column_metadata(name, curve_info):
+    """Return the mnemonic, units and description of a curve as arrow field metadata"""
+    info = (curve_info or {}).get(name) or {}
+    return {b'mnemonic': str(info.get('mnemonic', name)).encode('utf-8'),
+            b'units': str(info.get('units', '')).encode('utf-8'),
+            b'description': str(info.get('description', '')).encode('utf-8')}
+
+
+def arrow_table(frame, curve_names, curve_info, schema=None):
+    """Return a pyarrow Table with typed columns and the curve metadata attached to each field
+    Numeric columns become float64, anything else (e.g. dates in LAS v3) is stored as string
+    When schema is given (later chunks of the same table) its column types are reused; ValueError is raised
+    when a column typed float64 by an earlier chunk holds text, so no value is lost to NaN"""
+    import numpy as np
+    pa = import_pyarrow()
+    fields = []
+    arrays = []
+    for ci, name in enumerate(curve_names):
+        column = frame.iloc[:, ci]
+        values = None
+        if schema is not None:
+            column_type = schema.field(ci).type
+        else:
+            try:
+                values = np.asarray(column.values, dtype=np.float64)
+                column_type = pa.float64()
+            except (ValueError, TypeError):
+                column_type = pa.string()
+        if pa.types.is_floating(column_type):
+            if values is None:
+                try:
+                    values = np.asarray(column.values, dtype=np.float64)
+                except (ValueError, TypeError):
+                    raise ValueError('Column ' + str(name) + ' holds text after numeric rows')
+        else:
+            values = column.astype(object).where(column.notnull(), None).values
+        arrays.append(pa.array(values, type=column_type, from_pandas=True))
+        fields.append(pa.field(str(name), column_type, metadata=column_metadata(name, curve_info)))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+class CsvWriter(object):
+    """Plain text csv, NaN written as 'NaN', optionally gzip/bz2/xz compressed
+    With append the rows are added to an existing file without a header; compressed files get
+    another stream, which gzip, bz2 and xz readers read as one"""
+    extension = '.csv'
+    appendable = True
+
+    def __init__(self, path, curve_names, curve_info=None, compression=None, append=False):
+        self.curve_names = list(curve_names)
+        mode = 'a' if append else 'w'
+        if compression:
+            if compression not in CSV_COMPRESSION:
+                raise ValueError('Unsupported csv compression: ' + str(compression))
+            suffix, opener = CSV_COMPRESSION[compression]
+            self.path = path + suffix
+            self.f = opener(self.path, mode + 't', newline='')
+        else:
+            self.path = path
+            self.f = open(self.path, mode, newline='')
+        self.header = not append
+
+    def write(self, frame):
+        frame.to_csv(self.f, index=False, header=self.header, na_rep='NaN')
+        self.header = False
+
+    def close(self):
+        if self.header:
+            self.f.write(','.join(self.curve_names) + '\n')
+        self.f.close()
+
+
+class ParquetWriter(object):
+    """Parquet file, one row group per write(), curve metadata stored on every column"""
+    extension = '.parquet'
+
+    def __init__(self, path, curve_names, curve_info=None, compression=None):
+        import_pyarrow()
+        self.path = path
+        self.curve_names = list(curve_names)
+        self.curve_info = curve_info
+        self.compression = compression or 'NONE'
+        self.schema = None
+        self.writer = None
+
+    def write(self, frame):
+        import pyarrow.parquet as pq
+        table = arrow_table(frame, self.curve_names, self.curve_info, self.schema)
+        if self.writer is None:
+            self.schema = table.schema
+            self.writer = pq.ParquetWriter(self.path, self.schema, compression=self.compression)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is None:
+            import numpy as np
+            import pandas as pd
+            self.write(pd.DataFrame(np.empty((0, len(self.curve_names))), columns=self.curve_names))
+        self.writer.close()
+
+    def read_frames(self):
+        """Yield the rows of the closed file as DataFrames, one per row group"""
+        import pyarrow.parquet as pq
+        with open(self.path, 'rb') as f:
+            parquet_file = pq.ParquetFile(f)
+            for i in range(parquet_file.num_row_groups):
+                yield parquet_file.read_row_group(i).to_pandas()
+
+
+class FeatherWriter(object):
+    """Feather (Arrow IPC) file, compression 'lz4' or 'zstd', curve metadata stored on every column"""
+    extension = '.feather'
+
+    def __init__(self, path, curve_names, curve_info=None, compression=None):
+        import_pyarrow()
+        self.path = path
+        self.curve_names = list(curve_names)
+        self.curve_info = curve_info
+        self.compression = compression
+        self.schema = None
+        self.writer = None
+
+    def write(self, frame):
+        import pyarrow.ipc as ipc
+        table = arrow_table(frame, self.curve_names, self.curve_info, self.schema)
+        if self.writer is None:
+            self.schema = table.schema
+            options = ipc.IpcWriteOptions(compression=self.compression)
+            self.writer = ipc.new_file(self.path, self.schema, options=options)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is None:
+            import numpy as np
+            import pandas as pd
+            self.write(pd.DataFrame(np.empty((0, len(self.curve_names))), columns=self.curve_names))
+        self.writer.close()
+
+    def read_frames(self):
+        """Yield the rows of the closed file as DataFrames, one per record batch"""
+        import pyarrow.ipc as ipc
+        pa = import_pyarrow()
+        with pa.OSFile(self.path, 'rb') as f:
+            reader = ipc.open_file(f)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i).to_pandas()
+
+
+class NpyWriter(object):
+    """NumPy .npy file holding a structured float64 array with one field per curve mnemonic
+    Units and descriptions cannot be stored in .npy, they stay in the JSON metadata
+    The rows are streamed to disk and the header is rewritten with the final row count on close"""
+    extension = '.npy'
+
+    def __init__(self, path, curve_names, curve_info=None, compression=None):
+        if compression:
+            raise ValueError('npy output does not support compression')
+        import numpy as np
+        self.path = path
+        self.dtype = np.dtype([(str(name), '<f8') for name in curve_names])
+        self.rows = 0
+        self.f = open(self.path, 'wb')
+        self.f.write(self.header(0))
+
+    def header(self, rows):
+        """Return a version 1.0 npy header padded to the same size for any row count"""
+        import numpy as np
+        descr = np.lib.format.dtype_to_descr(self.dtype)
+        header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (descr, rows)
+        length = 10 + len(header) - len(str(rows)) + 20 + 1
+        length += -length % 64
+        if length - 10 > 65535:
+            raise ValueError('Too many curves for npy output')
+        header = header.ljust(length - 10 - 1) + '\n'
+        return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+    def write(self, frame):
+        import numpy as np
+        try:
+            values = np.asarray(frame.values, dtype=np.float64)
+        except (ValueError, TypeError):
+            raise ValueError('npy output supports numeric curves only')
+        np.ascontiguousarray(values, dtype='<f8').tofile(self.f)
+        self.rows += len(values)
+
+    def close(self):
+        self.f.seek(0)
+        self.f.write(self.header(self.rows))
+        self.f.close()
+
+    def read_frames(self):
+        """Yield the rows of the closed file as DataFrames of READ_BACK_ROWS rows"""
+        import numpy as np
+        import pandas as pd
+        with open(self.path, 'rb') as f:
+            np.lib.format.read_magic(f)
+            np.lib.format.read_array_header_1_0(f)
+            while True:
+                values = np.fromfile(f, dtype=self.dtype, count=READ_BACK_ROWS)
+                if not len(values):
+                    return
+                yield pd.DataFrame(values)
+
+
+OUTPUT_WRITERS = {
+    'csv': CsvWriter,
+    'parquet': ParquetWriter,
+    'feather': FeatherWriter,
+    'npy': NpyWriter,
+}
+
+
+def reopen_as_csv(writer, curve_names, curve_info=None):
+    """Go on in csv with a table the writer's format cannot hold: the writer is closed, the rows it wrote
+    are copied chunk by chunk to a csv file next to its file, which is removed, and the CsvWriter is returned
+    for the rest of the table"""
+    writer.close()
+    csv_writer = CsvWriter(os.path.splitext(writer.path)[0] + CsvWriter.extension, curve_names, curve_info)
+    try:
+        for frame in writer.read_frames():
+            csv_writer.write(frame)
+    except BaseException:
+        csv_writer.close()
+        os.remove(csv_writer.path)
+        raise
+    finally:
+        os.remove(writer.path)
+    return csv_writer
+
+
+def register_writer(output_format, writer_class):
+    """Make a writer class available under the given output format name"""
+    OUTPUT_WRITERS[output_format] = writer_class
+
+
+def open_writer(output_format, basefile, curve_names, curve_info=None, compression=None, append=False):
+    """Return a writer for basefile (path without extension) in the requested format
+    append - add rows to the existing file, for the formats with appendable writers"""
+    try:
+        writer_class = OUTPUT_WRITERS[output_format]
+    except KeyError:
+        raise ValueError('Unknown output format: ' + str(output_format))
+    if append:
+        if not getattr(writer_class, 'appendable', False):
+            raise ValueError('Rows cannot be appended to ' + str(output_format) + ' files')
+        return writer_class(basefile + writer_class.extension, curve_names, curve_info, compression, append=True)
+    return writer_class(basefile + writer_class.extension, curve_names, curve_info, compression)
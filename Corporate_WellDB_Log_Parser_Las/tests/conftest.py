@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# the parser modules are scripts in code/, not an installed package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'code'))
+
+
+@pytest.fixture
+def write_las(tmp_path):
+    """Return a function writing the lines (see las_samples) to a file in tmp_path and returning its path"""
+    def write(lines, name='well.las'):
+        path = tmp_path / name
+        path.write_bytes(('\n'.join(lines) + '\n').encode('utf-8'))
+        return str(path)
+    return write
@@ -0,0 +1,67 @@
+"""Small las files for the tests"""
+
+CURVES = ('DEPT.M', 'GR.GAPI', 'RHOB.G/C3')
+
+
+def las2_lines(rows, null='-999.25', wrap=False, curves=CURVES):
+    """Return the lines of a LAS v2 file with the given data rows (lists of values)
+    Wrapped files get the depth on a line of its own and the other values on the next line"""
+    lines = ['~VERSION INFORMATION',
+             ' VERS.   2.0 : CWLS LOG ASCII STANDARD -VERSION 2.0',
+             ' WRAP.   ' + ('YES' if wrap else 'NO') + ' : ONE LINE PER DEPTH STEP',
+             '# a comment in the header',
+             '~WELL INFORMATION',
+             ' STRT.M   ' + (str(rows[0][0]) if rows else '0') + ' : START DEPTH',
+             ' STOP.M   ' + (str(rows[-1][0]) if rows else '0') + ' : STOP DEPTH',
+             ' STEP.M   0.5 : STEP',
+             ' NULL.    ' + null + ' : NULL VALUE',
+             ' WELL.    TEST WELL : WELL',
+             '~CURVE INFORMATION']
+    lines += [' ' + curve + ' : ' + curve.split('.')[0] for curve in curves]
+    lines.append('~A  ' + '  '.join(curve.split('.')[0] for curve in curves))
+    for row in rows:
+        values = [str(v) for v in row]
+        lines += [values[0], ' '.join(values[1:])] if wrap else [' '.join(values)]
+    return lines
+
+
+LAS3_LINES = ['~Version',
+              ' VERS.   3.0 : CWLS LOG ASCII STANDARD -VERSION 3.0',
+              ' WRAP.   NO : ONE LINE PER DEPTH STEP',
+              ' DLM .   SPACE : DELIMITING CHARACTER',
+              '~Well',
+              ' STRT.M   1600.0 : START DEPTH',
+              ' STOP.M   1601.0 : STOP DEPTH',
+              ' NULL.    -9999 : NULL VALUE',
+              '~Log_Definition',
+              ' DEPT.M : DEPTH',
+              ' GR  .GAPI : GAMMA RAY',
+              '~Log_Data | Log_Definition',
+              '1600.0 10.5',
+              '# a comment in the data',
+              '1600.5 -9999',
+              '1601.0 -999.25',
+              '~Core_Parameter',
+              ' RUN.   1 : RUN NUMBER',
+              '~Core_Definition',
+              ' CDEP.M : CORE DEPTH',
+              ' CDAT.  : SAMPLE DATE',
+              ' POR .% : POROSITY',
+              '~Core_Data | Core_Definition',
+              '1600.2 12/05/2020 21.5',
+              '1600.7 13/05/2020 -9999']
+
+
+def las_bytes(lines):
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def section_offsets(data):
+    """Return {section line: offset} of the lines of data starting with ~"""
+    offsets = {}
+    offset = 0
+    for line in data.splitlines(True):
+        if line.startswith(b'~'):
+            offsets[line.decode('utf-8').strip()] = offset
+        offset += len(line)
+    return offsets
@@ -0,0 +1,49 @@
+import json
+import os
+import shutil
+import time
+
+import pytest
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+from las_samples import LAS3_LINES
+
+
+def read_outputs(lasfile):
+    """Return the contents of the output files of lasfile, the JSON metadata parsed"""
+    folder = os.path.dirname(lasparser.output_files(lasfile)[0])
+    outputs = {}
+    for name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, name)) as f:
+            outputs[name] = json.load(f) if name.endswith('.json') else f.read()
+    return outputs
+
+
+@pytest.mark.parametrize('run', [{'section_workers': 2}, {'section_workers': 2, 'section_processes': True}])
+def test_concurrent_sections(write_las, run):
+    lasfile = write_las(LAS3_LINES)
+    metrics = {}
+    assert lasparser.parse_lasfile(lasfile, section_workers=1, metrics=metrics) == 'parsed'
+    expected = read_outputs(lasfile)
+    shutil.rmtree(os.path.dirname(lasparser.output_files(lasfile)[0]))
+    concurrent_metrics = {}
+    assert lasparser.parse_lasfile(lasfile, metrics=concurrent_metrics, **run) == 'parsed'
+    # the same files, 'Data files' in the order of the sections
+    assert read_outputs(lasfile) == expected
+    assert expected['well.json']['Data files'] == ['well/well_Log_Data.csv', 'well/well_Core_Data.csv']
+    # the metrics of the threads or processes are collected as well
+    assert concurrent_metrics['counters'] == metrics['counters']
+    assert concurrent_metrics['counters']['output_rows'] == 5
+    assert concurrent_metrics['stages']['write']['calls'] == metrics['stages']['write']['calls']
+    # the Core section holds dates, it is written by the text reader
+    assert list(concurrent_metrics['errors']) == ['parse_data']
+
+
+def test_results_in_job_order(monkeypatch):
+    def save_data_section(name, delay, **options):
+        time.sleep(delay)
+        return name, options
+    monkeypatch.setattr(lasparser, 'save_data_section', save_data_section)
+    jobs = [('first', 0.3), ('second', 0.0), ('third', 0.1)]
+    results = lasparser.save_data_sections(jobs, {'decimals': 2}, section_workers=3, chunk_rows=10)
+    assert results == [(name, {'decimals': 2, 'chunk_rows': 10}) for name in ('first', 'second', 'third')]
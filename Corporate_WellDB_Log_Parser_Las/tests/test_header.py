@@ -0,0 +1,82 @@
+import gzip
+import io
+
+import pytest
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+import las_input
+from las_samples import LAS3_LINES, las2_lines, las_bytes, section_offsets
+
+
+def test_read_las_header_v3(write_las):
+    lasfile = write_las(LAS3_LINES)
+    data = las_bytes(LAS3_LINES)
+    file_contents, sections = lasparser.read_las_header(lasfile)
+    offsets = section_offsets(data)
+    assert [s.name for s in sections] == [line[1:].strip() for line in offsets]
+    assert [s.offset for s in sections] == list(offsets.values())
+    assert not any(line.startswith('1600') for line in file_contents)
+    # the parameters after the first data section are read
+    assert 'RUN.   1 : RUN NUMBER' in file_contents
+
+
+class CountingReader(object):
+    def __init__(self, f, counter):
+        self.f = f
+        self.counter = counter
+
+    def read(self, size=-1):
+        chunk = self.f.read(size)
+        self.counter.append(len(chunk))
+        return chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.f.close()
+
+
+def counting_open_las(monkeypatch):
+    counter = []
+    open_las = las_input.open_las
+    monkeypatch.setattr(las_input, 'open_las', lambda *args, **kwargs: CountingReader(open_las(*args, **kwargs), counter))
+    return counter
+
+
+def test_read_las_header_v2_stops_at_data(tmp_path, monkeypatch):
+    rows = [[1600.0 + 0.5 * i, i, 2.0 + i] for i in range(50000)]
+    lasfile = str(tmp_path / 'well.las.gz')
+    with gzip.open(lasfile, 'wb') as f:
+        f.write(las_bytes(las2_lines(rows)))
+    counter = counting_open_las(monkeypatch)
+    file_contents, sections = lasparser.read_las_header(lasfile)
+    assert sections[-1].name.startswith('A')
+    assert file_contents[-1].startswith('~A')
+    assert sum(counter) <= lasparser.HEADER_CHUNK_SIZE
+
+
+def test_read_las_header_v3_skips_data(write_las, monkeypatch):
+    rows = ['%.1f %d' % (1601.5 + 0.5 * i, i) for i in range(50000)]
+    lines = LAS3_LINES[:14] + rows + LAS3_LINES[14:]
+    lasfile = write_las(lines)
+    counter = counting_open_las(monkeypatch)
+    file_contents, sections = lasparser.read_las_header(lasfile)
+    # plain files are memory mapped, the data sections are not read through a stream
+    assert counter == []
+    assert [s.offset for s in sections] == list(section_offsets(las_bytes(lines)).values())
+    assert 'RUN.   1 : RUN NUMBER' in file_contents
+
+
+@pytest.mark.parametrize('lines', [LAS3_LINES, las2_lines([[1600.0, 1, 2], [1600.5, 3, 4]]),
+                                   LAS3_LINES[:12] + ['1600.2 ~1', '  ~Core_Parameter'] + LAS3_LINES[15:], []])
+def test_scan_las_buffer(lines):
+    data = las_bytes(lines)
+    tokens = list(lasparser.tokenize_las_stream(io.BytesIO(data), 7, data=False))
+    assert list(lasparser.scan_las_buffer(data)) == tokens
+    assert list(lasparser.scan_las_buffer(data.rstrip(b'\n'))) == tokens
+
+
+def test_parse_without_version(write_las):
+    lines = [line for line in las2_lines([[1600.0, 1, 2]]) if 'VERS.' not in line]
+    assert lasparser.parse_lasfile(write_las(lines)) == 'failed'
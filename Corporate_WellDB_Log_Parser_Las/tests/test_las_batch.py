@@ -0,0 +1,66 @@
+import json
+import os
+import signal
+import time
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+import las_batch
+from las_samples import las2_lines
+
+ROWS = [[1600.0 + 0.5 * i, i, 2.0 + i] for i in range(20)]
+
+
+def slow_parser(monkeypatch, seconds=30):
+    """Make parse_lasfile hang on files named slow.las, the workers forked after this inherit it"""
+    parse_lasfile = lasparser.parse_lasfile
+
+    def parse(lasfile, **kwargs):
+        if os.path.basename(lasfile) == 'slow.las':
+            time.sleep(seconds)
+        return parse_lasfile(lasfile, **kwargs)
+    monkeypatch.setattr(lasparser, 'parse_lasfile', parse)
+
+
+def test_parse_one_timeout(write_las, monkeypatch):
+    slow_parser(monkeypatch)
+    lasfile = write_las(las2_lines(ROWS), 'slow.las')
+    start = time.time()
+    result = las_batch.parse_one((lasfile, 0.2, {}))
+    assert time.time() - start < 5
+    assert (result['status'], result['error']) == ('timeout', 'Exceeded 0.2 s')
+    # the alarm is cleared, a file parsed afterwards is not interrupted
+    assert signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0)
+    assert las_batch.parse_one((write_las(las2_lines(ROWS)), 30, {}))['status'] == 'parsed'
+    assert signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0)
+
+
+def test_parse_one_exception(write_las, monkeypatch):
+    def parse(lasfile, **kwargs):
+        raise RuntimeError('worker bug')
+    monkeypatch.setattr(lasparser, 'parse_lasfile', parse)
+    result = las_batch.parse_one((write_las(las2_lines(ROWS)), None, {}))
+    assert (result['status'], result['error']) == ('failed', "RuntimeError('worker bug')")
+    assert 'worker bug' in result['traceback']
+
+
+def test_failures_are_isolated(write_las, tmp_path, monkeypatch):
+    slow_parser(monkeypatch)
+    good = [write_las(las2_lines(ROWS), name) for name in ('a.las', 'c.las', 'e.las')]
+    # no ~VERSION section
+    bad = write_las(las2_lines(ROWS)[4:], 'b.las')
+    slow = write_las(las2_lines(ROWS), 'slow.las')
+    reportfile = str(tmp_path / 'report.json')
+    report = las_batch.run_batch([slow] + good[:2] + [bad] + good[2:], workers=2, timeout=1,
+                                 reportfile=reportfile)
+    assert report['counts'] == {'parsed': 3, 'failed': 1, 'timeout': 1}
+    results = dict((os.path.basename(r['file']), r) for r in report['results'])
+    assert sorted(results) == ['a.las', 'b.las', 'c.las', 'e.las', 'slow.las']
+    assert results['b.las']['error']
+    assert results['slow.las']['error'] == 'Exceeded 1 s'
+    for lasfile in good:
+        csvfile, jsonfile = lasparser.output_files(lasfile)
+        assert os.path.isfile(csvfile) and os.path.isfile(jsonfile)
+    assert not os.path.isfile(lasparser.output_files(slow)[0])
+    with open(reportfile) as f:
+        assert json.load(f)['counts'] == report['counts']
+    assert report['timeout'] == 1 and report['workers'] == 2
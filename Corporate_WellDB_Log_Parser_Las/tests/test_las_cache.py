@@ -0,0 +1,135 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+
+import pytest
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+import las_cache
+import las_pyramid
+from las_samples import LAS3_LINES, las2_lines, las_bytes
+
+ROWS = [[1600.0 + 0.5 * i, i, 2.0 + i] for i in range(20)]
+
+
+def test_hit_and_miss(write_las):
+    lasfile = write_las(las2_lines(ROWS))
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'parsed'
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'cached'
+    assert lasparser.parse_lasfile(lasfile, use_cache=True, verify=True) == 'cached'
+    assert lasparser.parse_lasfile(lasfile, use_cache=True, force=True) == 'parsed'
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'cached'
+
+
+def test_touched_file_is_hashed(write_las):
+    lasfile = write_las(las2_lines(ROWS))
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'parsed'
+    st = os.stat(lasfile)
+    os.utime(lasfile, (st.st_atime, st.st_mtime + 10))
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'cached'
+
+
+def test_changed_file(write_las):
+    lasfile = write_las(las2_lines(ROWS))
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'parsed'
+    st = os.stat(lasfile)
+    # same size and mtime, only the contents tell
+    write_las(las2_lines(ROWS[:-1] + [[1609.5, 91, 21.0]]))
+    os.utime(lasfile, (st.st_atime, st.st_mtime))
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'cached'
+    assert lasparser.parse_lasfile(lasfile, use_cache=True, verify=True) == 'parsed'
+    write_las(las2_lines(ROWS + [[1610.0, 20, 22.0]]))
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'parsed'
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'cached'
+
+
+def test_changed_options(write_las):
+    lasfile = write_las(las2_lines(ROWS))
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'parsed'
+    assert lasparser.parse_lasfile(lasfile, use_cache=True, decimals=2) == 'parsed'
+    assert lasparser.parse_lasfile(lasfile, use_cache=True, decimals=2) == 'cached'
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'parsed'
+
+
+def test_changed_parser_version(write_las, monkeypatch):
+    lasfile = write_las(las2_lines(ROWS))
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'parsed'
+    monkeypatch.setattr(lasparser, 'PARSER_VERSION', lasparser.PARSER_VERSION + '.1')
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'parsed'
+
+
+def test_changed_outputs(write_las):
+    lasfile = write_las(las2_lines(ROWS))
+    csvfile, jsonfile = lasparser.output_files(lasfile)
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'parsed'
+    os.remove(csvfile)
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'parsed'
+    assert os.path.isfile(csvfile)
+    with open(jsonfile, 'a') as f:
+        f.write('\n')
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'parsed'
+
+
+def test_failed_files_are_not_cached(write_las):
+    lines = [line for line in las2_lines(ROWS) if 'VERS.' not in line]
+    lasfile = write_las(lines)
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'failed'
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'failed'
+
+
+def cached_entry(lasfile):
+    output_root = os.path.dirname(os.path.dirname(lasparser.output_files(lasfile)[0]))
+    db = sqlite3.connect(os.path.join(output_root, las_cache.CACHE_FILE))
+    try:
+        return db.execute('SELECT sha256, outputs FROM parsed_files').fetchone()
+    finally:
+        db.close()
+
+
+def no_rehash(*args):
+    raise AssertionError('the input is hashed again')
+
+
+@pytest.mark.parametrize('lines', [las2_lines(ROWS), las2_lines(ROWS, wrap=True), LAS3_LINES])
+@pytest.mark.parametrize('compressed', [False, True])
+def test_digest_computed_while_parsing(tmp_path, monkeypatch, lines, compressed):
+    data = las_bytes(lines)
+    lasfile = str(tmp_path / ('well.las.gz' if compressed else 'well.las'))
+    with (gzip.open if compressed else open)(lasfile, 'wb') as f:
+        f.write(data)
+    monkeypatch.setattr(las_cache, 'file_digest', no_rehash)
+    assert lasparser.parse_lasfile(lasfile, use_cache=True) == 'parsed'
+    assert cached_entry(lasfile)[0] == hashlib.sha256(data).hexdigest()
+    monkeypatch.undo()
+    # the stored digest is the one lookup compares against
+    assert lasparser.parse_lasfile(lasfile, use_cache=True, verify=True) == 'cached'
+
+
+def test_metadata_only_v2(write_las, monkeypatch):
+    lasfile = write_las(las2_lines(ROWS))
+    monkeypatch.setattr(las_cache, 'file_digest', no_rehash)
+    assert lasparser.parse_lasfile(lasfile, use_cache=True, metadata_only=True) == 'metadata'
+    # the data was not read, so there is no digest and a touched file is redone
+    assert cached_entry(lasfile)[0] is None
+    assert lasparser.parse_lasfile(lasfile, use_cache=True, metadata_only=True) == 'cached'
+    st = os.stat(lasfile)
+    os.utime(lasfile, (st.st_atime, st.st_mtime + 10))
+    assert lasparser.parse_lasfile(lasfile, use_cache=True, metadata_only=True) == 'metadata'
+
+
+def test_only_written_outputs(write_las, monkeypatch):
+    pyramid = las_pyramid.CurvePyramid
+    monkeypatch.setattr(las_pyramid, 'CurvePyramid', lambda *args: pyramid(*args, rows_per_bin=2, min_bins=2))
+    lasfile = write_las(las2_lines(ROWS))
+    csvfile, jsonfile = lasparser.output_files(lasfile)
+    os.makedirs(os.path.dirname(csvfile))
+    stale = os.path.join(os.path.dirname(csvfile), 'well_old.parquet')
+    open(stale, 'w').close()
+    assert lasparser.parse_lasfile(lasfile, use_cache=True, pyramid=True) == 'parsed'
+    outputs = [path for path, size, mtime in json.loads(cached_entry(lasfile)[1])]
+    levels = [csvfile[:-len('.csv')] + '_pyramid' + str(level) + '.csv' for level in (1, 2, 3)]
+    assert outputs == [jsonfile, csvfile] + levels
+    os.remove(stale)
+    assert lasparser.parse_lasfile(lasfile, use_cache=True, pyramid=True) == 'cached'
@@ -0,0 +1,58 @@
+import json
+import os
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+import las_batch
+import las_catalog
+from las_samples import las2_lines
+
+ROWS = [[1600.0 + 0.5 * i, i, 2.0 + i] for i in range(20)]
+
+
+def test_metadata_only(write_las, tmp_path, capsys):
+    lasfile = write_las(las2_lines(ROWS))
+    assert lasparser.parse_lasfile(lasfile, metadata_only=True) == 'metadata'
+    catalog = las_catalog.LasCatalog(str(tmp_path / 'catalog.sqlite'))
+    try:
+        assert catalog.add_outputs([str(tmp_path)]) == (1, 0)
+        wells = catalog.query(curves=['GR'])
+        assert [w['data_files'] for w in wells] == [[]]
+        assert wells[0]['well'] == 'TEST WELL'
+        las_catalog.print_wells(wells)
+        assert capsys.readouterr().out.rstrip('\n').split('\t')[1:] == ['TEST WELL', '', '1600.0-1609.5 M', '']
+        # rows written before data_files defaulted to []
+        catalog.db.execute("UPDATE wells SET data_files = 'null'")
+        assert catalog.query()[0]['data_files'] == []
+    finally:
+        catalog.close()
+
+
+def test_parser_entries_are_not_header_items(write_las, tmp_path):
+    lasfile = write_las(las2_lines(ROWS))
+    assert lasparser.parse_lasfile(lasfile, check_depths=True) == 'parsed'
+    jsonfile = lasparser.output_files(lasfile)[1]
+    with open(jsonfile) as f:
+        assert 'Depth check' in json.load(f)
+    catalog = las_catalog.LasCatalog(str(tmp_path / 'catalog.sqlite'))
+    try:
+        catalog.add_outputs([str(tmp_path)])
+        sections = catalog.db.execute('SELECT DISTINCT section FROM header_items').fetchall()
+        assert sorted(s for (s,) in sections) == ['VERSION_INFORMATION_SECTION', 'WELL_INFORMATION_SECTION']
+        assert [c[1] for c in catalog.curves(jsonfile)] == ['DEPT', 'GR', 'RHOB']
+        assert catalog.query(curves=['GR'])[0]['data_files'] == ['well/well.csv']
+    finally:
+        catalog.close()
+
+
+def test_batch_metadata_only(write_las, tmp_path):
+    lasfiles = [write_las(las2_lines(ROWS), name) for name in ('a.las', 'b.las')]
+    catalog_file = str(tmp_path / 'catalog.sqlite')
+    report = las_batch.run_batch(lasfiles, workers=2, catalog_file=catalog_file, metadata_only=True)
+    assert report['counts'] == {'metadata': 2}
+    catalog = las_catalog.LasCatalog(catalog_file)
+    try:
+        wells = catalog.query()
+        assert [(os.path.basename(w['lasfile']), w['status'], w['data_files']) for w in wells] == [
+            ('a.las', 'metadata', []), ('b.las', 'metadata', [])]
+    finally:
+        catalog.close()
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from las_file import LasFile
+
+
+def write_las2(path, depths, wrap=False):
+    """Write a LAS v2 file with the curves DEPT and GR (the row number), a comment and a blank line after the data"""
+    lines = ['~VERSION INFORMATION', 'VERS.   2.0 : CWLS LOG ASCII STANDARD -VERSION 2.0',
+             'WRAP.   ' + ('YES' if wrap else 'NO') + ' : ONE LINE PER DEPTH STEP',
+             '~WELL INFORMATION', 'NULL.   -999.25 : NULL VALUE',
+             '~CURVE INFORMATION', 'DEPT.M : DEPTH', 'GR  .GAPI : GAMMA RAY', '~A  DEPT  GR']
+    for i, depth in enumerate(depths):
+        lines.extend([str(depth), str(i)] if wrap else [str(depth) + ' ' + str(i)])
+    lines.extend(['# end of log', ''])
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+@pytest.mark.parametrize('rows', [20, 2000])
+@pytest.mark.parametrize('descending', [False, True])
+def test_window(tmp_path, rows, descending):
+    depths = 1600.0 + 0.5 * np.arange(rows)
+    if descending:
+        depths = depths[::-1]
+    lasfile = write_las2(tmp_path / 'well.las', depths)
+    with LasFile(lasfile) as log:
+        index = log.index(top=1601.0, base=1602.0)
+        gr = log.curve('GR', top=1601.0, base=1602.0)
+    expected = [1602.0, 1601.5, 1601.0] if descending else [1601.0, 1601.5, 1602.0]
+    assert list(index) == expected
+    assert list(depths[gr.astype(int)]) == expected
+
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_window_outside_the_data(tmp_path, descending):
+    depths = 1600.0 + 0.5 * np.arange(20)
+    lasfile = write_las2(tmp_path / 'well.las', depths[::-1] if descending else depths)
+    with LasFile(lasfile) as log:
+        assert len(log.index(top=1700.0, base=1800.0)) == 0
+        assert len(log.index()) == 20
+
+
+def test_window_wrapped(tmp_path):
+    depths = 1600.0 + 0.5 * np.arange(20)
+    lasfile = write_las2(tmp_path / 'well.las', depths[::-1], wrap=True)
+    with LasFile(lasfile) as log:
+        assert log.wrap
+        assert sorted(log.index(top=1601.0, base=1602.0)) == [1601.0, 1601.5, 1602.0]
@@ -0,0 +1,72 @@
+import json
+import os
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+import las_follow
+from las_samples import las2_lines
+
+ROWS = [[1600.0 + 0.5 * i, i, 2.0 + i] for i in range(30)]
+
+
+def append(lasfile, text):
+    with open(lasfile, 'ab') as f:
+        f.write(text.encode('utf-8'))
+
+
+def row_text(rows):
+    return ''.join(' '.join(str(v) for v in row) + '\n' for row in rows)
+
+
+def stop_value(jsonfile):
+    with open(jsonfile) as f:
+        return json.load(f)['WELL_INFORMATION_SECTION']['STOP']['value']
+
+
+def test_appends(write_las, tmp_path):
+    lasfile = write_las(las2_lines(ROWS[:10]))
+    csvfile, jsonfile = lasparser.output_files(lasfile)
+    assert las_follow.follow_once(lasfile) == 10
+    assert las_follow.follow_once(lasfile) == 0
+    # the last row has no line end yet and is left for the next poll
+    append(lasfile, row_text(ROWS[10:20]) + '1610.0 2')
+    assert las_follow.follow_once(lasfile) == 10
+    assert stop_value(jsonfile) == '1609.5'
+    append(lasfile, '0 22.0\n# a comment\n' + row_text(ROWS[21:]))
+    assert las_follow.follow_once(lasfile) == 10
+    assert stop_value(jsonfile) == '1614.5'
+    with open(las_follow.state_file(jsonfile)) as f:
+        assert json.load(f)['rows'] == 30
+    # the outputs are those of a full parse of the file
+    full = tmp_path / 'full'
+    full.mkdir()
+    fullfile = str(full / 'well.las')
+    with open(lasfile, 'rb') as f, open(fullfile, 'wb') as g:
+        g.write(f.read())
+    assert lasparser.parse_lasfile(fullfile) == 'parsed'
+    full_csv = lasparser.output_files(fullfile)[0]
+    with open(csvfile) as f, open(full_csv) as g:
+        assert f.read() == g.read()
+
+
+def test_rows_not_past_last_depth(write_las):
+    lasfile = write_las(las2_lines(ROWS[:10]))
+    csvfile, jsonfile = lasparser.output_files(lasfile)
+    assert las_follow.follow_once(lasfile) == 10
+    append(lasfile, row_text(ROWS[5:12]))
+    assert las_follow.follow_once(lasfile) == 2
+    with open(csvfile) as f:
+        assert len(f.read().splitlines()) == 1 + 12
+
+
+def test_rewritten_file(write_las):
+    lasfile = write_las(las2_lines(ROWS[:10]))
+    csvfile, jsonfile = lasparser.output_files(lasfile)
+    assert las_follow.follow_once(lasfile) == 10
+    # a shorter file is parsed from the start
+    write_las(las2_lines(ROWS[:5]))
+    assert las_follow.follow_once(lasfile) == 5
+    assert las_follow.follow_once(lasfile, decimals=1) == 5
+    os.remove(csvfile)
+    assert las_follow.follow_once(lasfile, decimals=1) == 5
+    with open(csvfile) as f:
+        assert len(f.read().splitlines()) == 1 + 5
@@ -0,0 +1,137 @@
+import bz2
+import gzip
+import os
+import tempfile
+import zipfile
+
+import pytest
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+import las_input
+from las_samples import LAS3_LINES, las2_lines, las_bytes
+
+DATA = las_bytes(las2_lines([[1600.0 + 0.5 * i, i, 2.0 + i] for i in range(200)]))
+
+
+def test_input_name_plain():
+    assert las_input.input_name('/data/well.las') == 'well'
+    assert las_input.input_name('/data/WELL.LAS') == 'WELL'
+
+
+@pytest.mark.parametrize('ext', ['.gz', '.bz2', '.xz'])
+def test_input_name_compressed(tmp_path, ext):
+    lasfile = str(tmp_path / ('well.las' + ext))
+    open(lasfile, 'wb').close()
+    assert las_input.input_name(lasfile) == 'well'
+    # next to the plain las file the compression is kept as a suffix
+    open(str(tmp_path / 'well.las'), 'wb').close()
+    assert las_input.input_name(lasfile) == 'well_' + ext[1:]
+    assert las_input.input_name(str(tmp_path / 'well.las')) == 'well'
+
+
+def test_input_name_compressed_twins(tmp_path):
+    for ext in ('.gz', '.bz2'):
+        open(str(tmp_path / ('well.las' + ext)), 'wb').close()
+    names = [las_input.input_name(str(tmp_path / ('well.las' + ext))) for ext in ('.gz', '.bz2')]
+    assert names == ['well_gz', 'well_bz2']
+
+
+def test_input_name_zip_member():
+    assert las_input.input_name('/data/archive.zip::logs/well.las') == 'archive_logs_well'
+    assert las_input.input_name('/data/archive.zip::well.las.gz') == 'archive_well'
+    assert las_input.input_name('/data/archive.zip::a/b/well.las') == 'archive_a_b_well'
+
+
+def write_archive(path):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('logs/well.las', DATA)
+        z.writestr('logs/other.las', DATA)
+    return path
+
+
+def test_zip_member_outputs(tmp_path):
+    archive = write_archive(str(tmp_path / 'archive.zip'))
+    assert las_input.list_archive_members(archive) == [archive + '::logs/well.las', archive + '::logs/other.las']
+    csvfile, jsonfile = lasparser.output_files(archive + '::logs/well.las')
+    assert csvfile == os.path.join(str(tmp_path), 'outputDir', 'archive_logs_well', 'archive_logs_well.csv')
+
+
+def test_input_span(tmp_path):
+    archive = write_archive(str(tmp_path / 'archive.zip'))
+    with open(archive, 'rb') as f:
+        contents = f.read()
+    ends = []
+    for member in ('logs/well.las', 'logs/other.las'):
+        path, offset, size = las_input.input_span(archive + '::' + member)
+        assert path == archive
+        assert contents[offset:offset + 4] == b'PK\x03\x04'
+        ends.append(offset + size)
+    # the first member ends where the second starts, the last one where the central directory starts
+    assert ends[0] == las_input.input_span(archive + '::logs/other.las')[1]
+    assert contents[ends[1]:ends[1] + 4] == b'PK\x01\x02'
+    assert las_input.input_span(archive) == (archive, 0, None)
+
+
+@pytest.mark.parametrize('background', [False, True])
+@pytest.mark.parametrize('offset', [0, 1000])
+def test_open_las(tmp_path, background, offset):
+    with gzip.open(str(tmp_path / 'well.las.gz'), 'wb') as f:
+        f.write(DATA)
+    with bz2.open(str(tmp_path / 'well.las.bz2'), 'wb') as f:
+        f.write(DATA)
+    archive = write_archive(str(tmp_path / 'archive.zip'))
+    for lasfile in (str(tmp_path / 'well.las.gz'), str(tmp_path / 'well.las.bz2'), archive + '::logs/well.las'):
+        with las_input.open_las(lasfile, offset, background) as f:
+            assert b''.join(iter(lambda: f.read(1 << 12), b'')) == DATA[offset:]
+    assert las_input.uncompressed_size(str(tmp_path / 'well.las.gz')) == len(DATA)
+
+
+def count_opens(monkeypatch):
+    """Count how often gzip inputs are opened, i.e. decompressed from the start"""
+    counter = []
+
+    def opener(*args, **kwargs):
+        counter.append(args[0])
+        return gzip.open(*args, **kwargs)
+    monkeypatch.setitem(las_input.COMPRESSED_OPENERS, '.gz', opener)
+    return counter
+
+
+def read_outputs(lasfile):
+    folder = os.path.dirname(lasparser.output_files(lasfile)[0])
+    outputs = {}
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith('.json'):
+            with open(os.path.join(folder, name)) as f:
+                outputs[name] = f.read()
+    return outputs
+
+
+def test_las3_decompressed_once(tmp_path, monkeypatch):
+    tempdir = tmp_path / 'spool'
+    tempdir.mkdir()
+    monkeypatch.setattr(tempfile, 'tempdir', str(tempdir))
+    (tmp_path / 'plain').mkdir()
+    plainfile = str(tmp_path / 'plain' / 'well.las')
+    with open(plainfile, 'wb') as f:
+        f.write(las_bytes(LAS3_LINES))
+    lasfile = str(tmp_path / 'well.las.gz')
+    with gzip.open(lasfile, 'wb') as f:
+        f.write(las_bytes(LAS3_LINES))
+    counter = count_opens(monkeypatch)
+    assert lasparser.parse_lasfile(lasfile, section_workers=2) == 'parsed'
+    assert counter == [lasfile]
+    assert os.listdir(str(tempdir)) == []
+    assert lasparser.parse_lasfile(plainfile) == 'parsed'
+    assert read_outputs(lasfile) == read_outputs(plainfile)
+    assert len(read_outputs(lasfile)) == 2
+
+
+def test_las2_streamed(tmp_path, monkeypatch):
+    lasfile = str(tmp_path / 'well.las.gz')
+    with gzip.open(lasfile, 'wb') as f:
+        f.write(DATA)
+    counter = count_opens(monkeypatch)
+    assert lasparser.parse_lasfile(lasfile) == 'parsed'
+    # the header pass and the data stream, which decompresses the header again
+    assert counter == [lasfile, lasfile]
@@ -0,0 +1,81 @@
+import json
+import threading
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+import las_metrics
+from las_samples import las2_lines
+
+ROWS = [[1600.0 + 0.5 * i, i, 2.0 + i] for i in range(20)]
+
+
+def test_no_collector():
+    las_metrics.stop()
+    with las_metrics.stage('write'):
+        las_metrics.count('rows', 10)
+    las_metrics.error('parse_data', ValueError('bad'))
+    assert las_metrics.stop() is None
+
+
+def test_stage_and_count_totals():
+    collector = las_metrics.start('well.las')
+    try:
+        def work():
+            for _ in range(100):
+                with las_metrics.stage('write'):
+                    las_metrics.count('rows', 3)
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        las_metrics.count('output_bytes', 7)
+    finally:
+        assert las_metrics.stop() is collector
+    collector.finish('parsed')
+    record = collector.as_dict()
+    assert record['stages']['write']['calls'] == 400
+    assert record['counters'] == {'rows': 1200, 'output_bytes': 7}
+    assert (record['file'], record['path'], record['errors']) == ('well.las', 'parsed', {})
+    assert json.loads(json.dumps(record)) == record
+
+
+def test_merge_and_aggregate():
+    records = []
+    for name, seconds in (('a.las', 0.5), ('b.las', 2.0)):
+        collector = las_metrics.ParseMetrics(name)
+        collector.add_time('parse_data', seconds)
+        collector.add_time('write', 0.25)
+        collector.count('rows', 10)
+        collector.finish('parsed')
+        records.append(collector.as_dict())
+    # a record made in another process is added to the active collector
+    collector = las_metrics.start('c.las')
+    las_metrics.merge(records[0])
+    las_metrics.merge(records[1])
+    las_metrics.error('parse_data', ValueError('bad'))
+    las_metrics.stop()
+    assert collector.stages == {'parse_data': {'seconds': 2.5, 'calls': 2}, 'write': {'seconds': 0.5, 'calls': 2}}
+    assert collector.counters == {'rows': 20}
+    assert collector.errors == {'parse_data': "ValueError('bad')"}
+    records[1]['seconds'] = 3.0
+    totals = las_metrics.aggregate(records, slowest=1)
+    assert totals['stages'] == {'parse_data': {'seconds': 2.5, 'calls': 2, 'files': 2},
+                                'write': {'seconds': 0.5, 'calls': 2, 'files': 2}}
+    assert totals['counters'] == {'rows': 20}
+    assert totals['slowest_files'] == [{'file': 'b.las', 'seconds': 3.0, 'path': 'parsed', 'top_stage': 'parse_data'}]
+
+
+def test_parse_metrics(write_las, tmp_path):
+    lasfile = write_las(las2_lines(ROWS))
+    metrics = {}
+    assert lasparser.parse_lasfile(lasfile, metrics=metrics) == 'parsed'
+    assert las_metrics.stop() is None
+    assert metrics['path'] == 'parsed'
+    assert (metrics['counters']['rows'], metrics['counters']['output_rows']) == (20, 20)
+    assert metrics['counters']['input_bytes'] == (tmp_path / 'well.las').stat().st_size
+    assert {'read_header', 'parse_data', 'write', 'save_metadata'} <= set(metrics['stages'])
+    metricsfile = tmp_path / 'metrics.jsonl'
+    metricsfile.write_text(json.dumps(metrics) + '\n\n' + json.dumps(metrics) + '\n')
+    totals = las_metrics.aggregate(las_metrics.read_records(str(metricsfile)))
+    assert totals['counters']['rows'] == 40
+    assert totals['stages']['write']['files'] == 2
@@ -0,0 +1,98 @@
+import itertools
+import os
+import threading
+import time
+
+import pytest
+
+import las_pipeline
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_background_iter_order():
+    assert list(las_pipeline.background_iter(iter(range(1000)), depth=2)) == list(range(1000))
+    assert list(las_pipeline.background_iter(iter([]))) == []
+
+
+def test_background_iter_exception():
+    def items():
+        yield 0
+        yield 1
+        raise ValueError('bad chunk')
+
+    seen = []
+    with pytest.raises(ValueError, match='bad chunk'):
+        for item in las_pipeline.background_iter(items()):
+            seen.append(item)
+    # the items before the error are all passed on
+    assert seen == [0, 1]
+
+
+def test_background_iter_early_stop():
+    produced = []
+
+    def items():
+        for i in itertools.count():
+            produced.append(i)
+            yield i
+
+    chunks = las_pipeline.background_iter(items(), depth=2)
+    assert next(chunks) == 0
+    chunks.close()
+    # the producer stops after the items the queue held and the one it was working on
+    n = len(produced)
+    time.sleep(0.2)
+    assert len(produced) == n <= 5
+    assert not any(thread.name == 'las-parse' for thread in threading.enumerate())
+
+
+def test_prefetcher_order(tmp_path, monkeypatch):
+    files = [str(tmp_path / ('well%d.las' % i)) for i in range(6)]
+    prefetched = []
+    lock = threading.Lock()
+
+    def prefetch_file(path):
+        if path.endswith('well3.las'):
+            raise IOError('unreadable')
+        with lock:
+            prefetched.append(path)
+    monkeypatch.setattr(las_pipeline, 'prefetch_file', prefetch_file)
+    prefetcher = las_pipeline.FilePrefetcher(files, ahead=2, skip=1)
+    try:
+        # nothing consumed: files 0 and 1 are ahead, the parser already has file 0
+        assert wait_until(lambda: prefetched == files[1:2])
+        time.sleep(0.1)
+        assert prefetched == files[1:2]
+        prefetcher.advance()
+        assert wait_until(lambda: prefetched == files[1:3])
+        # a file that fails is skipped
+        prefetcher.advance(2)
+        assert wait_until(lambda: prefetched == files[1:3] + files[4:5])
+        prefetcher.advance()
+        assert wait_until(lambda: prefetched == files[1:3] + files[4:])
+        assert prefetcher.prefetched == 4
+    finally:
+        prefetcher.stop()
+    assert not prefetcher.thread.is_alive()
+
+
+def test_prefetcher_stop_while_waiting(tmp_path, monkeypatch):
+    monkeypatch.setattr(las_pipeline, 'prefetch_file', lambda path: None)
+    prefetcher = las_pipeline.FilePrefetcher([str(tmp_path / 'a.las')] * 10, ahead=1)
+    assert wait_until(lambda: prefetcher.prefetched == 1)
+    prefetcher.stop()
+    assert prefetcher.prefetched == 1
+
+
+def test_prefetch_file(tmp_path):
+    path = tmp_path / 'well.las'
+    path.write_bytes(os.urandom(3 * 1000 + 7))
+    assert las_pipeline.prefetch_file(str(path), chunk_size=1000) == 3007
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from las_pyramid import CurvePyramid
+
+N_ROWS = 37
+
+
+def sample_values():
+    """Return N_ROWS rows of DEPT, GR, RHOB with all of GR missing in rows 4-7 and some RHOB missing"""
+    rng = np.random.RandomState(0)
+    values = np.column_stack([1600.0 + 0.5 * np.arange(N_ROWS), rng.uniform(0, 150, N_ROWS),
+                              rng.uniform(1.5, 3.0, N_ROWS)])
+    values[4:8, 1] = np.nan
+    values[[1, 9, 36], 2] = np.nan
+    return values
+
+
+def expected_bins(values, rows_per_bin):
+    """Return the bins of a level computed row by row: top, base, rows, then min, max, mean per curve"""
+    bins = []
+    for start in range(0, len(values), rows_per_bin):
+        rows = values[start:start + rows_per_bin]
+        row = [rows[0, 0], rows[-1, 0], len(rows)]
+        for curve in rows[:, 1:].T:
+            curve = curve[~np.isnan(curve)]
+            row += [curve.min(), curve.max(), curve.mean()] if len(curve) else [np.nan] * 3
+        bins.append(row)
+    return np.array(bins)
+
+
+@pytest.mark.parametrize('chunks', [[N_ROWS], [5, 11, 21], [1] * N_ROWS])
+def test_bin_values(tmp_path, chunks):
+    values = sample_values()
+    basefile = str(tmp_path / 'well_pyramid')
+    pyramid = CurvePyramid(basefile, ['DEPT', 'GR', 'RHOB'], rows_per_bin=4, factor=2, min_bins=3)
+    start = 0
+    for size in chunks:
+        pyramid.update(pd.DataFrame(values[start:start + size], columns=['DEPT', 'GR', 'RHOB']))
+        start += size
+    levels = pyramid.close()
+    # 37 rows -> 10, 5, 3, 2 and 1 bins; a level is kept while the one below has more than 3 bins
+    assert [(level['level'], level['rows_per_bin'], level['bins']) for level in levels] == [(1, 4, 10), (2, 8, 5),
+                                                                                           (3, 16, 3)]
+    assert sorted(os.listdir(str(tmp_path))) == ['well_pyramid1.csv', 'well_pyramid2.csv', 'well_pyramid3.csv']
+    for level in levels:
+        frame = pd.read_csv(level['file'])
+        assert list(frame.columns) == ['DEPT_top', 'DEPT_base', 'rows', 'GR_min', 'GR_max', 'GR_mean',
+                                       'RHOB_min', 'RHOB_max', 'RHOB_mean']
+        np.testing.assert_allclose(frame.values, expected_bins(values, level['rows_per_bin']), rtol=1e-12)
+
+
+def test_small_section(tmp_path):
+    basefile = str(tmp_path / 'well_pyramid')
+    pyramid = CurvePyramid(basefile, ['DEPT', 'GR'], rows_per_bin=4, factor=2, min_bins=100)
+    pyramid.update(pd.DataFrame(sample_values()[:, :2], columns=['DEPT', 'GR']))
+    assert pyramid.close() == []
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,101 @@
+import gzip
+
+import pytest
+
+import las_batch
+import las_sniff
+from las_samples import LAS3_LINES, las2_lines, las_bytes
+
+ROWS = [[1600.0 + 0.5 * i, i % 100, 2.0] for i in range(2000)]
+
+
+def test_sniff_exact(write_las):
+    lasfile = write_las(las2_lines(ROWS[:20]))
+    profile = las_sniff.sniff_lasfile(lasfile)
+    assert (profile['version'], profile['wrap'], profile['null_value'], profile['curves']) == (2.0, False, -999.25, 3)
+    assert (profile['rows'], profile['sample_rows'], profile['exact'], profile['cost']) == (20, 20, True, 60)
+    assert 'error' not in profile
+
+
+def test_sniff_estimate(write_las):
+    lasfile = write_las(las2_lines(ROWS))
+    profile = las_sniff.sniff_lasfile(lasfile, sample_bytes=4096)
+    assert not profile['exact']
+    assert profile['sample_rows'] < len(ROWS)
+    # rows of about the same width: the estimate is close
+    assert abs(profile['rows'] - len(ROWS)) < 0.05 * len(ROWS)
+    assert profile['cost'] == profile['rows'] * 3
+
+
+def test_sniff_wrapped(write_las):
+    profile = las_sniff.sniff_lasfile(write_las(las2_lines(ROWS[:20], wrap=True)))
+    assert (profile['wrap'], profile['rows'], profile['exact']) == (True, 20, True)
+
+
+def test_sniff_las3(write_las):
+    profile = las_sniff.sniff_lasfile(write_las(LAS3_LINES))
+    # the first data section only, other sections follow
+    assert (profile['version'], profile['curves'], profile['sample_rows'], profile['exact']) == (3.0, 2, 3, False)
+
+
+def test_sniff_compressed(tmp_path):
+    lasfile = str(tmp_path / 'well.las.gz')
+    with gzip.open(lasfile, 'wb') as f:
+        f.write(las_bytes(las2_lines(ROWS[:20])))
+    profile = las_sniff.sniff_lasfile(lasfile)
+    assert (profile['size'], profile['rows'], profile['exact']) == (len(las_bytes(las2_lines(ROWS[:20]))), 20, True)
+
+
+def test_sniff_error(write_las):
+    # no ~A section
+    lasfile = write_las(las2_lines(ROWS[:20])[:-21])
+    profile = las_sniff.sniff_lasfile(lasfile)
+    assert profile['error']
+    assert profile['cost'] == profile['input_bytes']
+
+
+def profile(name, cost, wrap=False):
+    return {'file': name, 'cost': cost, 'wrap': wrap}
+
+
+def test_schedule_order():
+    profiles = [profile('a', 5), profile('b', 50), profile('c', 5), profile('d', 10)]
+    assert las_sniff.schedule_order(profiles) == ['b', 'd', 'a', 'c']
+
+
+def test_plan_bins():
+    profiles = [profile('a', 50), profile('b', 40), profile('c', 30), profile('d', 20), profile('e', 10)]
+    bins = las_sniff.plan_bins(profiles, 2)
+    assert [(b['files'], b['cost'], b['wrapped']) for b in bins] == [(['a', 'd', 'e'], 80, False),
+                                                                     (['b', 'c'], 70, False)]
+    # more bins than files: empty bins are left out
+    assert len(las_sniff.plan_bins(profiles[:2], 4)) == 2
+
+
+@pytest.mark.parametrize('n_bins, wrapped_bins', [(4, 2), (2, 1), (1, 1)])
+def test_plan_bins_wrapped(n_bins, wrapped_bins):
+    profiles = [profile('a', 40, wrap=True), profile('b', 10, wrap=True), profile('c', 30), profile('d', 20)]
+    bins = las_sniff.plan_bins(profiles, n_bins)
+    # wrapped files never share a bin with plain ones, the plain files keep at least one bin (two bins for one)
+    assert sum(1 for b in bins if b['wrapped']) == wrapped_bins
+    for b in bins:
+        assert all((name in ('a', 'b')) == b['wrapped'] for name in b['files'])
+    assert sorted(name for b in bins for name in b['files']) == ['a', 'b', 'c', 'd']
+
+
+def test_plan_bins_only_wrapped():
+    bins = las_sniff.plan_bins([profile('a', 40, wrap=True), profile('b', 10, wrap=True)], 3)
+    assert [(b['files'], b['wrapped']) for b in bins] == [(['a'], True), (['b'], True)]
+
+
+def test_batch_schedule(write_las, capsys):
+    lasfiles = [write_las(las2_lines(ROWS[:n]), name) for n, name in ((20, 'a.las'), (200, 'b.las'))]
+    report = las_batch.run_batch(lasfiles, workers=1, schedule=True)
+    assert report['counts'] == {'parsed': 2}
+    # the largest file is parsed first
+    assert [line.split()[-1] for line in capsys.readouterr().out.splitlines()] == lasfiles[::-1]
+    assert report['sniff_seconds'] >= 0
+    assert [r['profile']['rows'] for r in report['results']] == [20, 200]
+    report = las_batch.run_batch(lasfiles, workers=1)
+    assert 'sniff_seconds' not in report
+    assert not any('profile' in r for r in report['results'])
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import las_stats
+
+N_ROWS = 40
+CURVES = ['DEPT', 'GR', 'RHOB', 'NPHI']
+
+
+def sample_values():
+    """Return N_ROWS rows with NULL gaps: GR missing in rows 0-2 and 10-24, RHOB in single rows, NPHI all NULL"""
+    rng = np.random.RandomState(1)
+    values = np.column_stack([1600.0 + 0.5 * np.arange(N_ROWS), rng.uniform(0, 150, N_ROWS),
+                              rng.uniform(1.5, 3.0, N_ROWS), np.full(N_ROWS, np.nan)])
+    values[0:3, 1] = np.nan
+    values[10:25, 1] = np.nan
+    values[[5, 19, 39], 2] = np.nan
+    return values
+
+
+def expected_statistics(values):
+    """Return the statistics of every curve computed from the whole array at once"""
+    result = {}
+    for j, name in enumerate(CURVES):
+        valid = ~np.isnan(values[:, j])
+        curve, depths = values[valid, j], values[valid, 0]
+        stats = {'count': len(curve), 'nulls': len(values) - len(curve)}
+        if len(curve):
+            stats.update(min=curve.min(), max=curve.max(), mean=curve.mean(), first_depth=depths[0],
+                         last_depth=depths[-1])
+        if len(curve) > 1:
+            steps = np.diff(depths)
+            stats.update(step=steps.mean(), min_step=steps.min(), max_step=steps.max())
+        result[name] = stats
+    return result
+
+
+@pytest.mark.parametrize('chunks', [[N_ROWS], [3, 7, 15, 15], [1] * N_ROWS, [12, 0, 28]])
+def test_chunked_statistics(chunks):
+    values = sample_values()
+    statistics = las_stats.CurveStatistics(CURVES)
+    start = 0
+    for size in chunks:
+        statistics.update(pd.DataFrame(values[start:start + size], columns=CURVES))
+        start += size
+    result = statistics.as_dict()
+    expected = expected_statistics(values)
+    assert list(result) == CURVES
+    for name in CURVES:
+        assert sorted(result[name]) == sorted(expected[name])
+        for key, value in expected[name].items():
+            assert result[name][key] == pytest.approx(value, rel=1e-12), name + ' ' + key
+    # the step over the GR gap: from row 9 to row 25
+    assert result['GR']['max_step'] == 8.0
+    assert result['NPHI'] == {'count': 0, 'nulls': N_ROWS}
+
+
+def test_text_values():
+    statistics = las_stats.CurveStatistics(['CDEP', 'CDAT', 'POR'])
+    statistics.update(pd.DataFrame({'CDEP': ['1600.2', '1600.7'], 'CDAT': ['12/05/2020', 'NaN'],
+                                    'POR': ['21.5', 'NaN']}))
+    result = statistics.as_dict()
+    assert result['CDAT'] == {'count': 0, 'nulls': 1, 'text': 1}
+    assert result['POR'] == {'count': 1, 'nulls': 1, 'min': 21.5, 'max': 21.5, 'mean': 21.5,
+                             'first_depth': 1600.2, 'last_depth': 1600.2}
+    assert result['CDEP']['step'] == pytest.approx(0.5)
+
+
+def well_info(strt='1600.0', stop='1619.5', step='0.5'):
+    items = {'STRT': strt, 'STOP': stop, 'STEP': step}
+    return dict((mnemonic, {'value': value}) for mnemonic, value in items.items() if value is not None)
+
+
+def depth_statistics(values):
+    statistics = las_stats.CurveStatistics(CURVES)
+    statistics.update(pd.DataFrame(values, columns=CURVES))
+    return statistics.as_dict()['DEPT']
+
+
+def test_check_depths():
+    depth_stats = depth_statistics(sample_values())
+    result = las_stats.check_depths(well_info(), depth_stats)
+    assert result == {'STRT': {'header': 1600.0, 'data': 1600.0, 'ok': True},
+                      'STOP': {'header': 1619.5, 'data': 1619.5, 'ok': True},
+                      'STEP': {'header': 0.5, 'data': 0.5, 'ok': True}}
+    result = las_stats.check_depths(well_info(stop='1620.0', step='0.25'), depth_stats)
+    assert [result[m]['ok'] for m in ('STRT', 'STOP', 'STEP')] == [True, False, False]
+    # items missing from the header or not numbers are not compared
+    assert sorted(las_stats.check_depths(well_info(strt=None, stop='n/a'), depth_stats)) == ['STEP']
+
+
+def test_check_depths_irregular():
+    values = sample_values()
+    values[:, 0] = 1600.0 + np.cumsum(np.arange(N_ROWS) % 3 + 0.1)
+    assert las_stats.check_depths(well_info(step='0'), depth_statistics(values))['STEP']['ok']
+    # a regular STEP fails when the steps vary
+    assert not las_stats.check_depths(well_info(), depth_statistics(values))['STEP']['ok']
+    values[[7, 8], 0] = values[[8, 7], 0]
+    assert not las_stats.check_depths(well_info(step='0'), depth_statistics(values))['STEP']['ok']
+
+
+def test_check_depths_no_data():
+    result = las_stats.check_depths(well_info(), {'count': 0, 'nulls': 0})
+    assert [result[m]['ok'] for m in ('STRT', 'STOP', 'STEP')] == [False, False, False]
@@ -0,0 +1,120 @@
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+import las_writers
+from las_samples import las2_lines
+
+CURVES = ['DEPT', 'GR', 'DATE']
+CURVE_INFO = {'DEPT': {'mnemonic': 'DEPT', 'units': 'M', 'description': 'DEPTH'},
+              'GR': {'mnemonic': 'GR', 'units': 'GAPI', 'description': 'GAMMA RAY'}}
+
+
+def frames():
+    return [pd.DataFrame({'DEPT': [1600.0, 1600.5], 'GR': [10.5, np.nan], 'DATE': ['12/05/2020', None]}),
+            pd.DataFrame({'DEPT': [1601.0], 'GR': [12.0], 'DATE': ['13/05/2020']})]
+
+
+def write(output_format, path, frames, curve_names=CURVES, compression=None):
+    writer = las_writers.open_writer(output_format, str(path), curve_names, CURVE_INFO, compression)
+    for frame in frames:
+        writer.write(frame)
+    writer.close()
+    return writer.path
+
+
+@pytest.mark.parametrize('output_format', ['parquet', 'feather'])
+def test_arrow_round_trip(tmp_path, output_format):
+    pa = pytest.importorskip('pyarrow')
+    path = write(output_format, tmp_path / 'well', frames())
+    assert path.endswith('.' + output_format)
+    if output_format == 'parquet':
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+    else:
+        import pyarrow.feather as feather
+        table = feather.read_table(path)
+    assert [field.type for field in table.schema] == [pa.float64(), pa.float64(), pa.string()]
+    assert table.schema.field('GR').metadata == {b'mnemonic': b'GR', b'units': b'GAPI', b'description': b'GAMMA RAY'}
+    assert table.schema.field('DATE').metadata == {b'mnemonic': b'DATE', b'units': b'', b'description': b''}
+    frame = table.to_pandas()
+    assert frame['DEPT'].tolist() == [1600.0, 1600.5, 1601.0]
+    assert frame['GR'].isnull().tolist() == [False, True, False]
+    assert frame['DATE'].tolist() == ['12/05/2020', None, '13/05/2020']
+
+
+@pytest.mark.parametrize('output_format', ['parquet', 'feather'])
+def test_arrow_text_after_numbers(tmp_path, output_format):
+    pytest.importorskip('pyarrow')
+    chunks = [pd.DataFrame({'DEPT': ['1600.0'], 'GR': ['10.5']}), pd.DataFrame({'DEPT': ['1600.5'], 'GR': ['abc']})]
+    with pytest.raises(ValueError):
+        write(output_format, tmp_path / 'well', chunks, ['DEPT', 'GR'])
+
+
+def test_text_in_later_chunk_falls_back_to_csv(write_las):
+    pytest.importorskip('pyarrow')
+    rows = [[1600.0 + 0.5 * i, i, 2.0] for i in range(10)] + [[1605.0, 'abc', 2.0]]
+    lasfile = write_las(las2_lines(rows))
+    assert lasparser.parse_lasfile(lasfile, output_format='parquet', chunk_rows=4) == 'parsed'
+    csvfile, jsonfile = lasparser.output_files(lasfile)
+    with open(jsonfile) as f:
+        assert json.load(f)['Data files'] == 'well/well.csv'
+    frame = pd.read_csv(csvfile)
+    assert frame['GR'].tolist()[-2:] == ['9', 'abc']
+
+
+def test_npy(tmp_path):
+    path = write('npy', tmp_path / 'well', [frame[['DEPT', 'GR']] for frame in frames()], ['DEPT', 'GR'])
+    with open(path, 'rb') as f:
+        header = f.read(128)
+    assert header.startswith(b'\x93NUMPY\x01\x00')
+    values = np.load(path)
+    assert values.shape == (3,)
+    assert values.dtype.names == ('DEPT', 'GR')
+    assert values['DEPT'].tolist() == [1600.0, 1600.5, 1601.0]
+    assert np.isnan(values['GR'][1])
+
+
+def test_npy_empty_and_text(tmp_path):
+    assert np.load(write('npy', tmp_path / 'empty', [], ['DEPT', 'GR'])).shape == (0,)
+    with pytest.raises(ValueError):
+        write('npy', tmp_path / 'well', frames())
+    with pytest.raises(ValueError):
+        las_writers.open_writer('npy', str(tmp_path / 'well'), CURVES, compression='gzip')
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip', 'bz2', 'xz'])
+def test_csv_compression(tmp_path, compression):
+    path = write('csv', tmp_path / 'well', frames(), compression=compression)
+    frame = pd.read_csv(path, compression='infer')
+    assert path.endswith('.csv' + {None: '', 'gzip': '.gz', 'bz2': '.bz2', 'xz': '.xz'}[compression])
+    assert list(frame.columns) == CURVES
+    assert frame['DEPT'].tolist() == [1600.0, 1600.5, 1601.0]
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+def test_csv_append(tmp_path, compression):
+    base = str(tmp_path / 'well')
+    path = write('csv', base, frames()[:1], compression=compression)
+    writer = las_writers.open_writer('csv', base, CURVES, compression=compression, append=True)
+    writer.write(frames()[1])
+    writer.close()
+    with (gzip.open(path, 'rt') if compression else open(path)) as f:
+        lines = f.read().splitlines()
+    assert lines == ['DEPT,GR,DATE', '1600.0,10.5,12/05/2020', '1600.5,NaN,NaN', '1601.0,12.0,13/05/2020']
+
+
+def test_empty_csv_has_header(tmp_path):
+    with open(write('csv', tmp_path / 'well', [])) as f:
+        assert f.read() == 'DEPT,GR,DATE\n'
+
+
+def test_unknown_format_and_append(tmp_path):
+    with pytest.raises(ValueError):
+        las_writers.open_writer('xls', str(tmp_path / 'well'), CURVES)
+    with pytest.raises(ValueError):
+        las_writers.open_writer('npy', str(tmp_path / 'well'), CURVES, append=True)
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+from las_samples import LAS3_LINES, las2_lines
+
+
+def test_parse_data_block_null():
+    values = lasparser.parse_data_block(b'1600.0 -9999 2\n1600.5 -999.25 4\n', 3, null_value=-9999.0)
+    np.testing.assert_array_equal(values, [[1600.0, np.nan, 2.0], [1600.5, -999.25, 4.0]])
+    values = lasparser.parse_data_block(b'1600.0,-999.25,2\n', 3, dlm=',')
+    np.testing.assert_array_equal(values, [[1600.0, np.nan, 2.0]])
+    values = lasparser.parse_data_block(b'1600.0 -999.25 2\n', 3, null_value=None)
+    np.testing.assert_array_equal(values, [[1600.0, -999.25, 2.0]])
+
+
+def test_parse_data_block_text():
+    with pytest.raises(ValueError):
+        lasparser.parse_data_block(b'1600.0 abc 2\n', 3)
+
+
+def test_null_to_nan():
+    assert lasparser.null_to_nan('-9999', -9999.0) == 'NaN'
+    assert lasparser.null_to_nan('-9999.000', -9999.0) == 'NaN'
+    assert lasparser.null_to_nan('-999.25', -9999.0) == '-999.25'
+    assert lasparser.null_to_nan('12/05/2020', -9999.0) == '12/05/2020'
+
+
+def test_fix_file_contents_null():
+    rows = lasparser.fix_file_contents(['1600.0  -9999 12/05/2020', '1600.5 -999.25 x'], null_value=-9999.0)
+    assert rows == [['1600.0', 'NaN', '12/05/2020'], ['1600.5', '-999.25', 'x']]
+
+
+@pytest.mark.parametrize('wrap', [False, True])
+def test_text_rows_null(write_las, wrap):
+    rows = [[1600.0, -9999, 'a'], [1600.5, -999.25, 'b'], [1601.0, 3, -9999]]
+    lasfile = write_las(las2_lines(rows, null='-9999', wrap=wrap))
+    file_contents, sections = lasparser.read_las_header(lasfile)
+    chunks = list(lasparser.iter_text_rows(lasfile, sections[-1].offset, 3, null_value=-9999.0, wrap=wrap,
+                                           chunk_rows=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert chunks[0] + chunks[1] == [['1600.0', 'NaN', 'a'], ['1600.5', '-999.25', 'b'], ['1601.0', '3', 'NaN']]
+
+
+def test_parse_las3_null(write_las):
+    lasfile = write_las(LAS3_LINES)
+    assert lasparser.parse_lasfile(lasfile) == 'parsed'
+    csvfile, jsonfile = lasparser.output_files(lasfile)
+    base = csvfile[:-len('.csv')]
+    log = pd.read_csv(base + '_Log_Data.csv')
+    assert log['GR'].isnull().tolist() == [False, True, False]
+    assert log['GR'].iloc[2] == -999.25
+    core = pd.read_csv(base + '_Core_Data.csv')
+    assert core['CDAT'].tolist() == ['12/05/2020', '13/05/2020']
+    assert core['POR'].isnull().tolist() == [False, True]
@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+from las_samples import las2_lines
+
+# enough rows for several read blocks, the text starts in the last one
+ROWS = [[1600.0 + 0.5 * i, i % 100, 2.0] for i in range(120000)]
+
+
+def counting_blocks(monkeypatch):
+    """Count the bytes the data readers read"""
+    counter = []
+    iter_data_blocks = lasparser.iter_data_blocks
+
+    def counted(*args, **kwargs):
+        for block in iter_data_blocks(*args, **kwargs):
+            counter.append(len(block))
+            yield block
+    monkeypatch.setattr(lasparser, 'iter_data_blocks', counted)
+    return counter
+
+
+# None for csv, a 'csv' in the test folder name would end up in the json path (see output_files)
+@pytest.mark.parametrize('output_format', [None, 'parquet', 'npy'])
+def test_text_in_last_block(write_las, monkeypatch, output_format):
+    if output_format == 'parquet':
+        pytest.importorskip('pyarrow')
+    rows = ROWS + [[1660000.0, 'abc', 2.0], [1660000.5, -999.25, 3.0]]
+    lasfile = write_las(las2_lines(rows))
+    counter = counting_blocks(monkeypatch)
+    assert lasparser.parse_lasfile(lasfile, output_format=output_format or 'csv', chunk_rows=50000) == 'parsed'
+    # the section is read once, the numeric rows before the text are kept
+    data_offset = lasparser.read_las_header(lasfile)[1][-1].offset
+    assert sum(counter) <= os.path.getsize(lasfile) - data_offset
+    csvfile, jsonfile = lasparser.output_files(lasfile)
+    assert sorted(os.listdir(os.path.dirname(csvfile))) == ['well.csv', 'well.json']
+    frame = pd.read_csv(csvfile)
+    assert len(frame) == len(rows)
+    np.testing.assert_array_equal(frame['DEPT'].values, [row[0] for row in rows])
+    # the rows of the first blocks come from the numeric reader, those of the last block are text as read
+    assert frame['GR'].iloc[0] == '0.0'
+    assert frame['GR'].tolist()[-3:] == ['99', 'abc', np.nan]
+
+
+def test_wrapped_switch_inside_row():
+    remainder = {}
+    blocks = [b'1600.0\n1 2\n1600.5\n3\n', b'x\n1601.0\n5 6\n']
+    arrays = list(lasparser.unwrap_data_blocks(blocks, 3, remainder=remainder))
+    np.testing.assert_array_equal(np.concatenate(arrays), [[1600.0, 1.0, 2.0]])
+    record = [repr(float(v)) for v in remainder['carry']]
+    chunks = lasparser.text_row_chunks(lasparser.block_lines(remainder['blocks']), 3, wrap=True, record=record)
+    assert list(chunks) == [[['1600.5', '3.0', 'x'], ['1601.0', '5', '6']]]
+
+
+@pytest.mark.parametrize('output_format', ['parquet', 'feather', 'npy'])
+def test_write_switches_to_csv(tmp_path, output_format):
+    if output_format != 'npy':
+        pytest.importorskip('pyarrow')
+    frames = [pd.DataFrame({'DEPT': [1600.0, 1600.5], 'GR': [1.0, np.nan]}),
+              pd.DataFrame({'DEPT': [1601.0], 'GR': [2.0]}),
+              pd.DataFrame({'DEPT': ['1601.5'], 'GR': ['abc']})]
+    path = lasparser.write_curve_chunks(iter(frames), str(tmp_path / 'well.csv'), ['DEPT', 'GR'],
+                                        output_format=output_format)
+    assert path == str(tmp_path / 'well.csv')
+    assert sorted(os.listdir(str(tmp_path))) == ['well.csv']
+    with open(path) as f:
+        assert f.read().splitlines() == ['DEPT,GR', '1600.0,1.0', '1600.5,NaN', '1601.0,2.0', '1601.5,abc']
@@ -0,0 +1,56 @@
+import io
+
+import pytest
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+from las_samples import LAS3_LINES, las2_lines, las_bytes, section_offsets
+
+
+def line_at(data, offset):
+    """Return the stripped line of data starting at offset"""
+    return data[offset:data.index(b'\n', offset)].decode('utf-8').strip()
+
+
+@pytest.mark.parametrize('chunk_size', [7, 64, 1 << 20])
+def test_tokenizer_offsets_v2(chunk_size):
+    rows = [[1600.0 + 0.5 * i, i, 2.0 + i] for i in range(50)]
+    data = las_bytes(las2_lines(rows))
+    sections = {}
+    blocks = []
+    for kind, content, offset in lasparser.tokenize_las_stream(io.BytesIO(data), chunk_size):
+        if kind == lasparser.DATA_LINES:
+            assert data[offset:offset + len(content)] == content
+            blocks.append(content)
+        else:
+            assert line_at(data, offset) == content
+            if kind == lasparser.SECTION_LINE:
+                sections[content] = offset
+    assert sections == section_offsets(data)
+    assert b''.join(blocks) == data[data.index(b'~A'):].split(b'\n', 1)[1]
+
+
+@pytest.mark.parametrize('chunk_size', [7, 64, 1 << 20])
+def test_tokenizer_offsets_v3(chunk_size):
+    data = las_bytes(LAS3_LINES)
+    tokens = list(lasparser.tokenize_las_stream(io.BytesIO(data), chunk_size))
+    sections = dict((content, offset) for kind, content, offset in tokens if kind == lasparser.SECTION_LINE)
+    assert sections == section_offsets(data)
+    # the blocks of a section depend on the chunk size, their contents do not
+    blocks = {}
+    for kind, content, offset in tokens:
+        if kind == lasparser.SECTION_LINE:
+            section = content
+        elif kind == lasparser.DATA_LINES:
+            blocks[section] = blocks.get(section, b'') + content
+    assert list(blocks.values()) == [b'1600.0 10.5\n1600.5 -9999\n1601.0 -999.25\n',
+                                     b'1600.2 12/05/2020 21.5\n1600.7 13/05/2020 -9999\n']
+    # without data the same section and metadata lines are found
+    header = list(lasparser.tokenize_las_stream(io.BytesIO(data), chunk_size, data=False))
+    assert header == [token for token in tokens if token[0] != lasparser.DATA_LINES]
+
+
+def test_find_section_start():
+    buf = b'1 2\n  ~Other\n3 ~4\n'
+    assert lasparser.find_section_start(buf, 0, len(buf)) == 4
+    assert lasparser.find_section_start(buf, 13, len(buf)) == -1
+    assert lasparser.find_section_start(b'1 2\n3 4\n', 0, 8) == -1
@@ -0,0 +1,48 @@
+import random
+
+import numpy as np
+import pytest
+
+import Corporate_WellDB_Log_Parser_Las as lasparser
+from las_samples import las_bytes
+
+
+def wrapped_lines(n_rows, n_curves, seed=0):
+    """Return the lines of a wrapped data section: the depth alone, then the values over 1 to 3 lines"""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n_rows):
+        lines.append('%.1f' % (1600.0 + 0.5 * i))
+        values = ['-999.25' if rng.random() < 0.1 else '%.4f' % rng.uniform(-10, 100) for j in range(n_curves - 1)]
+        while values:
+            n = rng.randint(1, len(values))
+            lines.append(' '.join(values[:n]))
+            values = values[n:]
+    return lines
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_unwrap_matches_row_by_row(seed):
+    n_curves = 7
+    lines = wrapped_lines(300, n_curves, seed)
+    expected = np.array(list(lasparser.unwrap_lines(lines, n_curves)), dtype=np.float64)
+    expected[expected == -999.25] = np.nan
+    # blocks end at line ends, anywhere inside a row
+    rng = random.Random(seed)
+    cuts = sorted(rng.sample(range(1, len(lines)), 20))
+    blocks = [las_bytes(lines[start:stop]) for start, stop in zip([0] + cuts, cuts + [len(lines)])]
+    values = np.concatenate(list(lasparser.unwrap_data_blocks(blocks, n_curves)))
+    assert values.shape == (300, n_curves)
+    np.testing.assert_array_equal(values, expected)
+
+
+def test_unwrap_left_over_values():
+    with pytest.raises(ValueError):
+        list(lasparser.unwrap_data_blocks([b'1600.0\n1 2\n1600.5\n3\n'], 3))
+
+
+def test_parse_data_values_partial(monkeypatch):
+    # numpy before 1.18 returns the values up to an unparsable token without a warning
+    monkeypatch.setattr(np, '__version__', '1.14.0')
+    monkeypatch.setattr(np, 'fromstring', lambda *args, **kwargs: np.array([1600.0, 1.0, 1600.5]))
+    assert lasparser.parse_data_values(b'1600.0 1\n1600.5 abc\n') is None